@@ -0,0 +1,117 @@
+"""
+Build synthetic diaries for benchmarking.
+
+    python -m bench.generate /tmp/diary 10000 --years 5
+"""
+import argparse
+import itertools
+import os
+import random
+import subprocess
+import time
+
+from daybook import Daybook
+from daybook.bulk_import import fast_import
+
+BOOK_NAME = "bench"
+
+TAGS = [
+    "work", "oncall", "incident", "meeting", "standup", "1on1", "planning", "review", "deploy", "bug",
+    "home", "family", "kids", "health", "workout", "running", "sleep", "food", "travel", "books",
+    "music", "movies", "ideas", "todo", "finance", "garden", "car", "weekend", "friends", "learning",
+    "python", "rust", "postgres", "kubernetes", "design", "hiring", "retro", "roadmap", "budget", "offsite",
+]
+
+# common English words plus a long tail of rarer, made-up ones, so text searches have both hits and misses
+COMMON_WORDS = (
+    "the of and to a in is it you that he was for on are with as I his they be at one have this from or had by "
+    "not word but what some we can out other were all there when up use your how said an each she which do their "
+    "time if will way about many then them write would like so these her long make thing see him two has look more "
+    "day could go come did number sound no most people my over know water than call first who may down side been "
+    "now find any new work part take get place made live where after back little only round man year came show "
+    "every good me give our under name very through just form sentence great think say help low line differ turn "
+    "cause much mean before move right boy old too same tell does set three want air well also play small end put"
+).split()
+
+
+class _Zipf(object):
+    """Draws from items with a Zipf-like skew: the first items are far more popular than the last."""
+
+    def __init__(self, items: list, s: float = 1.1):
+        self.items = items
+        self.cum_weights = list(itertools.accumulate(1.0 / (i + 1) ** s for i in range(len(items))))
+
+    def sample(self, rng: random.Random, k: int) -> list:
+        return rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+
+def _make_vocabulary(rng: random.Random, size: int = 5000) -> list:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    rare = set()
+    while len(rare) < size:
+        rare.add(''.join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+    return COMMON_WORDS + sorted(rare)
+
+
+def generate_records(num_entries: int, years: int = 3, seed: int = 0, end: float = None, encrypted_ratio: float = 0.0):
+    """
+    Generate synthetic entries, oldest first, spread over the given number of years up to `end`.
+    About `encrypted_ratio` of them are marked to be encrypted.
+
+    :return: a generator of entry dicts, as accepted by daybook.bulk_import.fast_import
+    """
+    rng = random.Random(seed)
+    words = _Zipf(_make_vocabulary(rng))
+    tags = _Zipf(TAGS)
+    end = end or time.time()
+    start = end - years * 365 * 24 * 60 * 60
+    timestamps = sorted(rng.uniform(start, end) for _ in range(num_entries))
+
+    for ts in timestamps:
+        num_words = max(5, int(rng.lognormvariate(4.5, 0.6)))
+        body = words.sample(rng, num_words)
+        yield {
+            'timestamp': round(ts, 6),
+            'title': ' '.join(words.sample(rng, rng.randint(2, 6))).capitalize(),
+            'tags': sorted(set(tags.sample(rng, rng.randint(0, 3)))),
+            'body': '\n'.join(' '.join(body[i:i + 12]) for i in range(0, len(body), 12)),
+            'encrypted': rng.random() < encrypted_ratio,
+        }
+
+
+def generate_diary(base_dir: str, num_entries: int, years: int = 3, seed: int = 0, end: float = None,
+                   encrypted_ratio: float = 0.0) -> str:
+    """
+    Create a git repository at base_dir holding a single synthetic book, BOOK_NAME.  Encrypted entries are encrypted
+    with the key of a Daybook whose remote is "unused", so $DAYBOOK_PASSPHRASE must be set if there are any.
+
+    :return: the path of the book
+    """
+    os.makedirs(base_dir, exist_ok=True)
+    subprocess.check_call(['git', 'init', '-q', base_dir])
+    subprocess.check_call(['git', 'symbolic-ref', 'HEAD', 'refs/heads/master'], cwd=base_dir)
+    records = generate_records(num_entries, years=years, seed=seed, end=end, encrypted_ratio=encrypted_ratio)
+    book = Daybook(BOOK_NAME, base_dir, "unused")
+    fast_import(book, records)
+    book.index.close()
+    return os.path.join(base_dir, BOOK_NAME)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('base_dir', help="where to create the repository")
+    parser.add_argument('num_entries', type=int)
+    parser.add_argument('--years', type=int, default=3, help="how many years the entries span")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--encrypted-ratio', type=float, default=0.0, help="the share of entries to encrypt")
+    args = parser.parse_args()
+
+    start = time.time()
+    generate_diary(
+        args.base_dir, args.num_entries, years=args.years, seed=args.seed, encrypted_ratio=args.encrypted_ratio
+    )
+    print("Generated {0} entries in {1:.1f}s".format(args.num_entries, time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
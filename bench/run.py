@@ -0,0 +1,155 @@
+"""
+Benchmark Daybook against synthetic diaries and write the timings as JSON.
+
+    python -m bench.run --sizes 1000 10000 --output results.json
+    python -m bench.run --sizes 1000 --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.generate import generate_diary, BOOK_NAME
+from daybook import Daybook
+from daybook.index import get_index_dir
+from daybook.sync import sync_repo
+
+DEFAULT_SIZES = [1000, 10000]
+NUM_COMMITS = 20
+
+
+def _time(fn, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {'median_s': statistics.median(runs), 'min_s': min(runs), 'runs': len(runs)}
+
+
+def _code_version() -> str:
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'], cwd=here, stderr=subprocess.DEVNULL
+        ).decode('ascii').strip()
+    except (subprocess.CalledProcessError, OSError):
+        return "unknown"
+
+
+def _get_diary(cache_dir: str, size: int, years: int, seed: int, encrypted_ratio: float) -> str:
+    """
+    Generate a diary of the given size once, and copy it for each run so that runs don't affect one another.
+    """
+    template = os.path.join(cache_dir, "diary-{0}-{1}y-seed{2}-enc{3}".format(size, years, seed, encrypted_ratio))
+    if not os.path.exists(template):
+        generate_diary(template + ".tmp", size, years=years, seed=seed, encrypted_ratio=encrypted_ratio)
+        os.rename(template + ".tmp", template)
+    work = tempfile.mkdtemp(prefix="daybook-bench-")
+    shutil.copytree(template, os.path.join(work, "repo"), symlinks=True)
+    return os.path.join(work, "repo")
+
+
+def bench_size(size: int, cache_dir: str, years: int, seed: int, repeat: int, encrypted_ratio: float) -> list:
+    base_dir = _get_diary(cache_dir, size, years, seed, encrypted_ratio)
+    results = []
+
+    def record(op, timing):
+        timing.update({'size': size, 'op': op})
+        results.append(timing)
+        print("{0:>8} {1:<32} {2:>9.4f}s".format(size, op, timing['median_s']), file=sys.stderr)
+
+    try:
+        # the index is built on first use; time that separately from queries against a warm index
+        shutil.rmtree(get_index_dir(base_dir), ignore_errors=True)
+        book = Daybook(BOOK_NAME, base_dir, "unused")
+        record('index_build', _time(book.index.refresh, 1))
+
+        record('list_entries max=10', _time(lambda: book.list_entries(max_entries=10), repeat))
+        record('list_entries max=1000', _time(lambda: book.list_entries(max_entries=1000), repeat))
+        record('list_entries with_tags', _time(lambda: book.list_entries(with_tags="oncall"), repeat))
+        record('list_entries with_tags and', _time(lambda: book.list_entries(with_tags="work+oncall"), repeat))
+        record('list_entries with_text', _time(lambda: book.list_entries(with_text="water"), repeat))
+        record('list_entries with_text miss', _time(lambda: book.list_entries(with_text="zzzzzz"), repeat))
+        record('list_entries last 30 days', _time(lambda: book.list_entries(after_date="30 days ago"), repeat))
+        record('list_entries git dates', _time(lambda: book.list_entries(after_date="last month"), repeat))
+        record('list_entries last year', _time(lambda: book.list_entries(after_date="365 days ago"), repeat))
+        record('list_tags', _time(book.list_tags, repeat))
+
+        commit_timing = _time(lambda: book.commit_entry("Benchmark entry\n@@bench\n"), NUM_COMMITS)
+        record('commit_entry', commit_timing)
+
+        remote = os.path.join(os.path.dirname(base_dir), "remote.git")
+        subprocess.check_call(['git', 'init', '-q', '--bare', remote])
+        subprocess.check_call(['git', 'remote', 'add', 'origin', remote], cwd=base_dir)
+        subprocess.check_call(['git', 'push', '-q', 'origin', 'master'], cwd=base_dir)
+        book.commit_entry("Entry to sync\n")
+        record('sync', _time(lambda: sync_repo(base_dir), 1))
+        record('sync up to date', _time(lambda: sync_repo(base_dir), repeat))
+    finally:
+        shutil.rmtree(os.path.dirname(base_dir))
+    return results
+
+
+def compare(old: dict, new: dict) -> None:
+    old_timings = dict(((r['size'], r['op']), r['median_s']) for r in old['results'])
+    print("{0:>8} {1:<32} {2:>10} {3:>10} {4:>8}".format("size", "op", old['version'], new['version'], "ratio"))
+    for r in new['results']:
+        before = old_timings.get((r['size'], r['op']))
+        if before is None:
+            continue
+        print("{0:>8} {1:<32} {2:>9.4f}s {3:>9.4f}s {4:>7.2f}x".format(
+            r['size'], r['op'], before, r['median_s'], r['median_s'] / before if before else float('inf')
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="diary sizes, in entries")
+    parser.add_argument('--years', type=int, default=5, help="how many years each diary spans")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help="runs per query; the median is reported")
+    parser.add_argument('--encrypted-ratio', type=float, default=0.1, help="the share of entries to encrypt")
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), "daybook-bench-cache"),
+                        help="where generated diaries are kept between runs")
+    parser.add_argument('--output', help="write results as JSON to this file, rather than stdout")
+    parser.add_argument('--compare', help="a previous results file to compare against")
+    args = parser.parse_args()
+
+    # commits need an identity, even on machines where git has none configured
+    for var, value in [('GIT_AUTHOR_NAME', 'daybook-bench'), ('GIT_AUTHOR_EMAIL', 'bench@daybook'),
+                       ('GIT_COMMITTER_NAME', 'daybook-bench'), ('GIT_COMMITTER_EMAIL', 'bench@daybook')]:
+        os.environ.setdefault(var, value)
+    os.environ.setdefault('DAYBOOK_PASSPHRASE', 'daybook-bench')
+    os.makedirs(args.cache_dir, exist_ok=True)
+
+    results = []
+    for size in args.sizes:
+        results += bench_size(size, args.cache_dir, args.years, args.seed, args.repeat, args.encrypted_ratio)
+    report = {
+        'version': _code_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.time(),
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as fp:
+            compare(json.load(fp), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,34 +1,78 @@
-import re
 import sys
 import time
-import yaml
-from clint.textui import puts as _puts, indent as _indent, colored as _colored
 import os
-from inspect import getmembers as _getmembers
-from inspect import isfunction as _isfunction
 
-from pygit import PyGit
-
-from daybook import Daybook, encryption
-from daybook.utils import str_to_bool, get_entry_filename
+# heavier modules (pygit, the Daybook itself) are imported by the commands needing them, to keep startup quick
+from daybook import profile
+from daybook.utils import str_to_bool, get_entry_filename, get_entry_title as _get_entry_title
 from fileio import editor_create_entry, write_config, read_config
 
 DAYBOOK_CFG = os.path.join(os.getenv("HOME"), ".daybook.yml")
 _CFG = None
+_CFG_MTIME = None
+_DAYBOOKS = {}
+
+
+# the commands dybk offers.  This is a static table so that startup doesn't have to introspect the module.
+_COMMAND_NAMES = (
+    'install',
+    'list_daybooks',
+    'create_entry',
+    'edit_entry',
+    'delete_entry',
+    'retag',
+    'bulk_delete',
+    'bulk_replace',
+    'list_entries',
+    'list_tags',
+    'stats',
+    'related',
+    'bulk_import',
+    'compact',
+    'export',
+    'sync',
+    'maintain',
+    'daemon',
+    'list_commands',
+)
 
 
 def get_commands() -> list:
     this_module = sys.modules[__name__]
-    functions_list = [o[0] for o in _getmembers(this_module) if _isfunction(o[1]) and not o[0].startswith('_')]
-    return [getattr(this_module, f) for f in functions_list if f != 'get_commands']
+    return [getattr(this_module, name) for name in _COMMAND_NAMES]
 
 
 def _get_daybook_cfg():
-    global _CFG
-    if not _CFG:
-        _CFG = read_config(DAYBOOK_CFG)
+    global _CFG, _CFG_MTIME
+    # a long-running daemon picks up edits to the config without restarting
+    mtime = os.path.getmtime(DAYBOOK_CFG) if os.path.exists(DAYBOOK_CFG) else None
+    if not _CFG or mtime != _CFG_MTIME:
+        with profile.span('config'):
+            _CFG = read_config(DAYBOOK_CFG)
+        _CFG_MTIME = mtime
+        _DAYBOOKS.clear()
     return _CFG
 
+
+def _get_daybook(diary_name: str, writing: bool = False) -> 'Daybook':
+    """
+    Get the Daybook for a diary.  Books are kept for the life of the process, so a daemon keeps their indexes warm.
+
+    :param writing: the command changes the diary, so first commits anything a background flush never got to, e.g.
+        after a crash.  Commands which only read leave the journal alone: its entries are listed all the same
+    """
+    from daybook import Daybook
+    _get_daybook_cfg()
+    if diary_name not in _DAYBOOKS:
+        _DAYBOOKS[diary_name] = Daybook(
+            diary_name, _get_base_dir_for_diary(diary_name), _get_remote_url_for_diary(diary_name)
+        )
+    book = _DAYBOOKS[diary_name]
+    if writing:
+        book.journal.recover(book)
+    return book
+
+
 def _get_remote_url_for_diary(d):
     if not d in _get_daybook_cfg()['daybooks']:
         print("You must install your diary first")
@@ -72,21 +116,6 @@ def list_daybooks():
 
 
 
-def _get_entry_title(entry: str):
-    """
-    Get the title from an entry.  The title is the first non-whitespace line.
-
-    :param entry: the entry as a newline-delimited string
-    :return: the first non-whitespace line of an entry and return it as the title
-    """
-    lines = entry.split("\n")
-    for l in lines:
-        if re.match('^(\s+)?$', l):
-            continue
-        else:
-            return l
-
-
 def delete_entry(diary_name: str,
                entries_back_num:int=0,
                with_tags:str=None,
@@ -102,13 +131,13 @@ def delete_entry(diary_name: str,
     :param diary_name: the name of the diary
     :param entries_back_num: the entry number to edit.  The most recent is 0 (default), before that is 1, etc.
     :param with_tags: filter entries with tags given
-    :param before_date: filter entries found via git time filtering (like with git --until)
-    :param after_date: filter entries found via git time filtering (like with git --since)
+    :param before_date: only entries created before this date, e.g. 2020-10-22 or "3 days ago"
+    :param after_date: only entries created after this date, e.g. 2020-10-22 or "3 days ago"
     :param is_encrypted_on_create: if create_if_missing, should the new entry be encrypted?
     :return: None
     """
-    book = Daybook(diary_name, _get_base_dir_for_diary(diary_name), _get_remote_url_for_diary(diary_name))
-    max_entries = entries_back_num + 1
+    book = _get_daybook(diary_name, writing=True)
+    entries_back_num = int(entries_back_num)
 
     # Tempoary workaround to argh not processing boolean strings properly...
     try:
@@ -117,12 +146,10 @@ def delete_entry(diary_name: str,
         print("is_encrypted must only be True or False")
         sys.exit(1)
 
-    entries = book.list_entries(
-        max_entries=max_entries,
-        after_date=after_date,
-        before_date=before_date,
-        with_tags=with_tags
-    )
+    # the entries are found by position, so only the ones being deleted are read
+    entries = book.read_entries(book.get_entry_paths(
+        0, entries_back_num + 1, with_tags=with_tags, after_date=after_date, before_date=before_date
+    ))
     if not entries:
         print("No entry/entries found")
         return
@@ -131,17 +158,15 @@ def delete_entry(diary_name: str,
         num_entries = len(filenames)
         print("You are about to delete the following {} entries.".format(num_entries))
         print(50 * '-')
-        for f in filenames:
-            with open(f, 'r') as fp:
-                for line in fp.readlines():
-                    print(line.strip())
+        for _, entry in entries:
+            for line in entry:
+                print(line.strip())
         print(50 * '-')
         print("Confirm deletion -- y/n")
         resp = sys.stdin.readline().strip()
         if resp == 'y':
             print("Deleting {} entries.".format(num_entries))
-            book.execute_cmd(["rm", "{}".format(' '.join(filenames))])
-            book.execute_cmd(["commit", "-m", '{}'.format("deletion of entries: {}".format(', '.join(filenames)))])
+            book.delete_entries(filenames)
 
 
 def edit_entry(diary_name: str,
@@ -159,16 +184,15 @@ def edit_entry(diary_name: str,
     :param diary_name: the name of the diary
     :param entries_back_num: the entry number to edit.  The most recent is 0 (default), before that is 1, etc.
     :param with_tags: filter entries with tags given
-    :param before_date: filter entries found via git time filtering (like with git --until)
-    :param after_date: filter entries found via git time filtering (like with git --since)
+    :param before_date: only entries created before this date, e.g. 2020-10-22 or "3 days ago"
+    :param after_date: only entries created after this date, e.g. 2020-10-22 or "3 days ago"
     :param is_encrypted_on_create: if create_if_missing, should the new entry be encrypted?
     :param title_on_create: if create_if_missing, optional title
     :param tags_on_create: if create_if_missing, optional tags
     :param create_if_missing: should the entry be created if nothing was found?
     :return: None
     """
-    book = Daybook(diary_name, _get_base_dir_for_diary(diary_name), _get_remote_url_for_diary(diary_name))
-    max_entries = entries_back_num + 1
+    book = _get_daybook(diary_name, writing=True)
 
     # Tempoary workaround to argh not processing boolean strings properly...
     try:
@@ -177,14 +201,10 @@ def edit_entry(diary_name: str,
         print("is_encrypted must only be True or False")
         sys.exit(1)
 
-    entries = book.list_entries(
-        max_entries=max_entries,
-        after_date=after_date,
-        before_date=before_date,
-        with_tags=with_tags
-    )
+    # only the entry being edited is read, however far back it is
+    found = book.nth_entry(int(entries_back_num), with_tags=with_tags, after_date=after_date, before_date=before_date)
 
-    if not entries:
+    if not found:
         if create_if_missing:
             if is_encrypted_on_create == None:
                 print("You must pass in either True or False for --is-encrypted when creating a new entry implicitly.")
@@ -200,7 +220,7 @@ def edit_entry(diary_name: str,
             print("No entry found")
             return
     else:
-        f, entry = entries[-1]
+        f, entry = found
         entry = ''.join(entry)
         title = _get_entry_title(entry)
         entry_modified = editor_create_entry(entry)
@@ -213,59 +233,423 @@ def edit_entry(diary_name: str,
             print(book.commit_edited_entry(f, title, entry_modified))
 
 
-def create_entry(diary_name: str, tags:str="", title:str=None, is_encrypted:bool=False) -> None:
-    book = Daybook(diary_name, _get_base_dir_for_diary(diary_name), _get_remote_url_for_diary(diary_name))
+def create_entry(diary_name: str, tags:str="", title:str=None, is_encrypted:bool=False, wait:bool=False,
+                 push:bool=False) -> None:
+    """
+    Write a new entry in your editor.  The entry is saved to a journal and committed in the background, so this
+    returns as soon as the editor closes.
+
+    :param diary_name: the name of the diary
+    :param wait: commit the entry before returning
+    :param push: sync the diary once the entry is committed
+    """
+    book = _get_daybook(diary_name, writing=True)
     entry = editor_create_entry(title=title, tags=tags)
     title = _get_entry_title(entry)
 
-    entry_filename = get_entry_filename(book.project_dir, time.time(), is_encrypted)
     try:
         is_encrypted = str_to_bool(is_encrypted)
     except:
         print("is_encrypted must only be True or False")
         sys.exit(1)
+    entry_filename = get_entry_filename(book.project_dir, time.time(), is_encrypted)
 
-    if is_encrypted:
-        entry = encryption.encrypt(entry)
+    if is_encrypted and entry:
+        entry = book.encrypt(entry)
 
     if not entry:
         print("No entry.  Nothing committed.")
-    else:
+    elif wait:
         print(book.commit_entry(entry, filename=entry_filename, title=title))
+        if push:
+            from daybook.sync import sync_repo
+            sync_repo(book.base_dir)
+    else:
+        print(book.queue_entry(entry, filename=entry_filename, title=title))
+        book.journal.flush_in_background(
+            book.book_name, book.remote_url, push=push, maintain_every=_get_daybook_cfg().get('maintain_every')
+        )
 
 
-def list_entries(diary_name: str, max_entries:int=None, with_tags=None, with_text=None, before_date=None, after_date=None):
-    max_entries=int(max_entries or '1000') #FIXME: how do we do this generally correctly?
-    book = Daybook(diary_name, _get_base_dir_for_diary(diary_name), _get_remote_url_for_diary(diary_name))
-    entries = book.list_entries(
-        max_entries=max_entries,
+def retag(diary_name: str, add_tags:str="", remove_tags:str="", with_tags:str=None, with_text:str=None,
+          before_date=None, after_date=None) -> None:
+    """
+    Add and remove tags across every matching entry, in a single commit.
+
+    :param diary_name: the name of the diary
+    :param add_tags: comma-separated tags to add
+    :param remove_tags: comma-separated tags to remove
+    :param with_tags: only retag entries matching this tag query, e.g. work+!draft
+    :param with_text: only retag entries containing this text
+    :param before_date: only entries created before this date, e.g. 2020-10-22 or "3 days ago"
+    :param after_date: only entries created after this date, e.g. 2020-10-22 or "3 days ago"
+    """
+    from daybook.tags import parse_tag_list, retag_entry
+    add, remove = parse_tag_list(add_tags), parse_tag_list(remove_tags)
+    if not (add or remove):
+        print("Give tags to add and/or remove")
+        sys.exit(1)
+    book = _get_daybook(diary_name, writing=True)
+    description = ' '.join(['+' + t for t in add] + ['-' + t for t in remove])
+    batch = book.batch("retag {}".format(description))
+    for f, entry in book.iter_entries(with_tags=with_tags, with_text=with_text, after_date=after_date,
+                                      before_date=before_date):
+        entry = ''.join(entry)
+        retagged = retag_entry(entry, add, remove)
+        if retagged != entry:
+            batch.write(f, retagged)
+    print("Retagged {} entries".format(batch.commit()))
+
+
+def bulk_delete(diary_name: str, with_tags:str=None, with_text:str=None, before_date=None, after_date=None,
+                yes:bool=False) -> None:
+    """
+    Delete every matching entry, in a single commit.
+
+    :param diary_name: the name of the diary
+    :param with_tags: only delete entries matching this tag query, e.g. work+!draft
+    :param with_text: only delete entries containing this text
+    :param before_date: only entries created before this date, e.g. 2020-10-22 or "3 days ago"
+    :param after_date: only entries created after this date, e.g. 2020-10-22 or "3 days ago"
+    :param yes: don't ask for confirmation
+    """
+    if not (with_tags or with_text or before_date or after_date):
+        print("Give at least one filter; to delete a whole diary, remove its directory")
+        sys.exit(1)
+    book = _get_daybook(diary_name, writing=True)
+    filenames = [f for f, _ in book.iter_entries(with_tags=with_tags, with_text=with_text, after_date=after_date,
+                                                 before_date=before_date)]
+    if not filenames:
+        print("No entry/entries found")
+        return
+    if not yes:
+        print("You are about to delete {} entries, from {} back to {}.".format(
+            len(filenames), filenames[0], filenames[-1]
+        ))
+        print("Confirm deletion -- y/n")
+        if sys.stdin.readline().strip() != 'y':
+            return
+    with book.batch("bulk deletion of {} entries".format(len(filenames))) as batch:
+        for f in filenames:
+            batch.delete(f)
+    print("Deleted {} entries".format(len(filenames)))
+
+
+def bulk_replace(diary_name: str, pattern: str, replacement: str, regex:bool=False, ignore_case:bool=False,
+                 with_tags:str=None, before_date=None, after_date=None) -> None:
+    """
+    Replace text across every matching entry, in a single commit.
+
+    :param diary_name: the name of the diary
+    :param pattern: the text to replace
+    :param replacement: what to replace it with.  With --regex, this may refer to groups, e.g. \\1
+    :param regex: treat pattern as a regular expression
+    :param ignore_case: match pattern case-insensitively
+    :param with_tags: only change entries matching this tag query, e.g. work+!draft
+    :param before_date: only entries created before this date, e.g. 2020-10-22 or "3 days ago"
+    :param after_date: only entries created after this date, e.g. 2020-10-22 or "3 days ago"
+    """
+    import re
+    compiled = re.compile(pattern if regex else re.escape(pattern), re.IGNORECASE if ignore_case else 0)
+    # outside of --regex, the replacement is taken literally, backslashes and all
+    substitute = replacement if regex else replacement.replace('\\', '\\\\')
+    book = _get_daybook(diary_name, writing=True)
+    # the text search narrows the entries down before any are read
+    matches = book.iter_entries(with_tags=with_tags, with_text=pattern, after_date=after_date, before_date=before_date,
+                                ignore_case=ignore_case, regex=regex)
+    batch = book.batch("replace {!r} with {!r}".format(pattern, replacement))
+    for f, entry in matches:
+        entry = ''.join(entry)
+        replaced = compiled.sub(substitute, entry)
+        if replaced != entry:
+            batch.write(f, replaced)
+    print("Changed {} entries".format(batch.commit()))
+
+
+def bulk_import(diary_name: str, source: str) -> None:
+    """
+    Import entries from another tool in a single pass through git fast-import.
+
+    :param diary_name: the name of the diary to import into
+    :param source: a JSONL file (or - for stdin), or a directory of .json/.jsonl/text files.  Each entry has a
+        timestamp and optionally a title, tags and a body.  The timestamp becomes the commit's author date.
+    """
+    from daybook.bulk_import import read_records, fast_import
+    book = _get_daybook(diary_name, writing=True)
+    start = time.time()
+    num_imported = fast_import(book, read_records(source))
+    elapsed = time.time() - start
+    print("Imported {0} entries in {1:.2f}s ({2:.0f} entries/s)".format(
+        num_imported, elapsed, num_imported / elapsed if elapsed else 0
+    ))
+
+
+def compact(diary_name: str) -> None:
+    """
+    Pack each closed month of a diary into a single segment file, committed in place of that month's entries.
+    Compacted entries are still listed, searched, edited and deleted like any other.
+
+    :param diary_name: the name of the diary to compact
+    """
+    print(_get_daybook(diary_name, writing=True).compact())
+
+
+def export(diary_name: str, output: str = '-', output_format: str = 'jsonl', with_tags:str=None, with_text:str=None,
+           before_date=None, after_date=None, page_size:int=None) -> None:
+    """
+    Export entries, oldest first, as JSON lines (which bulk_import reads back), a Markdown document, or a static
+    HTML site.  Entries are streamed, so a diary of any size exports in the same memory.
+
+    :param diary_name: the name of the diary
+    :param output: the file to write, - for stdout.  For html, the directory to write the site to; exporting to it
+        again only rewrites the pages whose entries have changed
+    :param output_format: jsonl, markdown or html
+    :param with_tags: only export entries matching this tag query, e.g. work+!draft
+    :param with_text: only export entries containing this text
+    :param before_date: only entries created before this date, e.g. 2020-10-22 or "3 days ago"
+    :param after_date: only entries created after this date, e.g. 2020-10-22 or "3 days ago"
+    :param page_size: for html, entries per page
+    """
+    from daybook import export as _export
+    if output_format not in _export.FORMATS:
+        print("output_format must be one of: {}".format(', '.join(_export.FORMATS)))
+        sys.exit(1)
+    book = _get_daybook(diary_name)
+    query = dict(with_tags=with_tags, with_text=with_text, after_date=after_date, before_date=before_date)
+
+    if output_format == 'html':
+        if output == '-':
+            print("Give a directory to write the site to with --output")
+            sys.exit(1)
+        num_entries, num_pages, num_written = _export.export_html(
+            book, output, query, int(page_size or _export.PAGE_SIZE)
+        )
+        print("Exported {0} entries on {1} pages to {2} ({3} pages written)".format(
+            num_entries, num_pages, output, num_written
+        ))
+        return
+
+    write = _export.export_jsonl if output_format == 'jsonl' else _export.export_markdown
+    if output == '-':
+        write(book, sys.stdout, query)
+        return
+    with open(output + '.tmp', 'w') as fp:
+        num_entries = write(book, fp, query)
+    os.replace(output + '.tmp', output)
+    print("Exported {0} entries to {1}".format(num_entries, output))
+
+
+def list_entries(*diary_names, max_entries:int=None, with_tags=None, with_text=None, before_date=None, after_date=None,
+                 ignore_case:bool=False, regex:bool=False, all_diaries:bool=False, after_cursor=None,
+                 titles_only:bool=False, output_format:str='pretty', no_pager:bool=False):
+    """
+    List entries, most recent first.  Several diaries can be listed at once, interleaved by date.  On a terminal the
+    listing is piped through $PAGER, which shows the first entries while the rest are still being found.
+
+    :param diary_names: the names of the diaries to list
+    :param all_diaries: list every installed diary
+    :param after_cursor: carry on from an earlier listing, after the entry at this path
+    :param titles_only: the same as --output-format titles
+    :param output_format: pretty, plain, jsonl or titles (each entry's title and tags)
+    :param no_pager: write straight to stdout, even on a terminal
+    """
+    from daybook.render import Renderer, Pager, FORMATS
+    if titles_only:
+        output_format = 'titles'
+    if output_format not in FORMATS:
+        print("--output-format must be one of: {}".format(', '.join(FORMATS)))
+        sys.exit(1)
+    max_entries=int(max_entries or -1)
+    if all_diaries:
+        diary_names = list(_get_daybook_cfg()['daybooks'])
+    diary_names = list(dict.fromkeys(diary_names))
+    if not diary_names:
+        print("Give the name of at least one diary, or --all-diaries")
+        sys.exit(1)
+    query = dict(
         with_tags=with_tags,
         with_text=with_text,
         after_date=after_date,
-        before_date=before_date
+        before_date=before_date,
+        ignore_case=ignore_case,
+        regex=regex,
+        after_cursor=after_cursor,
+        with_bodies=output_format != 'titles'
     )
-    n=0
-    for f, e in entries:
-        order_description = "(most recent)" if n==0 else "({n} back)".format(n=n)
-        _puts(_colored.blue("----- {f} {order_description} -----".format(f=f, order_description=order_description)))
-        n+=1
-        for line in e:
-            with _indent(4):
-                _puts(line.strip())
+    # entries are printed as they are found, rather than after all of them have been collected
+    if len(diary_names) == 1:
+        entries = _get_daybook(diary_names[0]).iter_entries(max_entries=max_entries, **query)
+    else:
+        from daybook.merge import iter_matches_across
+        books = [_get_daybook(d) for d in diary_names]
+        entries = (e for _, e in iter_matches_across(books, max_entries=max_entries, **query))
+    color = output_format == 'pretty' and sys.stdout.isatty()
+    with Pager(use_pager=not no_pager) as out:
+        renderer = Renderer(out, output_format, color=color)
+        n=0
+        for entry in entries:
+            with profile.span('render'):
+                renderer.entry(n, entry)
+            n+=1
+        if 0 < max_entries == n:
+            renderer.more(entry.path)
+        renderer.flush()
+
+
+def stats(diary_name: str, period:str='week', after_date=None, before_date=None, tag:str=None,
+          top_tags:int=10) -> None:
+    """
+    Show how much was written per period, and the most used tags.  These are rolled up from counters the index keeps
+    per day, so no entries are read.
 
+    :param diary_name: the name of the diary
+    :param period: day, week, month or year
+    :param after_date: only count entries from this date, e.g. 2020-10-22 or "1 year ago"
+    :param before_date: only count entries up to this date
+    :param tag: count the entries with this tag, rather than all of them
+    :param top_tags: how many of the most used tags to show
+    """
+    from daybook.dates import parse_date
+    from daybook.index import PERIODS
+    if period not in PERIODS:
+        print("period must be one of: {}".format(', '.join(PERIODS)))
+        sys.exit(1)
+    days = []
+    for date in (after_date, before_date):
+        parsed = parse_date(date) if date else None
+        if date and parsed is None:
+            print("Can't understand the date {}".format(date))
+            sys.exit(1)
+        days.append(parsed.strftime('%Y-%m-%d') if parsed else None)
+    after, before = days
+    tag = tag.lstrip('@') if tag else None
+
+    index = _get_daybook(diary_name).index
+    print("{0:<12} {1:>8} {2:>10}".format(period, "entries", "" if tag else "words"))
+    for label, entries, words in index.activity(diary_name, period, after, before, tag=tag):
+        print("{0:<12} {1:>8} {2:>10}".format(label, entries, "" if words is None else words))
+    if not tag and int(top_tags):
+        print()
+        print("{0:<21} {1:>8}".format("top tags", "entries"))
+        for t, entries in index.top_tags(diary_name, after, before, int(top_tags)):
+            print("{0:<21} {1:>8}".format(t, entries))
+
+
+def related(diary_name: str, entries_back_num:int=0, path:str=None, count:int=10) -> None:
+    """
+    List the entries most similar to one, by the words they share.  Needs numpy and scipy.
+
+    :param diary_name: the name of the diary
+    :param entries_back_num: the entry to compare with.  The most recent is 0 (default), before that is 1, etc.
+    :param path: the entry to compare with, by its path, instead
+    :param count: how many entries to list
+    """
+    book = _get_daybook(diary_name)
+    if path:
+        path = os.path.abspath(path)
+    else:
+        paths = book.get_entry_paths(int(entries_back_num), 1)
+        if not paths:
+            print("No entry found")
+            sys.exit(1)
+        path = paths[0]
+    print("Entries like {}:".format(path))
+    for entry, score in book.find_related(path, int(count)):
+        print("{0:.3f}  {1}  {2}".format(score, entry.path, entry.title))
+
+
+def list_tags(diary_name: str, with_counts:bool=False) -> None:
+    """
+    List the tags used in a diary.
+
+    :param diary_name: the name of the diary
+    :param with_counts: also show how many entries carry each tag, most used first
+    """
+    book = _get_daybook(diary_name)
+    if with_counts:
+        for tag, count in sorted(book.tag_counts().items(), key=lambda tc: (-tc[1], tc[0])):
+            print("{0}\t{1}".format(tag, count))
+    else:
+        print(book.list_tags())
+
+
+def sync(concurrency:int=4, maintain:bool=False) -> None:
+    """
+    Pull, rebase and push every repository holding a daybook.  Repositories are synced in parallel, and
+    daybooks sharing a base_dir are only synced once.
+
+    :param concurrency: the most repositories to sync at once
+    :param maintain: maintain each repository once it has synced, see the maintain command
+    """
+    from daybook.sync import group_books_by_repo, sync_repos
+    repos = group_books_by_repo(_get_daybook_cfg()['daybooks'])
+    failed = 0
+    synced = []
+    for result in sync_repos(repos, concurrency=int(concurrency)):
+        status = "ok" if result.ok else "FAILED: {}".format(result.error)
+        print("{0:<40} {1:<20} {2:>7.2f}s  {3}".format(
+            result.base_dir, ', '.join(result.books), result.seconds, status
+        ))
+        failed += 0 if result.ok else 1
+        if result.ok:
+            synced.append(result.base_dir)
+    if maintain:
+        _maintain_repos(synced, repos)
+    if failed:
+        print("{0} of {1} repositories failed to sync".format(failed, len(repos)))
+        sys.exit(1)
+
+
+def _maintain_repos(base_dirs: list, repos: dict) -> None:
+    from daybook.maintenance import maintain as _maintain
+    for base_dir in base_dirs:
+        result = _maintain(base_dir, [_get_daybook(name, writing=True) for name in repos[base_dir]])
+        print(base_dir)
+        for step, seconds in result.steps:
+            print("    {0:<30} {1:>8.2f}s".format(step, seconds))
+        for book, query, before, after in result.timings:
+            print("    {0:<30} {1:>8.1f}ms -> {2:.1f}ms".format(
+                "{0}: {1}".format(book, query) if query == 'list_entries' else query, before * 1000, after * 1000
+            ))
+
+
+def maintain(*diary_names) -> None:
+    """
+    Keep the repositories holding daybooks quick to query: write the commit-graph with changed-path Bloom filters,
+    pack loose objects and prune.  Reports how long a standard query on each daybook took before and after.
+    Setting maintain_every: N in ~/.daybook.yml also maintains a repository in the background every N commits.
+
+    :param diary_names: the diaries whose repositories to maintain, all of them if none are given
+    """
+    from daybook.sync import group_books_by_repo
+    daybooks = _get_daybook_cfg()['daybooks']
+    repos = group_books_by_repo(daybooks)
+    if diary_names:
+        for d in diary_names:
+            _get_base_dir_for_diary(d)
+        wanted = set(group_books_by_repo({d: daybooks[d] for d in diary_names}))
+        repos = type(repos)((base_dir, books) for base_dir, books in repos.items() if base_dir in wanted)
+    _maintain_repos(list(repos), repos)
+
+
+def daemon(socket_path:str=None) -> None:
+    """
+    Serve read-only commands (list_entries, list_tags, ...) over a Unix socket, keeping configs and indexes warm.
+    While it runs, dybk forwards those commands to it instead of running them itself.
+
+    :param socket_path: where to listen.  Defaults to $DAYBOOK_SOCKET, or ~/.daybook.sock
+    """
+    import argh
+    from daybook.daemon import serve, FORWARDED_COMMANDS
 
+    parser = argh.ArghParser()
+    parser.add_commands([c for c in get_commands() if c.__name__ in FORWARDED_COMMANDS])
 
-def list_tags(diary_name: str) -> None:
-    book = Daybook(diary_name, _get_base_dir_for_diary(diary_name), _get_remote_url_for_diary(diary_name))
-    print(book.list_tags())
+    def dispatch(argv, out):
+        parser.dispatch(argv=argv, output_file=out, errors_file=out)
 
+    serve(dispatch, socket_path)
 
-def sync():
-    base_dirs = [v[1]['base_dir'] for v in _get_daybook_cfg()['daybooks'].items()]
-    for b in base_dirs:
-        PyGit(b)("pull origin master")
-        PyGit(b)("rebase origin/master")
-        PyGit(b)("push origin master")
 
 def list_commands() -> None:
     print("""
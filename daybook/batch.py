@@ -0,0 +1,147 @@
+import os
+from collections import defaultdict
+
+from daybook import segments
+from daybook.locking import write_lock, run_git
+
+
+class Batch(object):
+    """
+    Changes to many entries, committed together: every changed path is staged with a single `git update-index`
+    and recorded in a single commit, however many entries there are.  The commit holds only the batch's paths, never
+    anything else that happened to be staged.  Nothing touches the working tree until commit(), so a batch abandoned
+    part way through (e.g. by an exception in its `with` block) leaves no trace.  Should commit() itself fail, the
+    files it changed are put back as they were and unstaged, and the failure raises.  The commit is made under the
+    repository's write lock (see daybook.locking).
+
+    Use through Daybook.batch:
+
+        with book.batch("retag work as job") as batch:
+            for f, entry in book.iter_entries(with_tags="work"):
+                batch.write(f, ''.join(entry).replace("@@work", "@@job"))
+    """
+
+    def __init__(self, book, message: str):
+        self.book = book
+        self.message = message
+        self.writes = {}
+        self.deletes = set()
+
+    def write(self, filename: str, entry: str, encrypted: bool = False) -> None:
+        """
+        :param filename: the entry's path.  An entry in a .txt.encrypted file is encrypted when the batch is committed
+        :param entry: the entry's new text, in plaintext
+        :param encrypted: the entry is already encrypted, so is written as it is
+        """
+        self.deletes.discard(filename)
+        self.writes[filename] = (entry, encrypted)
+
+    def delete(self, filename: str) -> None:
+        """
+        :param filename: the entry's path, whether it is loose or compacted
+        """
+        self.writes.pop(filename, None)
+        self.deletes.add(filename)
+
+    def __len__(self):
+        return len(self.writes) + len(self.deletes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+    def commit(self) -> int:
+        """
+        Write the changes to the working tree and commit them.
+
+        :return: how many entries were changed
+        """
+        if not len(self):
+            return 0
+
+        with write_lock(self.book.base_dir):
+            originals = {}
+            try:
+                self._apply(originals)
+            except BaseException:
+                self._restore(originals)
+                raise
+        self.book.index.refresh()
+
+        num_changed = len(self)
+        self.writes = {}
+        self.deletes = set()
+        return num_changed
+
+    def _apply(self, originals: dict) -> None:
+        """
+        Write the changes and commit them, keeping each changed file's contents beforehand in `originals`, or None for
+        a file which didn't exist
+        """
+        def keep(path):
+            try:
+                with open(path, 'rb') as fp:
+                    originals[path] = fp.read()
+            except FileNotFoundError:
+                originals[path] = None
+
+        staged = []
+        for filename, (entry, encrypted) in self.writes.items():
+            if filename.endswith(".txt.encrypted") and not encrypted:
+                entry = self.book.encrypt(entry)
+            keep(filename)
+            self.book._write_entry_to_disk(filename, entry)
+            staged.append(filename)
+
+        removed = defaultdict(list)
+        for filename in self.deletes:
+            if os.path.exists(filename):
+                keep(filename)
+                os.remove(filename)
+                staged.append(filename)
+                try:
+                    os.rmdir(os.path.dirname(filename))
+                except OSError:
+                    pass
+            if segments.get_entry_stamp(filename) is not None:
+                segment_path, name = segments.locate_entry(filename)
+                removed[segment_path].append(name)
+        for segment_path, names in removed.items():
+            keep(segment_path)
+            segments.append_entries(segment_path, removed=names)
+            staged.append(segment_path)
+
+        base_dir = self.book.base_dir
+        paths = b''.join(os.path.relpath(p, base_dir).encode('utf-8') + b'\0' for p in staged)
+        run_git(base_dir, 'update-index', '--add', '--remove', '-z', '--stdin', stdin=paths)
+        # the staged changes among the batch's paths, leaving out e.g. a deleted entry which was never committed, which
+        # git commit's pathspec would refuse
+        changed = run_git(base_dir, 'diff', '--cached', '--name-only', '-z', '--no-renames', '--', *(
+            os.path.relpath(p, base_dir) for p in staged
+        )).decode('utf-8').split('\0')
+        changed = [p for p in changed if p]
+        if changed:
+            run_git(base_dir, 'commit', '-q', '-m', self.message, '--only', '--', *changed)
+
+    def _restore(self, originals: dict) -> None:
+        """
+        Put back the files a failed commit changed, and unstage them
+        """
+        for path, data in originals.items():
+            if data is None:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # written aside and renamed into place, so a segment's memory map is remapped rather than changed under it
+            with open(path + '.restore', 'wb') as fp:
+                fp.write(data)
+            os.replace(path + '.restore', path)
+        if originals:
+            run_git(self.book.base_dir, 'reset', '-q', '--', *(os.path.relpath(p, self.book.base_dir) for p in originals))
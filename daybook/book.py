@@ -0,0 +1,539 @@
+import datetime
+import io
+import os
+from collections import Counter, OrderedDict, defaultdict
+import subprocess
+import time
+
+from pygit import PyGit
+
+from daybook import encryption, profile, segments
+from daybook.batch import Batch
+from daybook.dates import parse_date, get_paths_in_range, ENTRY_FILENAME_RE
+from daybook.encryption import get_book_salt
+from daybook.entry import Entry
+from daybook.index import EntryIndex, get_index_dir
+from daybook.journal import Journal
+from daybook.locking import write_lock, run_git
+from daybook.ordering import EntryOrdering
+from daybook.search import TextQuery
+from daybook.tags import parse_tag_query, entry_matches_tag_query
+from daybook.utils import get_entry_filename, get_entry_title, find_tags
+
+# entries are read this many at a time, so that encrypted ones can be decrypted in parallel
+READ_CHUNK_SIZE = 64
+# how many decrypted entries each Daybook keeps, mostly for the benefit of the daemon
+DECRYPTED_CACHE_SIZE = 1024
+# how many query orderings (see EntryOrdering) each Daybook keeps
+ORDERING_CACHE_SIZE = 16
+
+
+
+def _get_path_sort_key(path: str) -> tuple:
+    return float(ENTRY_FILENAME_RE.match(os.path.basename(path)).group(1)), path
+
+
+class Daybook(object):
+
+    def __init__(self, book_name, base_dir, remote_url):
+        self.book_name = book_name
+        self.remote_url = remote_url
+        self.base_dir = os.path.expanduser(base_dir)
+        self.project_dir = os.path.join(self.base_dir, self.book_name)
+        if os.path.exists(os.path.join(self.base_dir, '.git')):
+            self.git = PyGit(self.base_dir, new_repo=False)
+        else:
+            print(
+                "Creating project {0} within {1} with remote {2}".format(
+                    self.book_name,
+                    self.base_dir,
+                    self.remote_url
+                )
+            )
+            os.makedirs(self.base_dir, exist_ok=True)
+            self.git = PyGit(self.base_dir, new_repo=True)
+            self.git("remote add origin {}".format(self.remote_url))
+
+        os.makedirs(self.project_dir, exist_ok=True)
+        self.index = EntryIndex(self.base_dir)
+        self.journal = Journal(self.base_dir)
+        self.encryption_salt = get_book_salt(self.book_name, self.remote_url)
+        # checks each salt's key against a value sealed with it, see daybook.encryption.get_key
+        self.key_check_path = os.path.join(get_index_dir(self.base_dir), 'keycheck.json')
+        self._decrypted = OrderedDict()
+        self._orderings = OrderedDict()
+        self._related = None
+
+    def execute_cmd(self, cmd: list) -> list:
+        with profile.span('git', cmd=cmd if isinstance(cmd, str) else ' '.join(cmd)):
+            profile.count('subprocesses')
+            return self.git(cmd)
+
+    def commit_edited_entry(self, filename: str, title:str, entry: str) -> None:
+        batch = self.batch(title)
+        batch.write(filename, ''.join(entry))
+        batch.commit()
+        return "Updated entry: {0} with title: {1}".format(filename, title)
+
+    def commit_entry(self, entry: str, filename:str=None, title=None) -> None:
+        """
+        Commit the entry to git.  The entry goes through the journal, so entries being committed by other writers at
+        the same time share one commit with it (see daybook.journal.Journal.flush).
+        """
+        message = self.queue_entry(entry, filename, title)
+        self.journal.flush(self)
+        return message
+
+    def queue_entry(self, entry: str, filename:str=None, title=None) -> str:
+        """
+        Save an entry to the journal, to be committed by a later flush (see daybook.journal.Journal).  It is listed
+        straight away.
+        """
+        if not title:
+            title = "<no title given>"
+        if not filename:
+            filename = self._get_entry_filename(time.time())
+        self.journal.append(self.book_name, filename, entry, title)
+        return "Saved entry: {0} with title: {1}".format(filename, title)
+
+    def delete_entries(self, filenames: list) -> None:
+        """Remove the given entries from git in a single commit, whether they are loose or compacted"""
+        with self.batch("deletion of entries: {}".format(', '.join(filenames))) as batch:
+            for f in filenames:
+                batch.delete(f)
+
+    def batch(self, message: str) -> Batch:
+        """
+        Start a batch of changes to many entries, committed as one (see daybook.batch.Batch).  Any entries still in
+        the journal are committed first, so the batch works on what is committed.
+
+        :param message: the commit message
+        """
+        self.journal.flush(self)
+        return Batch(self, message)
+
+    def compact(self) -> str:
+        """
+        Pack the committed entries of every closed month, i.e. every month before this one, into a segment per month
+        (see daybook.segments), and commit the segments in place of the loose files.
+        """
+        this_month = datetime.date.today().replace(day=1)
+        committed = set(self.index.paths(self.book_name))
+        loose = [
+            f for f in get_paths_in_range(self.project_dir, before=time.mktime(this_month.timetuple()) - 0.000001)
+            if f in committed
+        ]
+        if not loose:
+            return "Nothing to compact"
+
+        with write_lock(self.base_dir):
+            by_segment = defaultdict(dict)
+            for f in loose:
+                segment_path, name = segments.locate_entry(f)
+                with open(f, 'rb') as fp:
+                    by_segment[segment_path][name] = fp.read()
+            for segment_path, entries in by_segment.items():
+                segments.append_entries(segment_path, entries)
+
+            for i in range(0, len(loose), 1000):
+                run_git(self.base_dir, "rm", "-q", "--", *loose[i:i + 1000])
+            run_git(self.base_dir, "add", "--", *sorted(by_segment))
+            message = "compacted {0} entries into {1} segments".format(len(loose), len(by_segment))
+            run_git(self.base_dir, "commit", "-q", "-m", message)
+        self.index.refresh()
+        return message.capitalize()
+
+    def _get_entry_filename(self, timestamp=None, is_encrypted=False):
+        """
+        Get a filename for a new entry.
+        Sure, you could get name collisions if you call this more than once a second, but that's not a use-case here.
+        :return str: the filename
+        """
+        return get_entry_filename(self.project_dir, timestamp or time.time(), is_encrypted)
+
+    def _entry_exists(self, filename: str) -> bool:
+        return os.path.exists(filename) or segments.get_entry_stamp(filename) is not None
+
+    def _write_entry_to_disk(self, filename: str, entry: str) -> None:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w') as fp:
+            fp.writelines(entry)
+
+    def _get_files_matching_dates(self, before_date, after_date):
+        """
+
+        :param before_date: a date understood by daybook.dates.parse_date, or failing that by git --until
+        :param after_date: a date understood by daybook.dates.parse_date, or failing that by git --since
+
+        :return: a set of files between two dates, most recent first
+        """
+        if not (before_date or after_date):
+            # without a date range, the index answers from HEAD's tree without walking the log
+            paths = self.index.paths(self.book_name)
+            pending = self.journal.pending_paths(self.book_name)
+            if not pending:
+                return paths
+            return sorted(set(paths) | set(pending), key=_get_path_sort_key, reverse=True)
+
+        before = parse_date(before_date) if before_date else None
+        after = parse_date(after_date) if after_date else None
+        before = before.timestamp() if before else None
+        after = after.timestamp() if after else None
+        if (before_date and before is None) or (after_date and after is None):
+            # ask git's date parser about expressions only it understands, e.g. "last month"
+            git_after, git_before = self._git_parse_dates(before_date, after_date)
+            before = before if before is not None else git_before
+            after = after if after is not None else git_after
+
+        # entry paths encode their creation time, so the day directories are enough to resolve the range.  Only
+        # the entries committed or journalled count, as without a range, not stray or half-written files
+        known = set(self.index.paths(self.book_name)) | set(self.journal.pending_paths(self.book_name))
+        loose = [p for p in get_paths_in_range(self.project_dir, after=after, before=before) if p in known]
+        compacted = segments.get_paths_in_range(self.project_dir, after=after, before=before)
+        if not compacted:
+            return loose
+        return sorted((set(loose) | set(compacted)) & known, key=_get_path_sort_key, reverse=True)
+
+    def _git_parse_dates(self, before_date, after_date) -> tuple:
+        """
+        Turn date expressions into unix times the way `git log --since/--until` would.
+
+        :return: a tuple of (after, before), each None if the matching expression wasn't given
+        """
+        args = ['git', 'rev-parse']
+        if after_date:
+            args += ["--since={}".format(after_date)]
+        if before_date:
+            args += ["--until={}".format(before_date)]
+        after = before = None
+        with profile.span('git', cmd=' '.join(args[1:])):
+            profile.count('subprocesses')
+            output = subprocess.check_output(args, cwd=self.base_dir).decode('utf-8')
+        for arg in output.split():
+            if arg.startswith('--max-age='):
+                after = float(arg[len('--max-age='):])
+            elif arg.startswith('--min-age='):
+                before = float(arg[len('--min-age='):])
+        return after, before
+
+    def _get_candidates(self, with_tags:str=None, with_text:str=None, after_date=None, before_date=None,
+                        ignore_case:bool=False, regex:bool=False, after_cursor:str=None) -> tuple:
+        """
+        Narrow the entries down as far as the index and the paths allow, without reading any of them.
+
+        :return: a tuple of (candidates, verify, decided).  Candidates are paths, most recent first.  verify(f, entry)
+            tells whether a candidate really matches once it has been read, and is None if every candidate matches.
+            decided is the set of candidates known to match without reading them.
+        """
+        with profile.span('discover'):
+            files = self._get_files_matching_dates(before_date, after_date)
+            if after_cursor:
+                if not ENTRY_FILENAME_RE.match(os.path.basename(after_cursor)):
+                    raise Exception("Not an entry: {}".format(after_cursor))
+                cursor = _get_path_sort_key(os.path.join(self.base_dir, after_cursor))
+                files = [f for f in files if _get_path_sort_key(f) < cursor]
+            tag_query = parse_tag_query(with_tags) if with_tags else None
+            tags_decided = ()
+            if tag_query:
+                # the index decides plaintext entries; only the rest need to be read to check their tags
+                tag_matches, tags_decided = self.index.match_tags(self.book_name, tag_query)
+                files = [f for f in files if f in tag_matches or f not in tags_decided]
+            text_query = TextQuery(with_text, ignore_case=ignore_case, regex=regex) if with_text else None
+            if text_query:
+                # only entries holding every trigram of the query can match, so skip reading the rest
+                text_candidates, text_decided = self.index.match_text(self.book_name, text_query.get_trigrams())
+                files = [f for f in files if f in text_candidates or f not in text_decided]
+            profile.count('candidates', len(files))
+
+        def verify(f, entry):
+            if tag_query and f not in tags_decided:
+                if not entry_matches_tag_query(tag_query, self._find_tags_in_entry(entry)):
+                    return False
+            if text_query:
+                if not text_query.matches(''.join(entry)):
+                    return False
+            return True
+
+        # candidates the index has decided match without being read; when that's all of them, there's nothing to check
+        decided = set() if text_query else set(tags_decided)
+        needs_reading = text_query or (tag_query and any(f not in decided for f in files))
+        return files, (verify if needs_reading else None), decided
+
+    def _iter_matches(self, max_entries:int=-1, with_tags:str=None, with_text:str=None, after_date=None, before_date=None,
+                      ignore_case:bool=False, regex:bool=False, after_cursor:str=None, with_bodies:bool=True,
+                      oldest_first:bool=False):
+        """
+        Lazily find matching entries, most recent first.  Files are read a chunk at a time as the caller consumes
+        the results, never more than could still match, and nothing is opened once max_entries matches have been
+        produced.
+
+        :param max_entries: max number of matches to return.  If negative, return all
+        :param with_tags: filter on tags (see daybook.tags.parse_tag_query).  None means no tag filtering
+        :param with_text: filter on text.  None means no text filtering
+        :param after_date: Only return entries after date. None means no after date filtering
+        :param before_date: Only return entries before date. None means no after date filtering
+        :param ignore_case: match with_text case-insensitively
+        :param regex: treat with_text as a regular expression
+        :param after_cursor: only return entries older than this one, given by its path
+        :param with_bodies: read the entries' bodies.  Otherwise only their titles and tags are kept, taken from the
+            index where it has them, and a body is read if and when it's asked for
+        :param oldest_first: produce the matches in chronological order instead
+        :return: A generator of Entry for the entries matching the given criteria
+        """
+        files, verify, _ = self._get_candidates(
+            with_tags, with_text, after_date, before_date, ignore_case=ignore_case, regex=regex,
+            after_cursor=after_cursor
+        )
+        if oldest_first:
+            files = files[::-1]
+
+        num_found = 0
+        start = 0
+        while start < len(files):
+            if 0 < max_entries <= num_found:
+                return
+            # read a chunk at a time so encrypted entries can be decrypted together, but never more than could match
+            size = READ_CHUNK_SIZE if max_entries <= 0 else min(READ_CHUNK_SIZE, max_entries - num_found)
+            chunk = files[start:start + size]
+            start += size
+            if with_bodies or verify is not None:
+                entries = self._read_entries(chunk)
+                with profile.span('filter'):
+                    matches = [
+                        self._make_entry(f, e, with_bodies) for f, e in zip(chunk, entries)
+                        if verify is None or verify(f, e)
+                    ]
+            else:
+                matches = self._describe_entries(chunk)
+
+            for entry in matches:
+                if 0 < max_entries <= num_found:
+                    return
+                num_found += 1
+                yield entry
+
+    def iter_paths(self, with_tags:str=None, with_text:str=None, after_date=None, before_date=None,
+                   ignore_case:bool=False, regex:bool=False, oldest_first:bool=False):
+        """
+        Find the paths of the matching entries, reading only those the index can't decide.  See _iter_matches for the
+        parameters.
+
+        :return: a generator of paths, most recent first unless oldest_first
+        """
+        files, verify, _ = self._get_candidates(
+            with_tags, with_text, after_date, before_date, ignore_case=ignore_case, regex=regex
+        )
+        if oldest_first:
+            files = files[::-1]
+        if verify is None:
+            yield from files
+            return
+        for start in range(0, len(files), READ_CHUNK_SIZE):
+            chunk = files[start:start + READ_CHUNK_SIZE]
+            for f, e in zip(chunk, self._read_entries(chunk)):
+                if verify(f, e):
+                    yield f
+
+    def _make_entry(self, f: str, lines: list, keep_lines: bool = True) -> Entry:
+        if keep_lines:
+            return Entry(f, _get_path_sort_key(f)[0], self._read_entries, lines)
+        body = ''.join(lines)
+        return Entry(
+            f, _get_path_sort_key(f)[0], self._read_entries,
+            title=(get_entry_title(body) or '').rstrip(), tags=sorted(set(find_tags(body)))
+        )
+
+    def _describe_entries(self, filenames: list) -> list:
+        """
+        :return: an Entry for each file, without its body.  Only the entries the index can't describe (encrypted
+            ones, and any still in the journal) are read, together
+        """
+        described = self.index.describe(filenames)
+        unknown = [f for f in filenames if f not in described]
+        if unknown:
+            for f, lines in zip(unknown, self._read_entries(unknown)):
+                body = ''.join(lines)
+                described[f] = ((get_entry_title(body) or '').rstrip(), sorted(set(find_tags(body))))
+        return [
+            Entry(f, _get_path_sort_key(f)[0], self._read_entries, title=described[f][0], tags=described[f][1])
+            for f in filenames
+        ]
+
+    def _get_ordering(self, with_tags:str=None, after_date=None, before_date=None) -> EntryOrdering:
+        """
+        Get the position-addressable ordering of the entries matching a query.  Orderings are kept until HEAD moves or
+        the journal changes, or for relative dates like "3 days ago", until the minute is up.
+        """
+        self.index.refresh()
+        minute = int(time.time() // 60) if (after_date or before_date) else None
+        key = (self.index.head, tuple(self.journal.pending_paths(self.book_name)), with_tags, after_date, before_date,
+               minute)
+        if key in self._orderings:
+            self._orderings.move_to_end(key)
+        else:
+            candidates, verify, decided = self._get_candidates(with_tags, None, after_date, before_date)
+            self._orderings[key] = EntryOrdering(candidates, verify, decided, self._read_entries, READ_CHUNK_SIZE)
+            while len(self._orderings) > ORDERING_CACHE_SIZE:
+                self._orderings.popitem(last=False)
+        return self._orderings[key]
+
+    def get_entry_paths(self, start:int=0, count:int=1, with_tags:str=None, after_date=None, before_date=None) -> list:
+        """
+        Look entries up by position, without reading the ones before them.
+
+        :param start: the position of the first entry.  The most recent is 0, before that is 1, etc.
+        :param count: how many entries
+        :return: the paths of the entries at positions start to start + count, fewer if there aren't that many
+        """
+        return self._get_ordering(with_tags, after_date, before_date).get(start, count)
+
+    def nth_entry(self, n:int, with_tags:str=None, after_date=None, before_date=None):
+        """
+        :param n: the position of the entry.  The most recent is 0, before that is 1, etc.
+        :return: the Entry for the n-th most recent entry matching the criteria, or None if there isn't one
+        """
+        paths = self.get_entry_paths(n, 1, with_tags, after_date, before_date)
+        return self.read_entries(paths)[0] if paths else None
+
+    def read_entries(self, filenames: list) -> list:
+        """
+        :return: an Entry for each of the given files, read and decrypted
+        """
+        return [self._make_entry(f, e) for f, e in zip(filenames, self._read_entries(filenames))]
+
+    def _read_entries(self, filenames: list) -> list:
+        """
+        Read entries, decrypting the encrypted ones together (see daybook.encryption.decrypt_many).  Decrypted
+        entries are cached for as long as their file is unchanged.  Entries which have been compacted are read from
+        their segment.
+
+        :return: the lines of each entry, in the same order as filenames
+        """
+        profiling = profile.is_enabled()
+        entries = []
+        to_decrypt = []
+        with profile.span('read'):
+            for f in filenames:
+                try:
+                    with open(f, 'r') as fp:
+                        if not f.endswith(".txt.encrypted"):
+                            entries.append(fp.readlines())
+                            if profiling:
+                                profile.count('files_read')
+                                profile.count('bytes_read', sum(len(l) for l in entries[-1]))
+                            continue
+                        body = fp.read()
+                    key = (f, os.stat(f).st_mtime_ns)
+                    if profiling:
+                        profile.count('files_read')
+                        profile.count('files_statted')
+                        profile.count('bytes_read', len(body))
+                except FileNotFoundError:
+                    # compacted entries are served straight out of their segment's memory map
+                    view = segments.read_entry(f)
+                    if view is None:
+                        raise
+                    body = str(view, 'utf-8')
+                    if profiling:
+                        profile.count('segment_reads')
+                        profile.count('bytes_read', len(view))
+                    if not f.endswith(".txt.encrypted"):
+                        entries.append(io.StringIO(body).readlines())
+                        continue
+                    key = (f, segments.get_entry_stamp(f))
+                if key in self._decrypted:
+                    self._decrypted.move_to_end(key)
+                else:
+                    to_decrypt.append((key, body))
+                entries.append(key)
+
+        if to_decrypt:
+            with profile.span('decrypt', entries=len(to_decrypt)):
+                plaintexts = encryption.decrypt_many([body for _, body in to_decrypt], self.key_check_path)
+            for (key, _), plaintext in zip(to_decrypt, plaintexts):
+                self._decrypted[key] = io.StringIO(plaintext).readlines()
+        entries = [self._decrypted[e] if isinstance(e, tuple) else e for e in entries]
+        while len(self._decrypted) > DECRYPTED_CACHE_SIZE:
+            self._decrypted.popitem(last=False)
+        return entries
+
+    def _get_matches(self, max_entries:int=-1, with_tags:str=None, with_text:str=None, after_date=None, before_date=None,
+                     ignore_case:bool=False, regex:bool=False) -> list:
+        """
+        :return: A list of Entry for all entries matching the given criteria.  See _iter_matches for the parameters.
+        """
+        return list(self._iter_matches(
+            max_entries, with_tags, with_text, after_date, before_date, ignore_case=ignore_case, regex=regex
+        ))
+
+    def iter_entries(self, max_entries=-1, with_tags=None, with_text=None, after_date=None, before_date=None,
+                     ignore_case=False, regex=False, after_cursor=None, with_bodies=True, oldest_first=False):
+        """
+        Lazily list entries, most recent first, so callers can act on each entry as soon as it is found.
+
+        :param max_entries: max number of matches to return.  If negative, return all
+        :param with_tags: filter on tags.  None means no tag filtering
+        :param with_text: filter on text.  None means no text filtering
+        :param after_date: Only return entries after date. None means no after date filtering
+        :param before_date: Only return entries before date. None means no after date filtering
+        :param ignore_case: match with_text case-insensitively
+        :param regex: treat with_text as a regular expression
+        :param after_cursor: only list entries older than this one, given by its path, to page back through history
+        :param with_bodies: read the entries' bodies up front.  Without, listing titles or tags reads nothing the
+            index can answer
+        :param oldest_first: list in chronological order instead
+        :return: generator of Entry, which unpack to (file, lines), for all entries matching the given criteria.
+            All entries are decrypted.
+        """
+        return self._iter_matches(
+            max_entries, with_tags, with_text, after_date, before_date, ignore_case=ignore_case, regex=regex,
+            after_cursor=after_cursor, with_bodies=with_bodies, oldest_first=oldest_first
+        )
+
+    def list_entries(self, max_entries=-1, with_tags=None, with_text=None, after_date=None, before_date=None,
+                     ignore_case=False, regex=False, after_cursor=None, with_bodies=True) -> list:
+        """
+        :return: list of Entry, which unpack to (file, lines), for all entries matching the given criteria.  All
+            entries are decrypted.  See iter_entries for the parameters.
+        """
+        return list(self.iter_entries(
+            max_entries, with_tags, with_text, after_date, before_date, ignore_case=ignore_case, regex=regex,
+            after_cursor=after_cursor, with_bodies=with_bodies
+        ))
+
+    def _find_tags_in_entry(self, entry: list) -> list:
+        return find_tags('\n'.join(entry))
+
+    def tag_counts(self) -> dict:
+        """
+        :return: a dict of tag to the number of entries carrying it
+        """
+        counts = Counter(self.index.tag_counts(self.book_name))
+        for entry in self._read_entries(sorted(self.index.encrypted_paths(self.book_name))):
+            counts.update(set(self._find_tags_in_entry(entry)))
+        return dict(counts)
+
+    def list_tags(self):
+        return list(self.tag_counts())
+
+    def find_related(self, filename: str, count: int = 10) -> list:
+        """
+        Find the entries most similar to one, see daybook.related.RelatedEntries.  Needs numpy and scipy.
+
+        :param filename: the entry's path
+        :param count: how many to find
+        :return: a list of (Entry, score), most similar first
+        """
+        if self._related is None:
+            from daybook.related import RelatedEntries
+            self._related = RelatedEntries(self)
+        similar = self._related.similar(filename, count)
+        entries = self.read_entries([f for f, _ in similar])
+        return [(entry, score) for entry, (_, score) in zip(entries, similar)]
+
+    def encrypt(self, entry: str) -> str:
+        """
+        :param entry: the plaintext entry
+        :return: the entry encrypted with this book's key, ready to be written to a .txt.encrypted file
+        """
+        return encryption.encrypt(entry, self.encryption_salt, self.key_check_path)
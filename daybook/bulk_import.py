@@ -0,0 +1,206 @@
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+
+from daybook.dates import parse_date
+from daybook.locking import write_lock
+from daybook.utils import get_entry_filename
+
+
+def _parse_timestamp(value) -> float:
+    if value is None:
+        raise ValueError("No timestamp given")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str):
+        raise ValueError("Unrecognized timestamp: {!r}".format(value))
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError("Unrecognized timestamp: {}".format(value))
+    return parsed.timestamp()
+
+
+def _check_record(record, where: str) -> dict:
+    """
+    :param where: the record's source, e.g. file:line, for the error
+    :raise Exception: if the record isn't an object with a timestamp we can read
+    """
+    if not isinstance(record, dict):
+        raise Exception("{}: an entry must be a JSON object".format(where))
+    try:
+        _parse_timestamp(record.get('timestamp'))
+    except ValueError as e:
+        raise Exception("{0}: {1}".format(where, e))
+    return record
+
+
+def _read_lines(fp, name: str):
+    for n, line in enumerate(fp, 1):
+        if not line.strip():
+            continue
+        where = '{0}:{1}'.format(name, n)
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise Exception("{0}: {1}".format(where, e))
+        yield _check_record(record, where)
+
+
+def _read_file_records(path: str):
+    if path.endswith('.jsonl'):
+        with open(path) as fp:
+            yield from _read_lines(fp, path)
+    elif path.endswith('.json'):
+        with open(path) as fp:
+            try:
+                record = json.load(fp)
+            except ValueError as e:
+                raise Exception("{0}: {1}".format(path, e))
+        yield _check_record(record, path)
+    else:
+        # a plain text entry, created when the file was last modified
+        with open(path) as fp:
+            yield {'timestamp': os.path.getmtime(path), 'body': fp.read()}
+
+
+def read_records(source: str):
+    """
+    Stream the entries to import from a source.
+
+    :param source: a JSONL file (or - for stdin) with one entry per line, or a directory of .json, .jsonl or
+        plain text files.  Each entry is an object with a timestamp (unix time, or a date daybook can parse)
+        and optionally a title, tags (a list or a comma-separated string), a body, and encrypted (a boolean).
+    :return: a generator of entry dicts
+    :raise Exception: naming the file and line of the first entry which isn't valid JSON or has no usable timestamp
+    """
+    if source == '-':
+        yield from _read_lines(sys.stdin, '<stdin>')
+    elif os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for f in sorted(files):
+                yield from _read_file_records(os.path.join(root, f))
+    else:
+        yield from _read_file_records(source)
+
+
+def format_entry(record: dict) -> str:
+    """
+    Lay out an imported entry the way editor_create_entry templates a new one: title, then tags, then the body.
+    A record with the entry's full text, as dybk export writes, is taken as it is.
+    """
+    if record.get('text') is not None:
+        return record['text']
+    tags = record.get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    tags = ' '.join('@@{}'.format(t.strip().lstrip('@')) for t in tags if t.strip())
+    parts = [p for p in (record.get('title'), tags, record.get('body')) if p]
+    return '\n\n'.join(parts).rstrip('\n') + '\n'
+
+
+def _git(base_dir: str, *args) -> str:
+    return subprocess.check_output(['git'] + list(args), cwd=base_dir, stderr=subprocess.DEVNULL).decode('utf-8').strip()
+
+
+def _get_ident(base_dir: str, var: str) -> str:
+    """
+    :return: "Name <email>" for git's configured author or committer
+    """
+    ident = _git(base_dir, 'var', var)
+    return ident[:ident.rindex('>') + 1]
+
+
+def _data(payload: bytes) -> bytes:
+    return b'data ' + str(len(payload)).encode('ascii') + b'\n' + payload + b'\n'
+
+
+def _get_stem(path: str) -> str:
+    """
+    :return: an entry's path without its extension, which is the same whether or not it is encrypted
+    """
+    return path.rsplit('.txt', 1)[0]
+
+
+def fast_import(book, records) -> int:
+    """
+    Commit a stream of entries to a book with a single `git fast-import` process, one commit per entry.
+    Each commit's author date is the entry's own timestamp.  Entries are committed in the order given.
+
+    The import holds the repository's write lock, having first committed any journalled entries, and never overwrites
+    an entry: one whose timestamp is taken, by an entry already in the book or earlier in the import, is moved on by
+    a microsecond until it is free.
+
+    :param book: the Daybook to import into
+    :param records: entry dicts, as produced by read_records.  Entries with a true `encrypted` are encrypted.
+    :return: the number of entries imported
+    """
+    base_dir = book.base_dir
+    with write_lock(base_dir):
+        book.journal.flush(book)
+        try:
+            branch = _git(base_dir, 'symbolic-ref', 'HEAD')
+        except subprocess.CalledProcessError:
+            raise Exception("Can't import into {}: HEAD is detached.  Check out a branch first".format(base_dir))
+        try:
+            old_head = _git(base_dir, 'rev-parse', '--verify', '-q', 'HEAD')
+        except subprocess.CalledProcessError:
+            old_head = None
+        author = _get_ident(base_dir, 'GIT_AUTHOR_IDENT').encode('utf-8')
+        committer = _get_ident(base_dir, 'GIT_COMMITTER_IDENT').encode('utf-8')
+        taken = set(_get_stem(p) for p in book.index.paths(book.book_name))
+
+        proc = subprocess.Popen(['git', 'fast-import', '--quiet'], cwd=base_dir, stdin=subprocess.PIPE)
+        num_imported = 0
+        try:
+            for record in records:
+                timestamp = _parse_timestamp(record['timestamp'])
+                is_encrypted = bool(record.get('encrypted'))
+                filename = get_entry_filename(book.book_name, timestamp, is_encrypted)
+                while _get_stem(os.path.join(base_dir, filename)) in taken:
+                    # two entries in the same microsecond; nudge the later one so neither is overwritten
+                    timestamp += 0.000001
+                    filename = get_entry_filename(book.book_name, timestamp, is_encrypted)
+                taken.add(_get_stem(os.path.join(base_dir, filename)))
+
+                entry = format_entry(record)
+                entry = (book.encrypt(entry) if is_encrypted else entry).encode('utf-8')
+                message = (record.get('title') or "<no title given>").encode('utf-8')
+                tz = time.strftime('%z', time.localtime(timestamp)).encode('ascii')
+                now = str(int(time.time())).encode('ascii') + b' ' + time.strftime('%z').encode('ascii')
+
+                chunk = b'commit ' + branch.encode('utf-8') + b'\n'
+                chunk += b'author ' + author + b' ' + str(int(timestamp)).encode('ascii') + b' ' + tz + b'\n'
+                chunk += b'committer ' + committer + b' ' + now + b'\n'
+                chunk += _data(message)
+                if num_imported == 0 and old_head:
+                    chunk += b'from ' + old_head.encode('ascii') + b'\n'
+                chunk += b'M 100644 inline ' + filename.encode('utf-8') + b'\n' + _data(entry)
+                proc.stdin.write(chunk)
+                num_imported += 1
+        except BaseException:
+            # killing fast-import before it finishes leaves the branch untouched
+            proc.kill()
+            proc.wait()
+            raise
+        proc.stdin.close()
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, 'git fast-import')
+
+        if num_imported:
+            # fast-import only moves the branch; bring the index and working tree along with it
+            if old_head:
+                _git(base_dir, 'read-tree', '-m', '-u', old_head, 'HEAD')
+            else:
+                _git(base_dir, 'read-tree', '--reset', '-u', 'HEAD')
+    return num_imported
@@ -0,0 +1,111 @@
+import os
+import sys
+
+# dybk imports this before anything else, so it holds off on further imports until it knows a daemon is listening
+
+# read-only commands that need no terminal of their own; anything interactive always runs in-process
+FORWARDED_COMMANDS = frozenset(['list_entries', 'list_tags', 'list_daybooks', 'list_commands'])
+
+
+def get_socket_path() -> str:
+    """
+    :return: the daemon's socket, $DAYBOOK_SOCKET if set, otherwise ~/.daybook.sock
+    """
+    return os.getenv('DAYBOOK_SOCKET') or os.path.join(os.path.expanduser('~'), '.daybook.sock')
+
+
+def forward(argv: list, socket_path: str = None):
+    """
+    Run a command in the daemon, if one is listening and the command can be forwarded.
+
+    :param argv: the command line, without the program name
+    :param socket_path: where the daemon listens, see get_socket_path
+    :return: the command's exit code, or None if it should run in-process instead, including when the daemon hands it
+        back for want of a passphrase
+    """
+    # depending on the version of argh, commands are spelled list-entries or list_entries
+    if not argv or argv[0].replace('-', '_') not in FORWARDED_COMMANDS:
+        return None
+    socket_path = socket_path or get_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+
+    import json
+    import socket
+
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(socket_path)
+    except OSError:
+        s.close()
+        return None
+
+    from contextlib import ExitStack
+
+    # the daemon's output is the client's, so it colors and pages by the client's terminal, and paging happens here
+    request = {'argv': argv, 'tty': sys.stdout.isatty()}
+    out = sys.stdout
+    with s, s.makefile('rwb') as conn, ExitStack() as pager:
+        conn.write(json.dumps(request).encode('utf-8') + b'\n')
+        conn.flush()
+        for line in conn:
+            message = json.loads(line.decode('utf-8'))
+            if 'exit' in message:
+                return message['exit']
+            if message.get('in_process'):
+                return None
+            if message.get('page'):
+                from daybook.render import Pager
+                out = pager.enter_context(Pager())
+                continue
+            try:
+                out.write(message['out'])
+            except BrokenPipeError:
+                # the pager was quit before the end
+                return 0
+    # the daemon went away mid-command
+    return 1
+
+
+def _ask(request: dict, socket_path: str = None):
+    """
+    Send the daemon a request with a one-line reply
+
+    :return: the reply, or None if no daemon is listening
+    """
+    socket_path = socket_path or get_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+
+    import json
+    import socket
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(socket_path)
+            with s.makefile('rwb') as conn:
+                conn.write(json.dumps(request).encode('utf-8') + b'\n')
+                conn.flush()
+                line = conn.readline()
+    except OSError:
+        return None
+    return json.loads(line.decode('utf-8')) if line else None
+
+
+def fetch_key(salt: bytes, socket_path: str = None):
+    """
+    Get a key from the daemon, which holds keys for the commands run after the one which derived them, like ssh-agent
+
+    :return: a tuple of (key, seconds it has left), or None if no daemon holds it
+    """
+    reply = _ask({'get_key': salt.hex()}, socket_path)
+    if not reply or not reply.get('key'):
+        return None
+    return bytes.fromhex(reply['key']), reply['ttl']
+
+
+def store_key(salt: bytes, key: bytes, ttl: float, socket_path: str = None) -> None:
+    """
+    Hand a derived key to the daemon, if one is listening, to keep for `ttl` seconds
+    """
+    _ask({'add_key': salt.hex(), 'key': key.hex(), 'ttl': ttl}, socket_path)
@@ -0,0 +1,138 @@
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+
+from daybook import encryption
+from daybook.client import get_socket_path, FORWARDED_COMMANDS
+
+
+class _SocketWriter(io.TextIOBase):
+    """
+    A text stream forwarding everything written to it to the client, as {"out": ...} messages.
+    """
+
+    def __init__(self, wfile, tty: bool = False):
+        self.wfile = wfile
+        self.tty = tty
+        self.written = False
+
+    def isatty(self):
+        # whether the client's output is a terminal, so commands color and page as they would there
+        return self.tty
+
+    def page(self):
+        """
+        Have the client page what follows, through its own $PAGER
+        """
+        self.wfile.write(json.dumps({'page': True}).encode('utf-8') + b'\n')
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if s:
+            self.wfile.write(json.dumps({'out': s}).encode('utf-8') + b'\n')
+            self.written = True
+        return len(s)
+
+    def flush(self):
+        self.wfile.flush()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode('utf-8'))
+        if 'get_key' in request or 'add_key' in request:
+            self.wfile.write(json.dumps(self._handle_key(request)).encode('utf-8') + b'\n')
+            return
+        out = _SocketWriter(self.wfile, request.get('tty', False))
+        # stdout is process-wide, so requests take turns
+        with self.server.lock, redirect_stdout(out), redirect_stderr(out):
+            try:
+                self.server.dispatch(request['argv'], out)
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except BrokenPipeError:
+                return
+            except encryption.PassphraseRequired as e:
+                if not out.written:
+                    # the client asks for the passphrase on its own terminal, and runs the command itself
+                    self.wfile.write(json.dumps({'in_process': True}).encode('utf-8') + b'\n')
+                    return
+                print("{}, or stop the daemon".format(e))
+                code = 1
+            except encryption.WrongPassphrase as e:
+                print(e)
+                code = 1
+            except Exception:
+                traceback.print_exc()
+                code = 1
+        self.wfile.write(json.dumps({'exit': code}).encode('utf-8') + b'\n')
+
+
+    def _handle_key(self, request: dict) -> dict:
+        # keys are held for clients as ssh-agent holds them, in memory and for as long as they were given for
+        if 'add_key' in request:
+            encryption.add_key(bytes.fromhex(request['add_key']), bytes.fromhex(request['key']), request['ttl'])
+            return {}
+        held = encryption.get_cached_key(bytes.fromhex(request['get_key']))
+        return {'key': held[0].hex(), 'ttl': held[1]} if held else {}
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(dispatch, socket_path: str = None) -> None:
+    """
+    Serve commands over a Unix socket until interrupted.  State built up by the commands (configs, books and
+    their indexes) stays warm between requests.
+
+    The daemon never asks for the passphrase, which would hold up every other client while it waited on a terminal
+    that may not be there.  Unless it has $DAYBOOK_PASSPHRASE, a command needing a key it doesn't hold is handed back
+    to the client.  Clients hand it the keys they derive, for KEY_TTL, so one prompt serves every command until then.
+
+    :param dispatch: a callable taking (argv, output stream) and running the command
+    :param socket_path: where to listen, see get_socket_path
+    """
+    socket_path = socket_path or get_socket_path()
+    if os.path.exists(socket_path):
+        if _is_listening(socket_path):
+            raise Exception("A daemon is already listening on {}".format(socket_path))
+        os.remove(socket_path)
+
+    old_umask = os.umask(0o077)
+    try:
+        server = _Server(socket_path, _RequestHandler)
+    finally:
+        os.umask(old_umask)
+    server.dispatch = dispatch
+    server.lock = threading.Lock()
+    encryption.disable_prompt()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print("Listening on {}".format(socket_path))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+
+def _is_listening(socket_path: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(socket_path)
+        return True
+    except OSError:
+        return False
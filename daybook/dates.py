@@ -0,0 +1,119 @@
+import bisect
+import calendar
+import datetime
+import os
+import re
+
+from daybook import profile
+
+DAY_DIR_FORMAT = "%m_%d_%Y"
+
+DAY_DIR_RE = re.compile(r'^\d\d_\d\d_\d\d\d\d$')
+ENTRY_FILENAME_RE = re.compile(r'^(\d+(?:\.\d+)?)\.txt(?:\.encrypted)?$')
+RELATIVE_DATE_RE = re.compile(r'^(\d+)[\s.]*(second|minute|hour|day|week|month|year)s?[\s.]+ago$')
+
+ABSOLUTE_DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M",
+    "%Y-%m-%dT%H:%M:%S",
+    "%m/%d/%Y",
+    DAY_DIR_FORMAT,
+]
+
+UNIT_SECONDS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 60 * 60,
+    'day': 24 * 60 * 60,
+    'week': 7 * 24 * 60 * 60,
+}
+
+
+def _months_ago(now: datetime.datetime, months: int) -> datetime.datetime:
+    month_index = now.year * 12 + now.month - 1 - months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return now.replace(year=year, month=month, day=min(now.day, calendar.monthrange(year, month)[1]))
+
+
+def parse_date(value: str, now: datetime.datetime = None):
+    """
+    Parse the date expressions daybook understands without asking git: now, today, yesterday, relative dates
+    like "3 days ago" or "2.weeks.ago", unix timestamps prefixed with @, and absolute dates like 2020-10-22,
+    2020-10-22 13:45, 10/22/2020 or 10_22_2020.  Dates without a time mean midnight, local time.
+
+    :param value: the date expression
+    :param now: the current time, for relative dates.  Defaults to datetime.datetime.now()
+    :return: a naive, local datetime, or None if the expression isn't understood
+    """
+    now = now or datetime.datetime.now()
+    value = value.strip().lower()
+    if value == 'now':
+        return now
+    if value == 'today':
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if value == 'yesterday':
+        return now.replace(hour=0, minute=0, second=0, microsecond=0) - datetime.timedelta(days=1)
+    if re.match(r'^@\d+(\.\d+)?$', value):
+        return datetime.datetime.fromtimestamp(float(value[1:]))
+
+    m = RELATIVE_DATE_RE.match(value)
+    if m:
+        n, unit = int(m.group(1)), m.group(2)
+        if unit == 'month':
+            return _months_ago(now, n)
+        if unit == 'year':
+            return _months_ago(now, 12 * n)
+        return now - datetime.timedelta(seconds=n * UNIT_SECONDS[unit])
+
+    for fmt in ABSOLUTE_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def get_paths_in_range(project_dir: str, after: float = None, before: float = None) -> list:
+    """
+    Find the entries of a book created within a time range, using only the mm_dd_yyyy/<timestamp>.txt layout.
+    Only the day directories overlapping the range are listed, and the timestamps within each are bisected.
+
+    :param project_dir: the book's directory
+    :param after: the earliest timestamp to include, or None for no lower bound
+    :param before: the latest timestamp to include, or None for no upper bound
+    :return: the absolute paths of the matching entries, most recent first
+    """
+    # a day of slack either side, for entries written in another timezone than the one they're filed under
+    slack = datetime.timedelta(days=1)
+    first_day = (datetime.datetime.fromtimestamp(after) - slack).date() if after is not None else None
+    last_day = (datetime.datetime.fromtimestamp(before) + slack).date() if before is not None else None
+
+    day_dirs = []
+    with os.scandir(project_dir) as it:
+        for d in it:
+            if not (DAY_DIR_RE.match(d.name) and d.is_dir()):
+                continue
+            day = datetime.datetime.strptime(d.name, DAY_DIR_FORMAT).date()
+            if (first_day and day < first_day) or (last_day and day > last_day):
+                continue
+            day_dirs.append(d.path)
+    profile.count('dirs_listed', 1 + len(day_dirs))
+
+    found = []
+    for day_dir in day_dirs:
+        day_entries = []
+        with os.scandir(day_dir) as it:
+            for e in it:
+                m = ENTRY_FILENAME_RE.match(e.name)
+                if m:
+                    day_entries.append((float(m.group(1)), e.path))
+        day_entries.sort()
+        timestamps = [ts for ts, _ in day_entries]
+        lo = bisect.bisect_left(timestamps, after) if after is not None else 0
+        hi = bisect.bisect_right(timestamps, before) if before is not None else len(timestamps)
+        found += day_entries[lo:hi]
+
+    return [path for _, path in sorted(found, reverse=True)]
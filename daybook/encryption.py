@@ -1,3 +1,290 @@
-def encrypt(entry:str) -> str:
-    print("Encryption not yet implemented")
-    return entry
+import atexit
+import base64
+import getpass
+import hashlib
+import json
+import os
+import threading
+import time
+
+from daybook import profile
+
+# an encrypted entry is a single line: this header, then base64 of salt + nonce + AES-GCM ciphertext and tag
+HEADER = "daybook-encrypted-v1:"
+SALT_SIZE = 16
+NONCE_SIZE = 12
+
+# scrypt costs about a tenth of a second, which is why derived keys are cached rather than derived per entry
+SCRYPT_N = 2 ** 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+# sealed with a book's key and kept beside the index, so a mistyped passphrase is caught before it encrypts anything
+KEY_CHECK = b'daybook-key-check'
+
+# how long a derived key is kept, in seconds, much like ssh-agent -t
+KEY_TTL = int(os.getenv('DAYBOOK_KEY_TTL', '900'))
+
+# AES-GCM decrypts a few KB in microseconds, and shipping an entry to a worker and its plaintext back costs about two
+# thirds as much again, so a pool only pays off on several CPUs and batches large enough to cover starting the workers
+MIN_POOL_CPUS = 4
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+_KEYS = {}
+_PASSPHRASE = None
+_KEYS_LOCK = threading.Lock()
+_POOL = None
+_PROMPT = True
+# the daemon holds keys for other processes (see daybook.client.fetch_key); it is the agent, so doesn't ask one
+_USE_AGENT = True
+
+
+class PassphraseRequired(Exception):
+    """
+    Raised instead of asking for the passphrase, where there's no terminal to ask at, e.g. in the daemon
+    """
+    pass
+
+
+class WrongPassphrase(Exception):
+    """
+    Raised when a key doesn't open a book's key check, or an entry
+    """
+    pass
+
+
+def _get_aesgcm(key: bytes):
+    try:
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    except ImportError:
+        raise Exception("Encrypted entries need the cryptography package: pip install cryptography")
+    return AESGCM(key)
+
+
+def get_book_salt(book_name: str, remote_url: str) -> bytes:
+    """
+    The salt new entries of a book are encrypted with.  It is stable for the book, so every entry shares one key and
+    a session only derives it once.  Each entry records its own salt, so older entries still decrypt if this changes.
+    """
+    return hashlib.sha256('daybook:{0}:{1}'.format(book_name, remote_url).encode('utf-8')).digest()[:SALT_SIZE]
+
+
+def _get_passphrase(now: float) -> tuple:
+    """
+    :return: a tuple of (passphrase, whether it was typed just now)
+    """
+    # kept as long as the keys are, so that querying several books asks for it once rather than once per book
+    global _PASSPHRASE
+    typed = False
+    if _PASSPHRASE is None or _PASSPHRASE[1] <= now:
+        passphrase = os.getenv('DAYBOOK_PASSPHRASE')
+        if not passphrase:
+            if not _PROMPT:
+                raise PassphraseRequired("Encrypted entries need a passphrase: set $DAYBOOK_PASSPHRASE")
+            passphrase = getpass.getpass("Daybook passphrase: ")
+            typed = True
+        _PASSPHRASE = (passphrase, now + KEY_TTL)
+    return _PASSPHRASE[0], typed
+
+
+def disable_prompt() -> None:
+    """
+    Raise PassphraseRequired rather than ask for the passphrase, when it isn't in $DAYBOOK_PASSPHRASE or cached, and
+    don't look for keys in the daemon: this is the daemon
+    """
+    global _PROMPT, _USE_AGENT
+    _PROMPT = False
+    _USE_AGENT = False
+
+
+def add_key(salt: bytes, key: bytes, ttl: float) -> None:
+    """
+    Hold a key derived elsewhere for `ttl` seconds
+    """
+    with _KEYS_LOCK:
+        _KEYS[salt] = (key, time.time() + min(ttl, KEY_TTL))
+
+
+def get_cached_key(salt: bytes):
+    """
+    :return: a tuple of (key, seconds it has left) for a key held in this process, or None
+    """
+    now = time.time()
+    with _KEYS_LOCK:
+        cached = _KEYS.get(salt)
+    return (cached[0], cached[1] - now) if cached and cached[1] > now else None
+
+
+def _read_key_checks(check_path: str) -> dict:
+    try:
+        with open(check_path) as fp:
+            return json.load(fp)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_key_check(check_path: str, salt: bytes, key: bytes) -> None:
+    checks = _read_key_checks(check_path)
+    nonce = os.urandom(NONCE_SIZE)
+    checks[salt.hex()] = base64.b64encode(nonce + _get_aesgcm(key).encrypt(nonce, KEY_CHECK, None)).decode('ascii')
+    os.makedirs(os.path.dirname(check_path), exist_ok=True)
+    tmp = check_path + '.tmp'
+    with open(tmp, 'w') as fp:
+        json.dump(checks, fp)
+    os.replace(tmp, check_path)
+
+
+def _opens(key: bytes, nonce: bytes, ciphertext: bytes) -> bool:
+    from cryptography.exceptions import InvalidTag
+    try:
+        _get_aesgcm(key).decrypt(nonce, ciphertext, None)
+        return True
+    except InvalidTag:
+        return False
+
+
+def _check_key(salt: bytes, key: bytes, typed: bool, check_path: str, sample: str = None) -> None:
+    """
+    Make sure a freshly derived key is the book's key: it must open the key check kept for its salt.  Without one, it
+    must open `sample`, an entry encrypted with the salt, or failing that a passphrase typed just now is asked for
+    again.  The key check is then written, so the key is checked from then on.
+
+    :raises WrongPassphrase: if the key isn't the book's
+    """
+    global _PASSPHRASE
+    sealed = _read_key_checks(check_path).get(salt.hex())
+    if sealed:
+        raw = base64.b64decode(sealed)
+        ok = _opens(key, raw[:NONCE_SIZE], raw[NONCE_SIZE:])
+    elif sample:
+        _, nonce, ciphertext = _split(sample)
+        ok = _opens(key, nonce, ciphertext)
+    else:
+        ok = not typed or getpass.getpass("Repeat the passphrase: ") == _PASSPHRASE[0]
+    if not ok:
+        _PASSPHRASE = None
+        from_env = not typed and os.getenv('DAYBOOK_PASSPHRASE')
+        raise WrongPassphrase("Wrong passphrase" + (" in $DAYBOOK_PASSPHRASE" if from_env else ""))
+    if not sealed:
+        _save_key_check(check_path, salt, key)
+
+
+def get_key(salt: bytes, check_path: str = None, sample: str = None) -> bytes:
+    """
+    Get the key for a salt, deriving it from the passphrase only if it isn't cached or has expired, in this process
+    or in the daemon.  Keys derived here are handed to the daemon, if one is running.
+
+    :param check_path: where the books' key checks are kept (see _check_key), so a wrong passphrase is refused rather
+        than used and cached.  Without one the key isn't checked
+    :param sample: an entry encrypted with the salt, to check the key against if there is no key check yet
+    :raises WrongPassphrase: if the key fails the check
+    """
+    now = time.time()
+    held = get_cached_key(salt)
+    if held:
+        return held[0]
+    if _USE_AGENT:
+        from daybook.client import fetch_key
+        held = fetch_key(salt)
+        if held:
+            add_key(salt, *held)
+            return held[0]
+    with _KEYS_LOCK:
+        cached = _KEYS.get(salt)
+        if cached and cached[1] > now:
+            return cached[0]
+        passphrase, typed = _get_passphrase(now)
+        with profile.span('derive_key'):
+            key = hashlib.scrypt(
+                passphrase.encode('utf-8'), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P,
+                maxmem=256 * SCRYPT_N * SCRYPT_R, dklen=32
+            )
+        if check_path:
+            _check_key(salt, key, typed, check_path, sample)
+        _KEYS[salt] = (key, now + KEY_TTL)
+        if _USE_AGENT:
+            from daybook.client import store_key
+            store_key(salt, key, KEY_TTL)
+        return key
+
+
+def forget_keys() -> None:
+    global _PASSPHRASE
+    with _KEYS_LOCK:
+        _KEYS.clear()
+        _PASSPHRASE = None
+
+
+def is_encrypted(body: str) -> bool:
+    return body.startswith(HEADER)
+
+
+def encrypt(entry: str, salt: bytes, check_path: str = None) -> str:
+    """
+    :param entry: the plaintext entry
+    :param salt: the salt to derive the key from, see get_book_salt
+    :param check_path: where key checks are kept, see get_key
+    :return: the entry encrypted and authenticated with AES-GCM, as a single line of text
+    """
+    nonce = os.urandom(NONCE_SIZE)
+    ciphertext = _get_aesgcm(get_key(salt, check_path)).encrypt(nonce, entry.encode('utf-8'), None)
+    return HEADER + base64.b64encode(salt + nonce + ciphertext).decode('ascii') + '\n'
+
+
+def _split(body: str) -> tuple:
+    if not is_encrypted(body):
+        raise Exception("Not an encrypted entry")
+    raw = base64.b64decode(body[len(HEADER):].strip())
+    return raw[:SALT_SIZE], raw[SALT_SIZE:SALT_SIZE + NONCE_SIZE], raw[SALT_SIZE + NONCE_SIZE:]
+
+
+def _decrypt_with_key(key: bytes, body: str) -> str:
+    from cryptography.exceptions import InvalidTag
+    _, nonce, ciphertext = _split(body)
+    try:
+        return _get_aesgcm(key).decrypt(nonce, ciphertext, None).decode('utf-8')
+    except InvalidTag:
+        raise WrongPassphrase("An entry can't be decrypted: the passphrase is wrong, or the entry was tampered with")
+
+
+def decrypt(body: str, check_path: str = None) -> str:
+    """
+    :param body: an entry produced by encrypt
+    :param check_path: where key checks are kept, see get_key
+    :return: the plaintext entry
+    :raises WrongPassphrase: if the passphrase is wrong or the entry was tampered with
+    """
+    salt, _, _ = _split(body)
+    return _decrypt_with_key(get_key(salt, check_path, sample=body), body)
+
+
+def _get_pool():
+    global _POOL
+    if _POOL is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # not forked: the pool can be started from any thread, e.g. a merge's scans or a daemon's handlers, and a fork
+        # taken while another thread holds a lock leaves the child stuck on it
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        _POOL = ProcessPoolExecutor(mp_context=multiprocessing.get_context(method))
+        # shut the workers down before the interpreter starts tearing modules down
+        atexit.register(_POOL.shutdown)
+    return _POOL
+
+
+def decrypt_many(bodies: list, check_path: str = None) -> list:
+    """
+    Decrypt many entries, spreading the work over a process pool when there are enough of them (see MIN_POOL_CPUS and
+    PARALLEL_MIN_BYTES), as when a whole diary is read at once.  Keys are derived (or taken from the cache) once, here,
+    and handed to the workers with each entry.
+
+    :param bodies: entries produced by encrypt
+    :param check_path: where key checks are kept, see get_key
+    :return: the plaintext entries, in the same order
+    """
+    keys = [get_key(_split(b)[0], check_path, sample=b) for b in bodies]
+    cpus = os.cpu_count() or 1
+    if cpus < MIN_POOL_CPUS or sum(len(b) for b in bodies) < PARALLEL_MIN_BYTES:
+        return [_decrypt_with_key(k, b) for k, b in zip(keys, bodies)]
+    chunksize = max(1, len(bodies) // (4 * cpus))
+    return list(_get_pool().map(_decrypt_with_key, keys, bodies, chunksize=chunksize))
@@ -0,0 +1,75 @@
+from daybook.utils import get_entry_title, find_tags
+
+
+class Entry(object):
+    """
+    An entry found by a query.  What the index knows about it (its title and tags) is kept from the start, and its
+    body is only read, and if need be decrypted, when something asks for it.  An Entry still unpacks into the
+    (file, lines) pair queries used to return:
+
+        for f, lines in book.iter_entries():
+            ...
+    """
+    __slots__ = ('path', 'timestamp', 'is_encrypted', '_title', '_tags', '_lines', '_read')
+
+    def __init__(self, path: str, timestamp: float, read, lines: list = None, title: str = None, tags: list = None):
+        """
+        :param path: the entry's path
+        :param timestamp: when the entry was created
+        :param read: a callable reading a list of paths, returning the lines of each, e.g. Daybook._read_entries
+        :param lines: the entry's lines, if they have been read already
+        :param title: the entry's title, if the index knows it
+        :param tags: the entry's tags, if the index knows them
+        """
+        self.path = path
+        self.timestamp = timestamp
+        self.is_encrypted = path.endswith(".txt.encrypted")
+        self._read = read
+        self._lines = lines
+        self._title = title
+        self._tags = tags
+
+    @property
+    def lines(self) -> list:
+        if self._lines is None:
+            self._lines = self._read([self.path])[0]
+        return self._lines
+
+    @property
+    def body(self) -> str:
+        return ''.join(self.lines)
+
+    @property
+    def title(self) -> str:
+        """
+        The first non-whitespace line, without its line ending
+        """
+        if self._title is None:
+            self._title = (get_entry_title(self.body) or '').rstrip()
+        return self._title
+
+    @property
+    def tags(self) -> list:
+        """
+        The entry's tags, sorted, without their leading @@
+        """
+        if self._tags is None:
+            self._tags = sorted(set(find_tags(self.body)))
+        return self._tags
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._lines is not None
+
+    def __iter__(self):
+        yield self.path
+        yield self.lines
+
+    def __getitem__(self, i):
+        return (self.path, self.lines)[i]
+
+    def __len__(self):
+        return 2
+
+    def __repr__(self):
+        return 'Entry({!r})'.format(self.path)
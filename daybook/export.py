@@ -0,0 +1,173 @@
+import datetime
+import hashlib
+import html
+import json
+import os
+
+from daybook.dates import ENTRY_FILENAME_RE
+
+# entries per page of an HTML export
+PAGE_SIZE = 100
+
+# the HTML export's record of what it last wrote, kept in the output directory
+STATE_FILE = '.daybook-export.json'
+
+# bump this whenever the pages' layout changes, so the next export rewrites every page
+EXPORT_VERSION = 1
+
+FORMATS = ('jsonl', 'markdown', 'html')
+
+
+def _format_time(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M')
+
+
+def _get_timestamp(path: str) -> float:
+    return float(ENTRY_FILENAME_RE.match(os.path.basename(path)).group(1))
+
+
+def _replace(path: str, text: str) -> None:
+    # written aside and renamed into place, so an interrupted export never leaves a half-written file
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fp:
+        fp.write(text)
+    os.replace(tmp, path)
+
+
+def export_jsonl(book, out, query: dict) -> int:
+    """
+    Write entries as JSON lines, oldest first, in the form bulk_import reads back.
+
+    :param book: the Daybook to export
+    :param out: a text stream
+    :param query: the filters, as for Daybook.iter_entries
+    :return: how many entries were written
+    """
+    n = 0
+    for entry in book.iter_entries(oldest_first=True, **query):
+        out.write(json.dumps({
+            'path': os.path.relpath(entry.path, book.base_dir),
+            'timestamp': entry.timestamp,
+            'title': entry.title,
+            'tags': entry.tags,
+            'encrypted': entry.is_encrypted,
+            'text': entry.body,
+        }) + '\n')
+        n += 1
+    return n
+
+
+def export_markdown(book, out, query: dict) -> int:
+    """
+    Write entries as a single Markdown document, oldest first, each under a heading giving its date.
+
+    :return: how many entries were written
+    """
+    out.write('# {}\n'.format(book.book_name))
+    n = 0
+    for entry in book.iter_entries(oldest_first=True, **query):
+        out.write('\n## {}\n\n{}\n'.format(_format_time(entry.timestamp), entry.body.rstrip('\n')))
+        n += 1
+    return n
+
+
+def _page_name(number: int) -> str:
+    return 'page-{:05d}.html'.format(number)
+
+
+def _render_page(book, number: int, num_pages: int, entries: list) -> str:
+    links = ['<a href="index.html">contents</a>']
+    if number > 1:
+        links.insert(0, '<a href="{}">older</a>'.format(_page_name(number - 1)))
+    if number < num_pages:
+        links.append('<a href="{}">newer</a>'.format(_page_name(number + 1)))
+    nav = '<nav>{}</nav>'.format(' | '.join(links))
+    parts = [
+        '<!DOCTYPE html>',
+        '<html><head><meta charset="utf-8"><title>{0} ({1}/{2})</title>'.format(
+            html.escape(book.book_name), number, num_pages
+        ),
+        '<style>pre { white-space: pre-wrap; }</style></head><body>',
+        nav,
+    ]
+    for entry in entries:
+        parts.append('<article id="{0}"><h2>{1}</h2><pre>{2}</pre></article>'.format(
+            html.escape(os.path.basename(entry.path)), _format_time(entry.timestamp), html.escape(entry.body)
+        ))
+    parts += [nav, '</body></html>', '']
+    return '\n'.join(parts)
+
+
+def _render_contents(book, pages: list) -> str:
+    parts = [
+        '<!DOCTYPE html>',
+        '<html><head><meta charset="utf-8"><title>{}</title></head><body>'.format(html.escape(book.book_name)),
+        '<h1>{}</h1>'.format(html.escape(book.book_name)),
+        '<ol>',
+    ]
+    for number, paths in enumerate(pages, 1):
+        parts.append('<li><a href="{0}">{1} to {2}</a> ({3} entries)</li>'.format(
+            _page_name(number), _format_time(_get_timestamp(paths[0])), _format_time(_get_timestamp(paths[-1])),
+            len(paths)
+        ))
+    parts += ['</ol>', '</body></html>', '']
+    return '\n'.join(parts)
+
+
+def _fingerprint(book, number: int, num_pages: int, paths: list, blobs: dict) -> str:
+    """
+    What a page's content depends on: its entries' blobs, and whether it links to a newer page
+    """
+    h = hashlib.sha1('{0}:{1}:{2}'.format(EXPORT_VERSION, number, number < num_pages).encode('utf-8'))
+    for p in paths:
+        # an entry not committed yet has no blob, so its file's mtime stands in
+        blob = blobs.get(p) or 'mtime:{}'.format(os.stat(p).st_mtime_ns)
+        h.update('{0}\0{1}\0'.format(os.path.relpath(p, book.base_dir), blob).encode('utf-8'))
+    return h.hexdigest()
+
+
+def export_html(book, output_dir: str, query: dict, page_size: int = PAGE_SIZE) -> tuple:
+    """
+    Write entries as a static site: pages of page_size entries, oldest first, and a contents page.  Pages are
+    fingerprinted by their entries' blob ids, so exporting again only reads and rewrites the pages whose entries have
+    changed, which when entries are only being added is just the last.
+
+    :param book: the Daybook to export
+    :param output_dir: the directory to write the site to
+    :param query: the filters, as for Daybook.iter_entries
+    :param page_size: entries per page
+    :return: a tuple of (number of entries, number of pages, number of pages written)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = os.path.join(output_dir, STATE_FILE)
+    try:
+        with open(state_path) as fp:
+            state = json.load(fp)
+    except (FileNotFoundError, ValueError):
+        state = {}
+    old_pages = state.get('pages', {}) if state.get('page_size') == page_size else {}
+
+    paths = list(book.iter_paths(oldest_first=True, **query))
+    pages = [paths[i:i + page_size] for i in range(0, len(paths), page_size)]
+    blobs = book.index.blobs(paths)
+
+    fingerprints = {}
+    num_written = 0
+    for number, page_paths in enumerate(pages, 1):
+        name = _page_name(number)
+        fingerprint = _fingerprint(book, number, len(pages), page_paths, blobs)
+        fingerprints[name] = fingerprint
+        if old_pages.get(name) == fingerprint and os.path.exists(os.path.join(output_dir, name)):
+            continue
+        # a page's entries are read together, so its encrypted ones are decrypted in parallel
+        _replace(os.path.join(output_dir, name), _render_page(book, number, len(pages), book.read_entries(page_paths)))
+        num_written += 1
+
+    for name in set(old_pages) - set(fingerprints):
+        try:
+            os.remove(os.path.join(output_dir, name))
+        except FileNotFoundError:
+            pass
+    _replace(os.path.join(output_dir, 'index.html'), _render_contents(book, pages))
+    _replace(state_path, json.dumps({'page_size': page_size, 'head': book.index.head, 'pages': fingerprints}))
+    return len(paths), len(pages), num_written
@@ -0,0 +1,381 @@
+import binascii
+import mmap
+import os
+import struct
+import zlib
+from collections import OrderedDict, namedtuple
+
+# pack object types; 5 is unused
+OBJ_COMMIT, OBJ_TREE, OBJ_BLOB, OBJ_TAG, OBJ_OFS_DELTA, OBJ_REF_DELTA = 1, 2, 3, 4, 6, 7
+TYPE_NAMES = {OBJ_COMMIT: b'commit', OBJ_TREE: b'tree', OBJ_BLOB: b'blob', OBJ_TAG: b'tag'}
+
+IDX_MAGIC = b'\377tOc'
+# how many inflated objects to keep around; delta chains mostly hit the same few bases
+CACHE_SIZE = 256
+
+Commit = namedtuple('Commit', ['tree', 'parents', 'author_time', 'commit_time'])
+
+
+class GitObjectError(Exception):
+    """Raised when the repository holds something this reader doesn't handle, so callers can fall back to git."""
+
+
+class _Pack(object):
+    """
+    A packfile and its version 2 index, both mapped into memory.
+    """
+
+    def __init__(self, idx_path: str):
+        with open(idx_path, 'rb') as fp:
+            self.idx = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(idx_path[:-len('.idx')] + '.pack', 'rb') as fp:
+            self.pack = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.idx[:4] != IDX_MAGIC or struct.unpack('>I', self.idx[4:8])[0] != 2:
+            raise GitObjectError("Unsupported pack index: {}".format(idx_path))
+        self.fanout = struct.unpack('>256I', self.idx[8:8 + 256 * 4])
+        self.count = self.fanout[255]
+        self.names_at = 8 + 256 * 4
+        self.offsets_at = self.names_at + self.count * (20 + 4)
+        self.large_offsets_at = self.offsets_at + self.count * 4
+
+    def _name(self, i: int) -> bytes:
+        return self.idx[self.names_at + i * 20:self.names_at + (i + 1) * 20]
+
+    def find(self, sha: bytes):
+        """
+        :param sha: a binary object id
+        :return: the object's offset within the pack, or None if it isn't in this pack
+        """
+        lo = self.fanout[sha[0] - 1] if sha[0] else 0
+        hi = self.fanout[sha[0]]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name = self._name(mid)
+            if name < sha:
+                lo = mid + 1
+            elif name > sha:
+                hi = mid
+            else:
+                offset, = struct.unpack('>I', self.idx[self.offsets_at + mid * 4:self.offsets_at + mid * 4 + 4])
+                if offset & 0x80000000:
+                    at = self.large_offsets_at + (offset & 0x7fffffff) * 8
+                    offset, = struct.unpack('>Q', self.idx[at:at + 8])
+                return offset
+        return None
+
+    def inflate(self, pos: int, size: int) -> bytes:
+        d = zlib.decompressobj()
+        out = []
+        chunk = max(size, 4096)
+        while not d.eof:
+            data = self.pack[pos:pos + chunk]
+            if not data:
+                raise GitObjectError("Truncated pack")
+            out.append(d.decompress(data))
+            pos += chunk
+        return b''.join(out)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple:
+    value = shift = 0
+    while True:
+        c = data[pos]
+        pos += 1
+        value |= (c & 0x7f) << shift
+        shift += 7
+        if not c & 0x80:
+            return value, pos
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """
+    Rebuild an object from its base and a git delta: copy instructions take ranges of the base, and insert
+    instructions carry new bytes.
+    """
+    _, pos = _read_varint(delta, 0)
+    result_size, pos = _read_varint(delta, pos)
+    out = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            offset = size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (0x10 << i):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            out += base[offset:offset + (size or 0x10000)]
+        elif op:
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise GitObjectError("Bad delta instruction")
+    if len(out) != result_size:
+        raise GitObjectError("Delta produced {0} bytes, expected {1}".format(len(out), result_size))
+    return bytes(out)
+
+
+class Repository(object):
+    """
+    A read-only view of a git repository's refs and objects, parsed in-process: loose objects, packfiles with
+    their version 2 indexes, and delta chains.  Anything it can't read raises GitObjectError, so callers can fall
+    back to running git.
+    """
+
+    def __init__(self, base_dir: str):
+        git_dir = os.path.join(base_dir, '.git')
+        if os.path.isfile(git_dir):
+            # a worktree or submodule, whose .git file points at the real git dir
+            with open(git_dir) as fp:
+                git_dir = os.path.join(base_dir, fp.read().strip()[len('gitdir: '):])
+        self.git_dir = git_dir
+        self.common_dir = git_dir
+        if os.path.exists(os.path.join(git_dir, 'commondir')):
+            with open(os.path.join(git_dir, 'commondir')) as fp:
+                self.common_dir = os.path.join(git_dir, fp.read().strip())
+        self.objects_dir = os.path.join(self.common_dir, 'objects')
+        self._packs = {}
+        self._cache = OrderedDict()
+
+    def resolve(self, ref: str = 'HEAD'):
+        """
+        :param ref: HEAD, or a full ref name such as refs/heads/master
+        :return: the hex id the ref points at, or None if it is HEAD and its branch has no commits yet
+        """
+        if self._ref_storage() != 'files':
+            raise GitObjectError("Unsupported ref storage: {}".format(self._ref_storage()))
+        via_head = ref == 'HEAD'
+        for _ in range(10):
+            path = os.path.join(self.git_dir if ref == 'HEAD' else self.common_dir, ref)
+            try:
+                with open(path, 'rb') as fp:
+                    value = fp.read().strip().decode('utf-8')
+            except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+                value = self._packed_refs().get(ref)
+                if value is None:
+                    # an unborn branch, e.g. of an empty repo
+                    unborn = via_head and ref.startswith('refs/heads/')
+                    if unborn and os.path.isdir(os.path.join(self.common_dir, 'refs', 'heads')):
+                        return None
+                    raise GitObjectError("Ref not found: {}".format(ref))
+            if not value.startswith('ref: '):
+                if len(value) != 40:
+                    raise GitObjectError("Unsupported object id: {}".format(value))
+                return value
+            ref = value[len('ref: '):]
+        raise GitObjectError("Too many levels of symbolic refs")
+
+    def _ref_storage(self) -> str:
+        """
+        :return: the repository's ref backend, from extensions.refStorage: 'files' unless it's something else,
+            such as 'reftable'
+        """
+        section = None
+        try:
+            with open(os.path.join(self.common_dir, 'config')) as fp:
+                for line in fp:
+                    line = line.split('#', 1)[0].split(';', 1)[0].strip()
+                    if line.startswith('['):
+                        section = line.strip('[]').strip().lower()
+                    elif section == 'extensions' and '=' in line:
+                        key, value = line.split('=', 1)
+                        if key.strip().lower() == 'refstorage':
+                            return value.strip().strip('"').lower()
+        except FileNotFoundError:
+            pass
+        return 'files'
+
+    def _packed_refs(self) -> dict:
+        refs = {}
+        try:
+            with open(os.path.join(self.common_dir, 'packed-refs'), 'rb') as fp:
+                for line in fp:
+                    if line.startswith((b'#', b'^')):
+                        continue
+                    sha, name = line.strip().split(b' ', 1)
+                    refs[name.decode('utf-8')] = sha.decode('ascii')
+        except FileNotFoundError:
+            pass
+        return refs
+
+    def _get_packs(self) -> list:
+        pack_dir = os.path.join(self.objects_dir, 'pack')
+        try:
+            names = [n for n in os.listdir(pack_dir) if n.endswith('.idx')]
+        except FileNotFoundError:
+            return []
+        for n in names:
+            if n not in self._packs:
+                self._packs[n] = _Pack(os.path.join(pack_dir, n))
+        return [self._packs[n] for n in names]
+
+    def read_object(self, sha: str) -> tuple:
+        """
+        :param sha: a hex object id
+        :return: a tuple of (type, contents), where type is b'commit', b'tree', b'blob' or b'tag'
+        """
+        cached = self._cache.get(sha)
+        if cached is not None:
+            self._cache.move_to_end(sha)
+            return cached
+
+        obj = self._read_loose(sha)
+        if obj is None:
+            binary = binascii.unhexlify(sha)
+            for pack in self._get_packs():
+                offset = pack.find(binary)
+                if offset is not None:
+                    obj = self._read_packed(pack, offset)
+                    break
+            else:
+                raise GitObjectError("Object not found: {}".format(sha))
+
+        self._cache[sha] = obj
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return obj
+
+    def _read_loose(self, sha: str):
+        try:
+            with open(os.path.join(self.objects_dir, sha[:2], sha[2:]), 'rb') as fp:
+                raw = zlib.decompress(fp.read())
+        except FileNotFoundError:
+            return None
+        header, _, data = raw.partition(b'\0')
+        obj_type, _ = header.split(b' ', 1)
+        return obj_type, data
+
+    def _read_packed(self, pack: _Pack, offset: int) -> tuple:
+        data = pack.pack
+        c = data[offset]
+        obj_type = (c >> 4) & 7
+        size = c & 15
+        shift = 4
+        pos = offset + 1
+        while c & 0x80:
+            c = data[pos]
+            pos += 1
+            size |= (c & 0x7f) << shift
+            shift += 7
+
+        if obj_type in TYPE_NAMES:
+            return TYPE_NAMES[obj_type], pack.inflate(pos, size)
+        if obj_type == OBJ_OFS_DELTA:
+            c = data[pos]
+            pos += 1
+            distance = c & 0x7f
+            while c & 0x80:
+                c = data[pos]
+                pos += 1
+                distance = ((distance + 1) << 7) | (c & 0x7f)
+            base_type, base = self._read_packed(pack, offset - distance)
+        elif obj_type == OBJ_REF_DELTA:
+            base_type, base = self.read_object(binascii.hexlify(data[pos:pos + 20]).decode('ascii'))
+            pos += 20
+        else:
+            raise GitObjectError("Unknown pack object type {}".format(obj_type))
+        return base_type, apply_delta(base, pack.inflate(pos, size))
+
+    def read_commit(self, sha: str) -> Commit:
+        obj_type, data = self.read_object(sha)
+        if obj_type != b'commit':
+            raise GitObjectError("Not a commit: {}".format(sha))
+        tree, parents, author_time, commit_time = None, [], None, None
+        for line in data.split(b'\n\n', 1)[0].split(b'\n'):
+            key, _, value = line.partition(b' ')
+            if key == b'tree':
+                tree = value.decode('ascii')
+            elif key == b'parent':
+                parents.append(value.decode('ascii'))
+            elif key == b'author':
+                author_time = int(value.rsplit(b' ', 2)[1])
+            elif key == b'committer':
+                commit_time = int(value.rsplit(b' ', 2)[1])
+        return Commit(tree, parents, author_time, commit_time)
+
+    def read_tree(self, sha: str) -> list:
+        """
+        :return: a list of (is_dir, name, sha) for the tree's entries, in tree order
+        """
+        obj_type, data = self.read_object(sha)
+        if obj_type != b'tree':
+            raise GitObjectError("Not a tree: {}".format(sha))
+        out = []
+        pos = 0
+        while pos < len(data):
+            space = data.index(b' ', pos)
+            nul = data.index(b'\0', space)
+            mode = data[pos:space]
+            out.append((
+                mode == b'40000',
+                data[space + 1:nul].decode('utf-8', errors='surrogateescape'),
+                binascii.hexlify(data[nul + 1:nul + 21]).decode('ascii')
+            ))
+            pos = nul + 21
+        return out
+
+    def _subtree(self, tree: str, prefix: str):
+        """
+        :return: the id of the tree at prefix (a relative directory, or '' for the root), or None if there is none
+        """
+        for part in [p for p in prefix.split('/') if p]:
+            for is_dir, name, sha in self.read_tree(tree):
+                if is_dir and name == part:
+                    tree = sha
+                    break
+            else:
+                return None
+        return tree
+
+    def iter_files(self, tree: str, prefix: str = ''):
+        """
+        :return: a generator of (path, blob id) for every file under prefix in the tree, paths relative to the root
+        """
+        tree = self._subtree(tree, prefix)
+        if tree is None:
+            return
+        stack = [(prefix.strip('/'), tree)]
+        while stack:
+            path, sha = stack.pop()
+            for is_dir, name, child in self.read_tree(sha):
+                child_path = path + '/' + name if path else name
+                if is_dir:
+                    stack.append((child_path, child))
+                else:
+                    yield child_path, child
+
+    def diff_trees(self, old, new, prefix: str = '') -> list:
+        """
+        Compare two trees under prefix, descending only into subtrees which differ.
+
+        :param old: a tree id, or None for an empty tree
+        :param new: a tree id, or None for an empty tree
+        :return: a list of (path, blob id) for files added or changed, and (path, None) for files deleted
+        """
+        old = self._subtree(old, prefix) if old else None
+        new = self._subtree(new, prefix) if new else None
+        out = []
+        self._diff(old, new, prefix.strip('/'), out)
+        return out
+
+    def _diff(self, old, new, path: str, out: list) -> None:
+        if old == new:
+            return
+        old_entries = dict(((name, (is_dir, sha)) for is_dir, name, sha in self.read_tree(old))) if old else {}
+        new_entries = dict(((name, (is_dir, sha)) for is_dir, name, sha in self.read_tree(new))) if new else {}
+        for name in sorted(set(old_entries) | set(new_entries)):
+            child_path = path + '/' + name if path else name
+            old_dir, old_sha = old_entries.get(name, (False, None))
+            new_dir, new_sha = new_entries.get(name, (False, None))
+            if old_sha == new_sha and old_dir == new_dir:
+                continue
+            if old_dir or new_dir:
+                self._diff(old_sha if old_dir else None, new_sha if new_dir else None, child_path, out)
+            if old_sha and not old_dir and not (new_sha and not new_dir):
+                out.append((child_path, None))
+            if new_sha and not new_dir:
+                out.append((child_path, new_sha))
@@ -0,0 +1,599 @@
+import array
+import os
+import re
+import sqlite3
+from collections import defaultdict
+import subprocess
+
+from daybook import profile
+from daybook.gitobjects import Repository, GitObjectError
+from daybook.search import get_trigrams
+from daybook.segments import SEGMENT_PATH_RE, parse_footer
+from daybook.tags import evaluate_tag_query
+from daybook.utils import get_entry_title, find_tags
+
+# bump this whenever the schema changes; an index with a different version is rebuilt from scratch
+SCHEMA_VERSION = 6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT UNIQUE NOT NULL,
+    book TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    title TEXT,
+    tags TEXT,
+    is_encrypted INTEGER NOT NULL,
+    blob TEXT NOT NULL,
+    segment TEXT,
+    words INTEGER
+);
+CREATE INDEX IF NOT EXISTS entries_book_timestamp ON entries (book, timestamp);
+CREATE INDEX IF NOT EXISTS entries_segment ON entries (segment);
+CREATE TABLE IF NOT EXISTS tags (
+    tag TEXT NOT NULL,
+    entry_id INTEGER NOT NULL,
+    PRIMARY KEY (tag, entry_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tags_entry_id ON tags (entry_id);
+CREATE TABLE IF NOT EXISTS day_counts (
+    book TEXT NOT NULL,
+    day TEXT NOT NULL,
+    entries INTEGER NOT NULL,
+    words INTEGER NOT NULL,
+    PRIMARY KEY (book, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS day_tag_counts (
+    book TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    day TEXT NOT NULL,
+    entries INTEGER NOT NULL,
+    PRIMARY KEY (book, tag, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    postings BLOB NOT NULL,
+    PRIMARY KEY (gram, segment)
+) WITHOUT ROWID;
+"""
+
+# each refresh appends a segment of trigram posting lists; past this many, they're merged into one
+MAX_GRAM_SEGMENTS = 8
+
+# how the per-day counters can be rolled up, as sqlite expressions over a yyyy-mm-dd day.  Weeks start on Monday
+PERIODS = {
+    'day': "day",
+    'week': "date(day, '-' || ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7) || ' days')",
+    'month': "substr(day, 1, 7)",
+    'year': "substr(day, 1, 4)",
+}
+
+# <book>/mm_dd_yyyy/<timestamp>.txt[.encrypted], relative to the repository root
+ENTRY_PATH_RE = re.compile(
+    r'^(?P<book>.+)/(?P<day>\d\d_\d\d_\d\d\d\d)/(?P<timestamp>\d+(\.\d+)?)\.txt(?P<encrypted>\.encrypted)?$'
+)
+
+
+def _get_day(day_dir: str) -> str:
+    """
+    :param day_dir: an entry's day directory, mm_dd_yyyy
+    :return: the day as yyyy-mm-dd, which sorts, and which sqlite's date functions understand
+    """
+    month, day, year = day_dir.split('_')
+    return '{0}-{1}-{2}'.format(year, month, day)
+
+
+def get_index_dir(base_dir: str) -> str:
+    """
+    The directory holding daybook's private state for a repository.  It lives inside .git so it is never committed.
+    """
+    return os.path.join(base_dir, '.git', 'daybook')
+
+
+class EntryIndex(object):
+    """
+    A SQLite index of every entry committed to a daybook repository.
+
+    The index is keyed to the commit it was built from.  When HEAD moves, only the paths which differ between the
+    trees of the indexed commit and HEAD are re-read, so queries never walk the history.  Refs and objects are read
+    in-process (see daybook.gitobjects), falling back to running git for anything that reader can't handle.
+    A repository may hold several books; every row records the book it belongs to.  Entries compacted into a segment
+    (see daybook.segments) are indexed under the path they had before, and record the segment holding them.
+    """
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.index_dir = get_index_dir(base_dir)
+        self.db_path = os.path.join(self.index_dir, 'index.sqlite')
+        self.repo = Repository(base_dir)
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.index_dir, exist_ok=True)
+            # a book may be used from several threads (by the daemon, or by a query across books), though never at once
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._ensure_schema()
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _ensure_schema(self) -> None:
+        conn = self._conn
+        conn.executescript(SCHEMA)
+        if self._get_meta('schema_version') != str(SCHEMA_VERSION):
+            tables = [
+                r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+                if not r[0].startswith('sqlite_')
+            ]
+            with conn:
+                for t in tables:
+                    conn.execute('DROP TABLE {}'.format(t))
+            conn.executescript(SCHEMA)
+            self._set_meta('schema_version', str(SCHEMA_VERSION))
+
+    def _get_meta(self, key: str):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def _git(self, *args, stdin: bytes = None) -> bytes:
+        with profile.span('git', cmd=args[0]):
+            profile.count('subprocesses')
+            return subprocess.run(
+                ['git'] + list(args),
+                cwd=self.base_dir,
+                input=stdin,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                check=True
+            ).stdout
+
+    def _get_head(self):
+        """
+        :return: the commit id of HEAD, or None if nothing has been committed yet
+        """
+        try:
+            return self.repo.resolve('HEAD')
+        except GitObjectError:
+            pass
+        try:
+            return self._git('rev-parse', '--verify', '-q', 'HEAD').decode('ascii').strip() or None
+        except subprocess.CalledProcessError:
+            return None
+
+    def refresh(self) -> None:
+        """
+        Bring the index up to date with HEAD.  This is a no-op when HEAD has not moved since the last refresh.
+        """
+        head = self._get_head()
+        indexed_head = self._get_meta('head') or None
+        if head == indexed_head:
+            return
+
+        with profile.span('index.refresh'):
+            self._refresh(head, indexed_head)
+
+    def _refresh(self, head, indexed_head) -> None:
+        if head is None:
+            self._apply([], None, clear=True)
+        elif indexed_head:
+            try:
+                self._apply(self._changed_paths(indexed_head, head), head)
+            except (subprocess.CalledProcessError, GitObjectError):
+                # the indexed commit is gone (e.g. after a rebase and gc), so start over
+                self._apply(self._all_paths(head), head, clear=True)
+        else:
+            self._apply(self._all_paths(head), head, clear=True)
+
+    def _all_paths(self, commit: str) -> list:
+        """
+        :return: a list of (path, blob) for every entry and segment in the tree of the given commit
+        """
+        try:
+            files = self.repo.iter_files(self.repo.read_commit(commit).tree)
+            return [(p, b) for p, b in files if ENTRY_PATH_RE.match(p) or SEGMENT_PATH_RE.match(p)]
+        except GitObjectError:
+            pass
+        out = []
+        for record in self._git('ls-tree', '-r', '-z', commit).split(b'\0'):
+            if not record:
+                continue
+            meta, path = record.split(b'\t', 1)
+            path = path.decode('utf-8')
+            if ENTRY_PATH_RE.match(path) or SEGMENT_PATH_RE.match(path):
+                out.append((path, meta.split()[2].decode('ascii')))
+        return out
+
+    def _changed_paths(self, old: str, new: str) -> list:
+        """
+        :return: a list of (path, blob) for every entry or segment changed between two commits.  Deleted ones have
+            a blob of None.
+        """
+        try:
+            changes = self.repo.diff_trees(self.repo.read_commit(old).tree, self.repo.read_commit(new).tree)
+            return [(p, b) for p, b in changes if ENTRY_PATH_RE.match(p) or SEGMENT_PATH_RE.match(p)]
+        except GitObjectError:
+            pass
+        out = []
+        fields = self._git('diff-tree', '-r', '-z', '--no-renames', old, new).split(b'\0')
+        # with -z, each change is ":<old mode> <new mode> <old blob> <new blob> <status>" followed by the path
+        for meta, path in zip(fields[0::2], fields[1::2]):
+            if not meta.startswith(b':'):
+                continue
+            path = path.decode('utf-8')
+            if not (ENTRY_PATH_RE.match(path) or SEGMENT_PATH_RE.match(path)):
+                continue
+            _, _, _, new_blob, status = meta.split()
+            out.append((path, None if status == b'D' else new_blob.decode('ascii')))
+        return out
+
+    def _read_blobs(self, blobs: list) -> dict:
+        """
+        Read many blobs, in-process or failing that with a single `git cat-file --batch` process.
+
+        :return: a dict of blob id to contents, as bytes
+        """
+        if not blobs:
+            return {}
+        try:
+            return dict((b, self.repo.read_object(b)[1]) for b in blobs)
+        except GitObjectError:
+            pass
+        raw = self._git('cat-file', '--batch', stdin='\n'.join(blobs).encode('ascii') + b'\n')
+        out = {}
+        pos = 0
+        for _ in blobs:
+            eol = raw.index(b'\n', pos)
+            blob, _, size = raw[pos:eol].split()
+            size = int(size)
+            out[blob.decode('ascii')] = raw[eol + 1:eol + 1 + size]
+            pos = eol + 1 + size + 1
+        return out
+
+    def _expand(self, changes: list) -> tuple:
+        """
+        Split changes into the paths to drop from the index and the entries to (re)index, unpacking segments into
+        the entries they hold.
+
+        :return: a tuple of (deleted paths, deleted segments, entries).  Entries are (path, blob, segment, text), where
+            text is None for encrypted entries and segment is None for loose ones.
+        """
+        wanted = [
+            b for p, b in changes
+            if b and (SEGMENT_PATH_RE.match(p) or not ENTRY_PATH_RE.match(p).group('encrypted'))
+        ]
+        contents = self._read_blobs(sorted(set(wanted)))
+
+        deleted, segments, entries = [], [], []
+        for path, blob in changes:
+            m = SEGMENT_PATH_RE.match(path)
+            if not m:
+                if blob is None:
+                    deleted.append(path)
+                else:
+                    text = None if ENTRY_PATH_RE.match(path).group('encrypted') else contents[blob]
+                    entries.append((path, blob, None, text))
+                continue
+            # a changed segment is re-read whole: its entries are dropped and indexed again
+            segments.append(path)
+            if blob is None:
+                continue
+            data = contents[blob]
+            for name, (offset, length) in sorted(parse_footer(data).items()):
+                entry_path = m.group('book') + '/' + name
+                if not ENTRY_PATH_RE.match(entry_path):
+                    continue
+                text = None if ENTRY_PATH_RE.match(entry_path).group('encrypted') else data[offset:offset + length]
+                entries.append((entry_path, '{0}:{1}'.format(blob, name), path, text))
+        # loose entries come last, so one that shadows a compacted copy of itself wins
+        entries.sort(key=lambda e: e[2] is None)
+        return deleted, segments, entries
+
+    def _apply(self, changes: list, head, clear: bool = False) -> None:
+        deleted, segments, entries = self._expand(changes)
+        profile.count('entries_indexed', len(entries))
+
+        # trigram postings are only ever appended.  Entry ids are never reused, so postings for deleted or
+        # rewritten entries simply stop matching any row of the entries table, and are dropped on the next merge.
+        postings = defaultdict(lambda: array.array('q'))
+        with self.conn:
+            if clear:
+                self.conn.execute('DELETE FROM entries')
+                self.conn.execute('DELETE FROM tags')
+                self.conn.execute('DELETE FROM grams')
+                self.conn.execute('DELETE FROM day_counts')
+                self.conn.execute('DELETE FROM day_tag_counts')
+            for path in deleted:
+                self._delete_rows('SELECT id FROM entries WHERE path = ?', path)
+            for segment in segments:
+                self._delete_rows('SELECT id FROM entries WHERE segment = ?', segment)
+            for path, blob, segment, text in entries:
+                if segment and self.conn.execute(
+                        'SELECT 1 FROM entries WHERE path = ? AND segment IS NULL', (path,)).fetchone():
+                    # a loose copy of a compacted entry, e.g. one edited since, shadows the segment's
+                    continue
+                self._delete_rows('SELECT id FROM entries WHERE path = ?', path)
+                m = ENTRY_PATH_RE.match(path)
+                # encrypted entries are indexed by path only; their title and tags must not leak into the index
+                text = text.decode('utf-8', errors='replace') if text is not None else None
+                tags = sorted(set(find_tags(text))) if text else []
+                words = len(text.split()) if text else 0
+                cursor = self.conn.execute(
+                    'INSERT INTO entries (path, book, timestamp, title, tags, is_encrypted, blob, segment, words) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        path,
+                        m.group('book'),
+                        float(m.group('timestamp')),
+                        get_entry_title(text) if text else None,
+                        ' '.join(tags) if text else None,
+                        int(bool(m.group('encrypted'))),
+                        blob,
+                        segment,
+                        words
+                    )
+                )
+                self.conn.executemany(
+                    'INSERT INTO tags (tag, entry_id) VALUES (?, ?)', [(t, cursor.lastrowid) for t in tags]
+                )
+                self._count_day(m.group('book'), _get_day(m.group('day')), words, tags, 1)
+                if text:
+                    for g in get_trigrams(text):
+                        postings[g].append(cursor.lastrowid)
+            self._append_gram_segment(postings)
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('head', head or ''))
+
+    def _delete_rows(self, select: str, value: str) -> None:
+        ids = [(r[0],) for r in self.conn.execute(select, (value,))]
+        for (entry_id,) in ids:
+            row = self.conn.execute('SELECT path, book, tags, words FROM entries WHERE id = ?', (entry_id,)).fetchone()
+            self._count_day(
+                row['book'], _get_day(ENTRY_PATH_RE.match(row['path']).group('day')), row['words'] or 0,
+                row['tags'].split() if row['tags'] else [], -1
+            )
+        self.conn.executemany('DELETE FROM tags WHERE entry_id = ?', ids)
+        self.conn.executemany('DELETE FROM entries WHERE id = ?', ids)
+
+    def _count_day(self, book: str, day: str, words: int, tags: list, sign: int) -> None:
+        """
+        Add an entry to (sign 1) or take it from (sign -1) the per-day counters the stats are rolled up from
+        """
+        updated = self.conn.execute(
+            'UPDATE day_counts SET entries = entries + ?, words = words + ? WHERE book = ? AND day = ?',
+            (sign, sign * words, book, day)
+        )
+        if not updated.rowcount:
+            self.conn.execute(
+                'INSERT INTO day_counts (book, day, entries, words) VALUES (?, ?, ?, ?)', (book, day, sign, sign * words)
+            )
+        for tag in tags:
+            updated = self.conn.execute(
+                'UPDATE day_tag_counts SET entries = entries + ? WHERE book = ? AND tag = ? AND day = ?',
+                (sign, book, tag, day)
+            )
+            if not updated.rowcount:
+                self.conn.execute(
+                    'INSERT INTO day_tag_counts (book, tag, day, entries) VALUES (?, ?, ?, ?)', (book, tag, day, sign)
+                )
+        if sign < 0:
+            self.conn.execute('DELETE FROM day_counts WHERE book = ? AND day = ? AND entries <= 0', (book, day))
+            self.conn.execute('DELETE FROM day_tag_counts WHERE book = ? AND day = ? AND entries <= 0', (book, day))
+
+    def _append_gram_segment(self, postings: dict) -> None:
+        if not postings:
+            return
+        segment = self.conn.execute('SELECT COALESCE(MAX(segment), -1) + 1 FROM grams').fetchone()[0]
+        self.conn.executemany(
+            'INSERT INTO grams (gram, segment, postings) VALUES (?, ?, ?)',
+            ((g, segment, ids.tobytes()) for g, ids in postings.items())
+        )
+        if self.conn.execute('SELECT COUNT(DISTINCT segment) FROM grams').fetchone()[0] > MAX_GRAM_SEGMENTS:
+            self._merge_gram_segments()
+
+    def _merge_gram_segments(self) -> None:
+        live = set(r[0] for r in self.conn.execute('SELECT id FROM entries'))
+        merged = defaultdict(lambda: array.array('q'))
+        for gram, blob in self.conn.execute('SELECT gram, postings FROM grams ORDER BY gram, segment'):
+            ids = array.array('q')
+            ids.frombytes(blob)
+            merged[gram].extend(i for i in ids if i in live)
+        self.conn.execute('DELETE FROM grams')
+        self.conn.executemany(
+            'INSERT INTO grams (gram, segment, postings) VALUES (?, 0, ?)',
+            ((g, ids.tobytes()) for g, ids in merged.items() if ids)
+        )
+
+    def _get_postings(self, gram: str) -> set:
+        ids = array.array('q')
+        for r in self.conn.execute('SELECT postings FROM grams WHERE gram = ?', (gram,)):
+            ids.frombytes(r[0])
+        return set(ids)
+
+    @property
+    def head(self):
+        """
+        The commit the index was last brought up to date with, or None if it's empty
+        """
+        return self._get_meta('head') or None
+
+    def paths(self, book: str) -> list:
+        """
+        :param book: the name of the book, i.e. its directory relative to the repository root
+        :return: the absolute path of every entry in the book, most recent first
+        """
+        self.refresh()
+        rows = self.conn.execute(
+            'SELECT path FROM entries WHERE book = ? ORDER BY timestamp DESC, path DESC', (book,)
+        )
+        return [os.path.join(self.base_dir, r['path']) for r in rows]
+
+    def encrypted_paths(self, book: str) -> set:
+        """
+        :return: the absolute paths of the book's encrypted entries, whose tags and text are not indexed
+        """
+        self.refresh()
+        rows = self.conn.execute('SELECT path FROM entries WHERE book = ? AND is_encrypted', (book,))
+        return set(os.path.join(self.base_dir, r['path']) for r in rows)
+
+    def _rows_for_paths(self, columns: str, paths: list, where: str = '1'):
+        relative = [os.path.relpath(p, self.base_dir) for p in paths]
+        # in chunks, to stay under sqlite's limit on the number of parameters
+        for i in range(0, len(relative), 500):
+            chunk = relative[i:i + 500]
+            rows = self.conn.execute(
+                'SELECT path, {0} FROM entries WHERE {1} AND path IN ({2})'.format(
+                    columns, where, ','.join('?' * len(chunk))
+                ),
+                chunk
+            )
+            for r in rows:
+                yield os.path.join(self.base_dir, r['path']), r
+
+    def describe(self, paths: list) -> dict:
+        """
+        Look up what the index knows of some entries, without reading them.
+
+        :param paths: absolute paths of entries
+        :return: a dict of path to (title, tags) for the plaintext entries among them which are indexed.  tags is a
+            sorted list
+        """
+        self.refresh()
+        return {
+            path: ((r['title'] or '').rstrip(), r['tags'].split() if r['tags'] else [])
+            for path, r in self._rows_for_paths('title, tags', paths, 'NOT is_encrypted')
+        }
+
+    def blobs(self, paths: list) -> dict:
+        """
+        :param paths: absolute paths of entries
+        :return: a dict of path to the id of the git blob holding each committed entry, which changes whenever the
+            entry does.  For a compacted entry, this is its segment's blob and its name within the segment
+        """
+        self.refresh()
+        return {path: r['blob'] for path, r in self._rows_for_paths('blob', paths)}
+
+    def match_tags(self, book: str, clauses: list) -> tuple:
+        """
+        Answer a tag query from the posting lists of the book's plaintext entries.
+
+        :param book: the name of the book
+        :param clauses: a query parsed by daybook.tags.parse_tag_query
+        :return: a tuple of (matching, decided), both sets of absolute paths.  Entries outside of `decided`
+            (encrypted entries and anything not yet committed) must be checked by reading them.
+        """
+        self.refresh()
+        ids_to_paths = dict(
+            self.conn.execute('SELECT id, path FROM entries WHERE book = ? AND NOT is_encrypted', (book,)).fetchall()
+        )
+        universe = set(ids_to_paths)
+
+        def postings(tag):
+            return set(r[0] for r in self.conn.execute('SELECT entry_id FROM tags WHERE tag = ?', (tag,)))
+
+        matching = evaluate_tag_query(clauses, postings, universe)
+        return (
+            set(os.path.join(self.base_dir, ids_to_paths[i]) for i in matching),
+            set(os.path.join(self.base_dir, p) for p in ids_to_paths.values())
+        )
+
+    def match_text(self, book: str, trigrams: set) -> tuple:
+        """
+        Narrow a text search to the plaintext entries containing every one of the given trigrams.
+
+        :param book: the name of the book
+        :param trigrams: case-folded trigrams, from daybook.search.TextQuery.get_trigrams
+        :return: a tuple of (candidates, decided), both sets of absolute paths.  Candidates still have to be verified
+            against the query; entries outside of `decided` (encrypted entries and anything not yet committed)
+            can't be narrowed by the index at all.
+        """
+        self.refresh()
+        ids_to_paths = dict(
+            self.conn.execute('SELECT id, path FROM entries WHERE book = ? AND NOT is_encrypted', (book,)).fetchall()
+        )
+        if trigrams:
+            matching = set(ids_to_paths)
+            for g in trigrams:
+                matching &= self._get_postings(g)
+                if not matching:
+                    break
+            candidates = [ids_to_paths[i] for i in matching]
+        else:
+            candidates = ids_to_paths.values()
+        return (
+            set(os.path.join(self.base_dir, p) for p in candidates),
+            set(os.path.join(self.base_dir, p) for p in ids_to_paths.values())
+        )
+
+    def tag_counts(self, book: str) -> dict:
+        """
+        :return: a dict of tag to the number of the book's plaintext entries carrying it
+        """
+        self.refresh()
+        rows = self.conn.execute(
+            'SELECT t.tag, COUNT(*) FROM tags t JOIN entries e ON e.id = t.entry_id WHERE e.book = ? GROUP BY t.tag',
+            (book,)
+        )
+        return dict(rows.fetchall())
+
+    def _day_range(self, after: str, before: str) -> tuple:
+        where, args = '', ()
+        if after:
+            where, args = where + ' AND day >= ?', args + (after,)
+        if before:
+            where, args = where + ' AND day <= ?', args + (before,)
+        return where, args
+
+    def activity(self, book: str, period: str = 'week', after: str = None, before: str = None, tag: str = None) -> list:
+        """
+        Roll the per-day counters up into periods, without reading any entries.
+
+        :param book: the name of the book
+        :param period: day, week, month or year
+        :param after: the first day to count, as yyyy-mm-dd.  None counts from the first entry
+        :param before: the last day to count, as yyyy-mm-dd.  None counts to the last entry
+        :param tag: only count entries with this tag
+        :return: a list of (period, entries, words), oldest first, for the periods with entries.  Weeks are given by
+            their Monday.  words is None when counting a tag's entries.  Encrypted entries count as entries of 0 words
+        """
+        self.refresh()
+        where, args = self._day_range(after, before)
+        if tag:
+            query = 'SELECT {0} AS period, SUM(entries), NULL FROM day_tag_counts WHERE book = ? AND tag = ?{1} ' \
+                    'GROUP BY period ORDER BY period'
+            args = (book, tag) + args
+        else:
+            query = 'SELECT {0} AS period, SUM(entries), SUM(words) FROM day_counts WHERE book = ?{1} ' \
+                    'GROUP BY period ORDER BY period'
+            args = (book,) + args
+        return [tuple(r) for r in self.conn.execute(query.format(PERIODS[period], where), args)]
+
+    def top_tags(self, book: str, after: str = None, before: str = None, limit: int = 10) -> list:
+        """
+        :param book: the name of the book
+        :param after: the first day to count, as yyyy-mm-dd
+        :param before: the last day to count, as yyyy-mm-dd
+        :param limit: how many tags
+        :return: a list of (tag, entries) of the tags on the most plaintext entries between the days, most first
+        """
+        self.refresh()
+        where, args = self._day_range(after, before)
+        rows = self.conn.execute(
+            'SELECT tag, SUM(entries) AS n FROM day_tag_counts WHERE book = ?{} '
+            'GROUP BY tag ORDER BY n DESC, tag LIMIT ?'.format(where),
+            (book,) + args + (limit,)
+        )
+        return [tuple(r) for r in rows]
@@ -0,0 +1,228 @@
+import fcntl
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from daybook import profile
+from daybook.batch import Batch
+from daybook.locking import write_lock, LockTimeout
+from daybook.index import get_index_dir
+
+# how long a background flush waits for more entries to commit along with the first
+FLUSH_DELAY = 1.0
+
+
+@contextmanager
+def _locked(path: str):
+    """
+    Hold an exclusive lock on a file
+    """
+    with open(path, 'a') as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+def _read_records(path: str) -> list:
+    records = []
+    try:
+        with open(path, 'rb') as fp:
+            for line in fp:
+                try:
+                    records.append(json.loads(line.decode('utf-8')))
+                except ValueError:
+                    # a line torn by a crash mid-append, which was never acknowledged
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class Journal(object):
+    """
+    A write-ahead journal of new entries, so that creating an entry doesn't wait on git.
+
+    An entry is appended to the journal and fsync'd before anything else happens, then written to the working tree, and
+    then committed by a flush, usually in a background process.  Entries still in the journal are listed like committed
+    ones.  Should a flush never happen (a crash, a reboot) the next command to open the repository replays the journal.
+
+    The journal lives with the index, in .git/daybook, as JSON lines of {"book", "path", "entry", "title"}.  Encrypted
+    entries are journalled already encrypted.  A flush first moves the journal aside to journal.<n>.flushing, so entries
+    appended meanwhile go to a fresh journal, and removes it once its entries are committed.
+    """
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.journal_dir = get_index_dir(base_dir)
+        self.path = os.path.join(self.journal_dir, 'journal')
+        # held briefly, to append to the journal or move it aside.  Flushes are made under the write lock
+        self.append_lock = self.path + '.lock'
+
+    def append(self, book: str, filename: str, entry: str, title: str) -> None:
+        """
+        Durably record a new entry, then write it to the working tree.  Returns once the entry is safe on disk.
+
+        :param book: the name of the entry's book
+        :param filename: the entry's path
+        :param entry: the entry's text, already encrypted if it is to be
+        :param title: the entry's title, for the commit message
+        """
+        record = {'book': book, 'path': os.path.relpath(filename, self.base_dir), 'entry': entry, 'title': title}
+        line = json.dumps(record).encode('utf-8') + b'\n'
+        os.makedirs(self.journal_dir, exist_ok=True)
+        with profile.span('journal.append'), _locked(self.append_lock):
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w') as fp:
+            fp.write(entry)
+
+    def _get_flushing(self) -> list:
+        return sorted(glob.glob(self.path + '.*.flushing'))
+
+    def pending(self) -> list:
+        """
+        :return: the records of the entries not yet committed, oldest first
+        """
+        records = []
+        for path in self._get_flushing() + [self.path]:
+            records.extend(_read_records(path))
+        return records
+
+    def has_pending(self) -> bool:
+        try:
+            if os.path.getsize(self.path):
+                return True
+        except FileNotFoundError:
+            pass
+        return bool(self._get_flushing())
+
+    def pending_paths(self, book: str) -> list:
+        """
+        :return: the absolute paths of a book's entries not yet committed
+        """
+        if not self.has_pending():
+            return []
+        return [os.path.join(self.base_dir, r['path']) for r in self.pending() if r['book'] == book]
+
+    def flush(self, daybook, blocking: bool = True) -> int:
+        """
+        Commit every journalled entry, in one commit.  Writers arriving while another is flushing wait for it (see
+        daybook.locking.write_lock), by which time their entries have usually been committed along with the rest: a
+        group commit.
+
+        :param daybook: any Daybook in the repository, to commit through
+        :param blocking: wait for a flush already under way to finish, rather than leaving the entries to it
+        :return: how many entries were committed
+        """
+        if not self.has_pending():
+            return 0
+        try:
+            with write_lock(self.base_dir, timeout=None if blocking else 0):
+                return self._flush(daybook)
+        except LockTimeout:
+            if blocking:
+                raise
+            return 0
+
+    def _flush(self, daybook) -> int:
+        with _locked(self.append_lock):
+            if os.path.exists(self.path):
+                os.rename(self.path, '{0}.{1}.flushing'.format(self.path, time.time_ns()))
+        flushing = self._get_flushing()
+        records = []
+        for path in flushing:
+            records.extend(_read_records(path))
+
+        # a flush interrupted after committing leaves its records behind; the index knows which made it in
+        daybook.index.refresh()
+        committed = {}
+        new = []
+        for r in records:
+            if r['book'] not in committed:
+                committed[r['book']] = set(daybook.index.paths(r['book']))
+            if os.path.join(self.base_dir, r['path']) not in committed[r['book']]:
+                new.append(r)
+
+        if new:
+            titles = [r['title'] or "<no title given>" for r in new]
+            message = titles[0] if len(new) == 1 else "{0} entries: {1}".format(len(new), '; '.join(titles))
+            batch = Batch(daybook, message)
+            for r in new:
+                batch.write(os.path.join(self.base_dir, r['path']), r['entry'], encrypted=True)
+            batch.commit()
+        for path in flushing:
+            os.remove(path)
+        return len(new)
+
+    def recover(self, daybook) -> int:
+        """
+        Replay entries left in the journal by a flush which never happened, unless a flush is under way.  A replay
+        which fails is reported and left for later, so the entries can still be read: they stay in the journal, and are
+        listed as ever.
+
+        :return: how many entries were committed
+        """
+        try:
+            return self.flush(daybook, blocking=False)
+        except Exception as e:
+            print("Could not commit the entries journalled in {0}: {1}".format(self.base_dir, e), file=sys.stderr)
+            return 0
+
+    def flush_in_background(self, book_name: str, remote_url: str, push: bool = False,
+                            maintain_every: int = None) -> None:
+        """
+        Start a process which waits FLUSH_DELAY for more entries, commits the journal, and optionally syncs.
+        Its errors go to journal.log.
+
+        :param maintain_every: also maintain the repository (see daybook.maintenance) if it has had this many commits
+            since it last was
+        """
+        args = [sys.executable, '-m', 'daybook.journal', book_name, self.base_dir, remote_url or '']
+        if push:
+            args.append('--push')
+        if maintain_every:
+            args.append('--maintain-every={}'.format(int(maintain_every)))
+        env = dict(os.environ)
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (package_dir, env.get('PYTHONPATH')) if p)
+        with open(self.path + '.log', 'a') as log:
+            subprocess.Popen(
+                args, cwd=self.base_dir, env=env, start_new_session=True,
+                stdin=subprocess.DEVNULL, stdout=log, stderr=log
+            )
+
+
+def _main(book_name: str, base_dir: str, remote_url: str, push: bool, maintain_every: int) -> None:
+    from daybook import Daybook
+    journal = Journal(base_dir)
+    # entries journalled meanwhile are committed along with the first.  The write lock is only taken to commit, so
+    # nothing else waits out the delay; should another writer commit the entries first, there is nothing left to do
+    time.sleep(FLUSH_DELAY)
+    journal.flush(Daybook(book_name, base_dir, remote_url or None))
+    if push:
+        from daybook.sync import sync_repo
+        sync_repo(base_dir)
+    if maintain_every:
+        from daybook.maintenance import commits_since_maintenance, maintain_repo
+        if commits_since_maintenance(base_dir) >= maintain_every:
+            maintain_repo(base_dir)
+
+
+if __name__ == '__main__':
+    _options = sys.argv[4:]
+    _main(
+        sys.argv[1], sys.argv[2], sys.argv[3],
+        '--push' in _options,
+        next((int(o.split('=', 1)[1]) for o in _options if o.startswith('--maintain-every=')), None)
+    )
@@ -0,0 +1,117 @@
+import fcntl
+import os
+import random
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from daybook import profile
+from daybook.index import get_index_dir
+
+# how long a writer waits for another to finish before giving up, in seconds
+LOCK_TIMEOUT = float(os.getenv('DAYBOOK_LOCK_TIMEOUT', 30))
+
+# the first and the longest pause between attempts at a lock; each pause doubles, plus or minus half, up to the longest
+FIRST_BACKOFF = 0.005
+MAX_BACKOFF = 0.25
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class _HeldLock(object):
+    """
+    A process's hold on a repository's write lock.  flock locks belong to an open file, so a second open() in the same
+    process would wait on itself; instead the lock is counted, and threads take turns through an RLock.
+    """
+
+    def __init__(self):
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.fp = None
+
+
+_HELD = {}
+_HELD_LOCK = threading.Lock()
+
+
+def _get_backoffs():
+    pause = FIRST_BACKOFF
+    while True:
+        # the jitter keeps writers which collided once from colliding again in step
+        yield pause * random.uniform(0.5, 1.5)
+        pause = min(pause * 2, MAX_BACKOFF)
+
+
+@contextmanager
+def write_lock(base_dir: str, timeout: float = None):
+    """
+    Hold a repository's write lock, which every daybook commit is made under.  It is reentrant, and is waited for
+    with jittered exponential backoff for at most `timeout` seconds.
+
+    :param base_dir: the repository
+    :param timeout: how long to wait, LOCK_TIMEOUT by default.  0 makes a single attempt
+    :raises LockTimeout: if another writer held the lock throughout
+    """
+    timeout = LOCK_TIMEOUT if timeout is None else timeout
+    path = os.path.join(get_index_dir(base_dir), 'write.lock')
+    with _HELD_LOCK:
+        held = _HELD.setdefault(path, _HeldLock())
+
+    deadline = time.monotonic() + timeout
+    got = held.thread_lock.acquire(timeout=timeout) if timeout > 0 else held.thread_lock.acquire(blocking=False)
+    if not got:
+        raise LockTimeout("Another writer is still committing to {}".format(base_dir))
+    try:
+        if held.depth == 0:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fp = open(path, 'a')
+            with profile.span('lock.wait'):
+                for pause in _get_backoffs():
+                    try:
+                        fcntl.flock(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            fp.close()
+                            raise LockTimeout("Timed out after {0}s waiting for another writer to {1}".format(
+                                timeout, base_dir
+                            ))
+                        time.sleep(min(pause, remaining))
+            held.fp = fp
+        held.depth += 1
+        try:
+            yield
+        finally:
+            held.depth -= 1
+            if held.depth == 0:
+                fcntl.flock(held.fp, fcntl.LOCK_UN)
+                held.fp.close()
+                held.fp = None
+    finally:
+        held.thread_lock.release()
+
+
+def run_git(base_dir: str, *args, stdin: bytes = None, timeout: float = None) -> bytes:
+    """
+    Run a git command which writes to the repository.  Another git process, say one run by hand, may be holding
+    git's own index.lock, so the command is retried with the same backoff as write_lock, for at most `timeout`.
+
+    :raises Exception: if git fails for any other reason, with what git said
+    """
+    deadline = time.monotonic() + (LOCK_TIMEOUT if timeout is None else timeout)
+    for pause in _get_backoffs():
+        with profile.span('git', cmd=args[0]):
+            profile.count('subprocesses')
+            result = subprocess.run(
+                ['git'] + list(args), cwd=base_dir, input=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+        if not result.returncode:
+            return result.stdout
+        error = result.stderr.decode('utf-8', 'replace').strip()
+        if 'index.lock' not in error or time.monotonic() + pause > deadline:
+            raise Exception("git {0} failed: {1}".format(args[0], error or result.stdout.decode('utf-8', 'replace')))
+        time.sleep(pause)
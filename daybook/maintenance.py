@@ -0,0 +1,134 @@
+import json
+import os
+import subprocess
+import time
+from collections import namedtuple
+
+from daybook import profile
+from daybook.gitobjects import Repository
+from daybook.index import get_index_dir
+from daybook.locking import write_lock
+
+# loose-object packs beyond this many are consolidated into one
+MAX_PACKS = 16
+
+# the query timed before and after maintenance
+STANDARD_QUERY = dict(max_entries=20)
+
+MaintenanceResult = namedtuple('MaintenanceResult', ['base_dir', 'steps', 'timings'])
+
+
+def _git(base_dir: str, *args) -> bytes:
+    with profile.span('git', cmd=' '.join(args)):
+        profile.count('subprocesses')
+        return subprocess.run(
+            ['git'] + list(args), cwd=base_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+        ).stdout
+
+
+def _get_state_path(base_dir: str) -> str:
+    return os.path.join(get_index_dir(base_dir), 'maintenance.json')
+
+
+def commits_since_maintenance(base_dir: str) -> int:
+    """
+    :return: how many commits have been made since the repository was last maintained, or since it began
+    """
+    try:
+        with open(_get_state_path(base_dir)) as fp:
+            last = json.load(fp).get('head')
+    except (FileNotFoundError, ValueError):
+        last = None
+    for revisions in (['{}..HEAD'.format(last)] if last else []) + ['HEAD']:
+        try:
+            return int(_git(base_dir, 'rev-list', '--count', revisions))
+        except subprocess.CalledProcessError:
+            # the commit last maintained has gone, e.g. with a rewritten history, or nothing is committed yet
+            continue
+    return 0
+
+
+def _count_packs(base_dir: str) -> int:
+    # in the common dir, which a worktree's .git only points to
+    pack_dir = os.path.join(Repository(base_dir).objects_dir, 'pack')
+    try:
+        return sum(1 for f in os.listdir(pack_dir) if f.endswith('.pack'))
+    except FileNotFoundError:
+        return 0
+
+
+def maintain_repo(base_dir: str) -> list:
+    """
+    Keep a repository quick to read:
+
+    - write the commit-graph, with changed-path Bloom filters, so history walks scoped to a book's directory
+      (git log -- <book>) skip the commits that didn't touch it
+    - pack loose objects, so the index reads blobs out of a few memory-mapped packs rather than a file per object,
+      consolidating the packs once there are more than MAX_PACKS
+    - prune loose objects which are packed or unreachable
+
+    These run under the write lock, so no commit lands while objects are being repacked and pruned.
+
+    :param base_dir: the repository
+    :return: a list of (step, seconds)
+    """
+    steps = []
+
+    def step(name, *args):
+        start = time.perf_counter()
+        _git(base_dir, *args)
+        steps.append((name, time.perf_counter() - start))
+
+    with write_lock(base_dir):
+        try:
+            step('commit-graph', 'commit-graph', 'write', '--reachable', '--changed-paths')
+        except subprocess.CalledProcessError:
+            # git before 2.27 has no Bloom filters; a plain commit-graph still helps
+            step('commit-graph', 'commit-graph', 'write', '--reachable')
+        if _count_packs(base_dir) >= MAX_PACKS:
+            step('repack', 'repack', '-a', '-d', '-q')
+        else:
+            step('repack', 'repack', '-d', '-q')
+        step('prune', 'prune', '--expire=2.weeks.ago')
+        head = _git(base_dir, 'rev-parse', '--verify', '-q', 'HEAD').decode('ascii').strip()
+
+    with open(_get_state_path(base_dir), 'w') as fp:
+        json.dump({'head': head, 'time': time.time()}, fp)
+    return steps
+
+
+def time_queries(book) -> list:
+    """
+    Time the queries maintenance should speed up: the most recent commit touching the book, found by walking the
+    history scoped to its directory, and STANDARD_QUERY on a fresh copy of the book, with its index up to date.
+
+    :return: a list of (query, seconds)
+    """
+    start = time.perf_counter()
+    _git(book.base_dir, 'log', '-1', '--format=%H', '--', book.book_name)
+    timings = [('git log -- {}'.format(book.book_name), time.perf_counter() - start)]
+
+    fresh = type(book)(book.book_name, book.base_dir, book.remote_url)
+    fresh.index.refresh()
+    start = time.perf_counter()
+    fresh.list_entries(**STANDARD_QUERY)
+    timings.append(('list_entries', time.perf_counter() - start))
+    fresh.index.close()
+    return timings
+
+
+def maintain(base_dir: str, books: list) -> MaintenanceResult:
+    """
+    Maintain a repository (see maintain_repo), timing queries on each of its books before and after.
+
+    :param books: the Daybooks held in the repository
+    :return: a MaintenanceResult, whose timings are a list of (book name, query, seconds before, seconds after)
+    """
+    before = [time_queries(b) for b in books]
+    steps = maintain_repo(base_dir)
+    after = [time_queries(b) for b in books]
+    return MaintenanceResult(base_dir, steps, [
+        (b.book_name, query, t0, t1)
+        for b, queries_before, queries_after in zip(books, before, after)
+        for (query, t0), (_, t1) in zip(queries_before, queries_after)
+    ])
@@ -0,0 +1,95 @@
+import heapq
+import queue
+import threading
+
+from daybook.utils import sort_filename_by_date
+
+# how many matches a book's scan may run ahead of the merge before it waits
+QUEUE_SIZE = 64
+
+_DONE = object()
+
+
+def _put(out: queue.Queue, item, stop: threading.Event) -> bool:
+    """
+    :return: whether the item was queued, rather than the merge having stopped while waiting for room
+    """
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _scan(book, query: dict, out: queue.Queue, stop: threading.Event) -> None:
+    try:
+        for match in book.iter_entries(**query):
+            if not _put(out, match, stop):
+                return
+        _put(out, _DONE, stop)
+    except BaseException as e:
+        _put(out, e, stop)
+
+
+def _drain(book, out: queue.Queue):
+    while True:
+        item = out.get()
+        if item is _DONE:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield book, item
+
+
+def iter_matches_across(books: list, max_entries: int = -1, **query):
+    """
+    Query several books at once, most recent first.  Each book is scanned on its own thread, and the scans are
+    merged as they go with a k-way heap merge, so the first results arrive without waiting for the slowest book.
+    Once max_entries have been produced every scan is stopped.
+
+    :param books: the Daybooks to query
+    :param max_entries: max number of matches to return, across all books.  If negative, return all
+    :param query: the filters, as for Daybook.iter_entries
+    :return: a generator of (book, Entry)
+    """
+    # the books' indexes are brought up to date here, one at a time, rather than by scans racing each other
+    for book in books:
+        book.index.refresh()
+
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=QUEUE_SIZE) for _ in books]
+    threads = [
+        threading.Thread(target=_scan, args=(book, dict(query, max_entries=max_entries), q, stop), daemon=True)
+        for book, q in zip(books, queues)
+    ]
+    for t in threads:
+        t.start()
+
+    merged = heapq.merge(
+        *[_drain(book, q) for book, q in zip(books, queues)],
+        key=lambda match: sort_filename_by_date(match[1].path),
+        reverse=True
+    )
+    num_found = 0
+    try:
+        for match in merged:
+            yield match
+            num_found += 1
+            if 0 < max_entries <= num_found:
+                return
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+
+def iter_entries_across(books: list, max_entries: int = -1, **query):
+    """
+    As iter_matches_across, with each entry read.
+
+    :return: a generator of (book, file, entry)
+    """
+    for book, entry in iter_matches_across(books, max_entries, **query):
+        yield book, entry.path, entry.lines
@@ -0,0 +1,39 @@
+class EntryOrdering(object):
+    """
+    The entries matching a query, most recent first, addressable by position.
+
+    Candidates the index has already decided are placed without being read.  The rest (e.g. encrypted entries, whose
+    tags aren't indexed) are read and checked only once a position at or beyond them is asked for, and what was
+    learned is kept, so later lookups into the same stretch of history cost nothing.
+    """
+
+    def __init__(self, candidates: list, verify, decided: set, read, chunk_size: int = 64):
+        """
+        :param candidates: paths which may match, most recent first
+        :param verify: verify(path, entry) tells whether a candidate matches, or None if they all do
+        :param decided: candidates known to match without reading them
+        :param read: read(paths) returns the entries at the paths, e.g. Daybook._read_entries
+        :param chunk_size: how many candidates to read at a time when they need checking
+        """
+        self.candidates = candidates
+        self.verify = verify
+        self.decided = decided
+        self.read = read
+        self.chunk_size = chunk_size
+        self._matches = [] if verify else candidates
+        self._checked = 0 if verify else len(candidates)
+
+    def _resolve(self, count: int) -> None:
+        while len(self._matches) < count and self._checked < len(self.candidates):
+            chunk = self.candidates[self._checked:self._checked + self.chunk_size]
+            self._checked += len(chunk)
+            to_read = [f for f in chunk if f not in self.decided]
+            matching = set(f for f, e in zip(to_read, self.read(to_read)) if self.verify(f, e))
+            self._matches += [f for f in chunk if f in self.decided or f in matching]
+
+    def get(self, start: int, count: int = 1) -> list:
+        """
+        :return: the paths of the matching entries at positions start to start + count, where 0 is the most recent
+        """
+        self._resolve(start + count)
+        return self._matches[start:start + count]
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import Counter
+
+DEFAULT_TRACE_FILE = "dybk-trace.json"
+
+# when profiling is off, span() and count() return straight away, so instrumented code pays for one call and a test
+_enabled = False
+_events = []
+_counters = Counter()
+_start_ns = 0
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('name', 'args', 'start', 'counters')
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.counters = dict(_counters)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        args = dict(self.args)
+        # record what was counted while the span was open, e.g. how many files it read
+        for name, value in _counters.items():
+            delta = value - self.counters.get(name, 0)
+            if delta:
+                args[name] = delta
+        _events.append({
+            'name': self.name,
+            'ph': 'X',
+            'ts': (self.start - _start_ns) / 1000,
+            'dur': (end - self.start) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+        return False
+
+
+def enable() -> None:
+    global _enabled, _start_ns
+    _enabled = True
+    _start_ns = time.perf_counter_ns()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, **args):
+    """
+    Time a stage, for use as a context manager.  The span also records how much each counter grew while it was open.
+
+    :param name: the stage, e.g. "read"
+    :param args: anything else worth recording about this instance of the stage
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def count(name: str, n: int = 1) -> None:
+    """
+    Add to a counter, e.g. count("bytes_read", len(data)).
+    """
+    if _enabled:
+        _counters[name] += n
+
+
+def get_trace() -> dict:
+    """
+    :return: the spans recorded so far in Chrome's trace event format, with the counters' totals as metadata
+    """
+    return {
+        'traceEvents': sorted(_events, key=lambda e: e['ts']),
+        'displayTimeUnit': 'ms',
+        'otherData': {'counters': dict(_counters)},
+    }
+
+
+def write_trace(path: str) -> None:
+    """
+    Write the trace to a file, which chrome://tracing or https://ui.perfetto.dev can open.
+    """
+    import json
+    with open(path, 'w') as fp:
+        json.dump(get_trace(), fp, indent=1)
@@ -0,0 +1,190 @@
+import os
+import re
+from collections import Counter
+
+from daybook import profile
+from daybook.index import get_index_dir
+
+WORD_RE = re.compile(r'\w{2,}')
+
+# words too common to say anything about what an entry is about
+STOPWORDS = frozenset("""
+about after again all also am an and any are as at be because been before being but by can could did do does doing
+down during each few for from further had has have having he her here hers him his how if in into is it its just me
+more most my no nor not now of off on once only or other our out over own same she should so some such than that the
+their them then there these they this those through to too under until up very was we were what when where which while
+who whom why will with would you your
+""".split())
+
+
+def _get_numpy():
+    try:
+        import numpy
+        import scipy.sparse
+    except ImportError:
+        raise Exception("Related entries need numpy and scipy: pip install numpy scipy")
+    return numpy, scipy.sparse
+
+
+def tokenize(text: str) -> Counter:
+    """
+    :return: how many times each word of two or more letters appears in the text, case-folded, ignoring stopwords
+    """
+    return Counter(w for w in WORD_RE.findall(text.lower()) if w not in STOPWORDS)
+
+
+class RelatedEntries(object):
+    """
+    Finds the entries most like a given one, by the cosine similarity of their TF-IDF vectors.
+
+    The term counts of a book's plaintext entries are kept as a sparse matrix, one row per entry, cached in
+    .git/daybook with the blob id each row was counted from.  Bringing the cache up to date only reads the entries
+    whose blobs have changed since.  Encrypted entries are left out of the cache, as they are out of the index, though
+    one can still be the entry whose relatives are looked for.  Scoring every entry is a single sparse matrix-vector
+    product.
+    """
+
+    def __init__(self, book):
+        self.book = book
+        self.cache_path = os.path.join(get_index_dir(book.base_dir), 'related-{}.npz'.format(book.book_name))
+        self.paths = []
+        self.blobs = []
+        self.vocabulary = {}
+        self.counts = None
+        self._loaded = False
+
+    def _load(self) -> None:
+        np, sparse = _get_numpy()
+        self._loaded = True
+        try:
+            with np.load(self.cache_path, allow_pickle=False) as cached:
+                self.paths = list(cached['paths'])
+                self.blobs = list(cached['blobs'])
+                self.vocabulary = {t: i for i, t in enumerate(cached['terms'])}
+                self.counts = sparse.csr_matrix(
+                    (cached['data'], cached['indices'], cached['indptr']), shape=tuple(cached['shape'])
+                )
+        except (FileNotFoundError, KeyError, ValueError):
+            self.paths, self.blobs, self.vocabulary = [], [], {}
+            self.counts = sparse.csr_matrix((0, 0), dtype=np.float32)
+
+    def _save(self) -> None:
+        np, _ = _get_numpy()
+        terms = [None] * len(self.vocabulary)
+        for t, i in self.vocabulary.items():
+            terms[i] = t
+        tmp = self.cache_path + '.tmp.npz'
+        np.savez(
+            tmp,
+            paths=np.array(self.paths, dtype=str),
+            blobs=np.array(self.blobs, dtype=str),
+            terms=np.array(terms, dtype=str),
+            data=self.counts.data,
+            indices=self.counts.indices,
+            indptr=self.counts.indptr,
+            shape=np.array(self.counts.shape)
+        )
+        os.replace(tmp, self.cache_path)
+
+    def _count_rows(self, texts: list, grow: bool = True):
+        """
+        :param grow: add terms not seen before to the vocabulary, rather than ignoring them
+        :return: a sparse matrix of the texts' term counts
+        """
+        np, sparse = _get_numpy()
+        indptr, indices, data = [0], [], []
+        for text in texts:
+            for term, n in tokenize(text).items():
+                if grow:
+                    indices.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                elif term in self.vocabulary:
+                    indices.append(self.vocabulary[term])
+                else:
+                    continue
+                data.append(n)
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(len(texts), len(self.vocabulary))
+        )
+
+    def refresh(self) -> None:
+        """
+        Bring the cached counts up to date with the book's committed entries, reading only those added or changed.
+        """
+        np, sparse = _get_numpy()
+        if not self._loaded:
+            self._load()
+        encrypted = self.book.index.encrypted_paths(self.book.book_name)
+        wanted = [p for p in self.book.index.paths(self.book.book_name) if p not in encrypted]
+        blobs = self.book.index.blobs(wanted)
+
+        rows = {(p, b): i for i, (p, b) in enumerate(zip(self.paths, self.blobs))}
+        keep, changed = [], []
+        for p in wanted:
+            row = rows.get((os.path.relpath(p, self.book.base_dir), blobs[p]))
+            if row is None:
+                changed.append(p)
+            else:
+                keep.append(row)
+        if not changed and len(keep) == len(self.paths):
+            return
+
+        with profile.span('related.refresh', entries=len(changed)):
+            new_rows = self._count_rows([''.join(lines) for lines in self.book._read_entries(changed)])
+            kept_rows = self.counts[keep] if keep else sparse.csr_matrix((0, 0), dtype=np.float32)
+            kept_rows.resize((len(keep), len(self.vocabulary)))
+            self.counts = sparse.vstack([kept_rows, new_rows], format='csr', dtype=np.float32)
+            self.paths = [self.paths[i] for i in keep] + [os.path.relpath(p, self.book.base_dir) for p in changed]
+            self.blobs = [self.blobs[i] for i in keep] + [blobs[p] for p in changed]
+            self._save()
+
+    def _get_weights(self):
+        """
+        :return: a tuple of (TF-IDF matrix with L2-normalized rows, idf vector)
+        """
+        np, sparse = _get_numpy()
+        num_docs = self.counts.shape[0]
+        doc_freq = np.bincount(self.counts.indices, minlength=self.counts.shape[1])
+        idf = (np.log((1 + num_docs) / (1 + doc_freq)) + 1).astype(np.float32)
+        weights = self.counts.copy()
+        weights.data = np.log1p(weights.data)
+        weights = weights.multiply(idf).tocsr()
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms).dot(weights).tocsr(), idf
+
+    def similar(self, path: str, count: int = 10) -> list:
+        """
+        :param path: the absolute path of the entry to find relatives of
+        :param count: how many to find
+        :return: a list of (path, score) of the most similar entries, most similar first.  Scores are between 0 and 1
+        """
+        np, sparse = _get_numpy()
+        self.refresh()
+        if not self.paths:
+            return []
+        weights, idf = self._get_weights()
+
+        relative = os.path.relpath(path, self.book.base_dir)
+        row = self.paths.index(relative) if relative in self.paths else None
+        if row is not None:
+            query = weights[row]
+        else:
+            # an entry outside the cache, e.g. an encrypted one: only the terms already known can count
+            query = self._count_rows([''.join(self.book._read_entries([path])[0])], grow=False)
+            query.data = np.log1p(query.data)
+            query = query.multiply(idf).tocsr()
+            norm = np.sqrt(query.multiply(query).sum())
+            if norm:
+                query = query / norm
+
+        scores = (weights @ query.T).toarray().ravel()
+        if row is not None:
+            scores[row] = -1
+        count = min(count, int((scores > 0).sum()))
+        if count <= 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(os.path.join(self.book.base_dir, self.paths[i]), float(scores[i])) for i in top]
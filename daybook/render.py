@@ -0,0 +1,136 @@
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+FORMATS = ('pretty', 'plain', 'jsonl', 'titles')
+
+# output is collected into writes of about this many characters
+BUFFER_SIZE = 1 << 16
+
+# but never held back for longer than this many seconds, so a pager shows the first results while the rest are found
+FLUSH_INTERVAL = 0.1
+
+_BLUE = '\033[34m'
+_RESET = '\033[0m'
+
+
+class Renderer(object):
+    """
+    Formats entries into a buffer which is written out in large pieces, rather than a write per line.
+
+    - pretty: a header per entry, colored when the output is a terminal, then the entry's lines indented
+    - plain: the same, without color or indentation
+    - jsonl: a JSON object per entry, of its path, timestamp, title, tags and text
+    - titles: a line per entry, of its path, title and tags.  Entries' bodies aren't needed for this
+    """
+
+    def __init__(self, out, output_format: str = 'pretty', color: bool = False):
+        """
+        :param out: a text stream
+        :param output_format: one of FORMATS
+        :param color: color the headers
+        """
+        if output_format not in FORMATS:
+            raise Exception("output_format must be one of: {}".format(', '.join(FORMATS)))
+        self.out = out
+        self.output_format = output_format
+        self.color = color
+        self._buffer = []
+        self._size = 0
+        self._flushed_at = time.monotonic()
+
+    @property
+    def needs_bodies(self) -> bool:
+        return self.output_format != 'titles'
+
+    def _header(self, text: str) -> str:
+        if self.color:
+            return '{0}----- {1} -----{2}\n'.format(_BLUE, text, _RESET)
+        return '----- {} -----\n'.format(text)
+
+    def entry(self, n: int, entry) -> None:
+        """
+        :param n: the entry's position in the listing, the most recent being 0
+        :param entry: a daybook.entry.Entry
+        """
+        if self.output_format == 'titles':
+            text = '{0}  {1}  {2}'.format(entry.path, entry.title, ' '.join('@@' + t for t in entry.tags)).rstrip() + '\n'
+        elif self.output_format == 'jsonl':
+            text = json.dumps({
+                'path': entry.path,
+                'timestamp': entry.timestamp,
+                'title': entry.title,
+                'tags': entry.tags,
+                'text': entry.body,
+            }) + '\n'
+        else:
+            order_description = "(most recent)" if n == 0 else "({} back)".format(n)
+            header = self._header('{0} {1}'.format(entry.path, order_description))
+            if self.output_format == 'plain':
+                body = entry.body
+                text = header + body + ('' if not body or body.endswith('\n') else '\n')
+            else:
+                text = header + ''.join('    {}\n'.format(line.strip()) for line in entry.lines)
+        self._write(text)
+
+    def more(self, cursor: str) -> None:
+        """
+        Say how to carry on from where the listing stopped
+        """
+        if self.output_format in ('pretty', 'plain'):
+            self._write(self._header('for older entries: --after-cursor {}'.format(cursor)))
+
+    def _write(self, text: str) -> None:
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= BUFFER_SIZE or time.monotonic() - self._flushed_at >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self.out.write(''.join(self._buffer))
+            self._buffer = []
+            self._size = 0
+        self.out.flush()
+        self._flushed_at = time.monotonic()
+
+
+class Pager(object):
+    """
+    The output of a command, piped through $PAGER when writing to a terminal, as a context manager yielding the
+    stream to write to.  Quitting the pager early ends the output quietly.  In the daemon, the client is asked to
+    page instead.
+    """
+
+    def __init__(self, use_pager: bool = True, out=None):
+        self.out = out or sys.stdout
+        self.use_pager = use_pager
+        pager = os.getenv('PAGER')
+        self.command = shlex.split(pager) if use_pager and pager and self.out.isatty() else None
+        self.process = None
+
+    def __enter__(self):
+        if self.use_pager and hasattr(self.out, 'page') and self.out.isatty():
+            # a daemon's client, which pages by its own $PAGER
+            self.out.page()
+            return self.out
+        if not self.command:
+            return self.out
+        env = dict(os.environ)
+        # let less pass the headers' colors through
+        env.setdefault('LESS', 'FRX')
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, env=env, universal_newlines=True)
+        return self.process.stdin
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.process is None:
+            return exc_type is BrokenPipeError
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+        return exc_type is BrokenPipeError
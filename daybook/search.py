@@ -0,0 +1,76 @@
+import re
+
+try:
+    import re._parser as sre_parse
+    from re._constants import LITERAL, SUBPATTERN, MAX_REPEAT, MIN_REPEAT
+except ImportError:  # Python < 3.11
+    import sre_parse
+    from sre_constants import LITERAL, SUBPATTERN, MAX_REPEAT, MIN_REPEAT
+
+GRAM_SIZE = 3
+
+
+def get_trigrams(text: str) -> set:
+    """
+    :param text: any text
+    :return: the set of distinct, case-folded trigrams in the text
+    """
+    text = text.lower()
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def _required_literals(parsed) -> list:
+    """
+    Find literal strings which every match of a parsed regex must contain.  This is conservative: alternations,
+    character classes and optional repeats contribute nothing, and simply end the current literal run.
+    """
+    literals = []
+    run = []
+    for op, av in parsed:
+        if op is LITERAL:
+            run.append(chr(av))
+            continue
+
+        literals.append(''.join(run))
+        run = []
+        if op is SUBPATTERN:
+            literals += _required_literals(av[-1])
+        elif op in (MAX_REPEAT, MIN_REPEAT) and av[0] >= 1:
+            literals += _required_literals(av[2])
+    literals.append(''.join(run))
+    return [l for l in literals if len(l) >= GRAM_SIZE]
+
+
+class TextQuery(object):
+    """
+    A text search over entry bodies: a substring by default, optionally case-insensitive or a regex.
+    """
+
+    def __init__(self, text: str, ignore_case: bool = False, regex: bool = False):
+        self.text = text
+        self.ignore_case = ignore_case
+        self.regex = regex
+        if regex:
+            self._pattern = re.compile(text, re.IGNORECASE if ignore_case else 0)
+        elif ignore_case:
+            self._pattern = re.compile(re.escape(text), re.IGNORECASE)
+        else:
+            self._pattern = None
+
+    def get_trigrams(self) -> set:
+        """
+        :return: trigrams every matching entry must contain, case-folded.  An empty set means the index can't narrow the search.
+        """
+        if self.regex:
+            literals = _required_literals(sre_parse.parse(self.text))
+        else:
+            literals = [self.text]
+        grams = set()
+        for l in literals:
+            grams |= get_trigrams(l)
+        return grams
+
+    def matches(self, body: str) -> bool:
+        if self._pattern is None:
+            return self.text in body
+        return self._pattern.search(body) is not None
@@ -0,0 +1,192 @@
+import datetime
+import json
+import mmap
+import os
+import re
+import struct
+
+from daybook.dates import DAY_DIR_FORMAT, ENTRY_FILENAME_RE
+
+# a segment packs a month of a book's entries into one file:
+#
+#   MAGIC, entry bodies back to back, a JSON footer of {name: [offset, length]}, the footer's length, MAGIC
+#
+# names are entry paths relative to the book, e.g. 10_22_2020/1603380000.0.txt.  Segments are only ever appended to:
+# adding or removing entries writes any new bodies and a fresh footer after the old one, which is left behind unused.
+MAGIC = b'DYBKSEG1'
+TRAILER = struct.Struct('<Q')
+TRAILER_SIZE = TRAILER.size + len(MAGIC)
+
+SEGMENT_DIR = "segments"
+SEGMENT_FORMAT = "%Y_%m"
+
+# <book>/segments/yyyy_mm.seg, relative to the repository root
+SEGMENT_PATH_RE = re.compile(r'^(?P<book>.+)/' + SEGMENT_DIR + r'/(?P<month>\d\d\d\d_\d\d)\.seg$')
+
+_OPEN_SEGMENTS = {}
+
+
+def parse_footer(data) -> dict:
+    """
+    :param data: a whole segment, as bytes, an mmap or anything else sliceable
+    :return: a dict of entry name to (offset, length) within the segment
+    """
+    if len(data) < len(MAGIC) + TRAILER_SIZE or data[:len(MAGIC)] != MAGIC or data[-len(MAGIC):] != MAGIC:
+        raise Exception("Not a daybook segment")
+    footer_size, = TRAILER.unpack(data[-TRAILER_SIZE:-len(MAGIC)])
+    footer_end = len(data) - TRAILER_SIZE
+    return dict((name, tuple(span)) for name, span in json.loads(
+        bytes(data[footer_end - footer_size:footer_end]).decode('utf-8')
+    ).items())
+
+
+def get_segment_path(project_dir: str, day: datetime.date) -> str:
+    """
+    :return: the path of the segment holding the book's entries for the month of the given day
+    """
+    return os.path.join(project_dir, SEGMENT_DIR, day.strftime(SEGMENT_FORMAT) + ".seg")
+
+
+class Segment(object):
+    """
+    A segment mapped into memory.  Entries are served as slices of the mapping, so reading one copies nothing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.entries = parse_footer(self._mmap)
+
+    def read(self, name: str) -> memoryview:
+        offset, length = self.entries[name]
+        return memoryview(self._mmap)[offset:offset + length]
+
+
+def get_segment(path: str):
+    """
+    :return: the Segment at path, mapped once and reused until the file changes, or None if there is no such segment
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        _OPEN_SEGMENTS.pop(path, None)
+        return None
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _OPEN_SEGMENTS.get(path)
+    if cached is None or cached[0] != stamp:
+        cached = _OPEN_SEGMENTS[path] = (stamp, Segment(path))
+    return cached[1]
+
+
+def locate_entry(filename: str) -> tuple:
+    """
+    :return: (segment path, entry name) for where an entry would be kept once its month is compacted
+    """
+    day_dir, basename = os.path.split(filename)
+    project_dir, day_name = os.path.split(day_dir)
+    day = datetime.datetime.strptime(day_name, DAY_DIR_FORMAT).date()
+    return get_segment_path(project_dir, day), day_name + '/' + basename
+
+
+def read_entry(filename: str):
+    """
+    :param filename: the absolute path an entry had before it was compacted
+    :return: the entry's contents as a memoryview into its segment, or None if no segment holds it
+    """
+    segment_path, name = locate_entry(filename)
+    segment = get_segment(segment_path)
+    if segment is None or name not in segment.entries:
+        return None
+    return segment.read(name)
+
+
+def get_entry_stamp(filename: str):
+    """
+    :return: something which changes whenever the segment holding the entry does, or None if none holds it
+    """
+    segment_path, name = locate_entry(filename)
+    segment = get_segment(segment_path)
+    if segment is None or name not in segment.entries:
+        return None
+    return (segment_path,) + segment.entries[name]
+
+
+def list_segments(project_dir: str) -> list:
+    """
+    :return: a list of (first day of the month, path) for each of the book's segments
+    """
+    segment_dir = os.path.join(project_dir, SEGMENT_DIR)
+    if not os.path.isdir(segment_dir):
+        return []
+    out = []
+    for name in sorted(os.listdir(segment_dir)):
+        if name.endswith(".seg"):
+            try:
+                month = datetime.datetime.strptime(name[:-len(".seg")], SEGMENT_FORMAT).date()
+            except ValueError:
+                continue
+            out.append((month, os.path.join(segment_dir, name)))
+    return out
+
+
+def append_entries(path: str, entries: dict = None, removed: list = ()) -> None:
+    """
+    Add entries to a segment, creating it if need be, and/or drop entries from it.  Entries already in the segment
+    are replaced.  Only the end of the file is ever written.
+
+    :param path: the segment
+    :param entries: a dict of entry name to contents, as bytes
+    :param removed: names of entries to drop
+    """
+    entries = entries or {}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a+b') as fp:
+        fp.seek(0, os.SEEK_END)
+        end = fp.tell()
+        if end:
+            fp.seek(0)
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                index = parse_footer(m)
+            fp.seek(end)
+        else:
+            fp.write(MAGIC)
+            index = {}
+
+        for name in removed:
+            index.pop(name, None)
+        for name in sorted(entries):
+            index[name] = (fp.tell(), len(entries[name]))
+            fp.write(entries[name])
+        footer = json.dumps(index, sort_keys=True).encode('utf-8')
+        fp.write(footer + TRAILER.pack(len(footer)) + MAGIC)
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
+def get_paths_in_range(project_dir: str, after: float = None, before: float = None) -> list:
+    """
+    Find the compacted entries of a book created within a time range, like daybook.dates.get_paths_in_range does for
+    loose ones.  Only the segments of months overlapping the range are opened.
+
+    :return: the absolute paths the matching entries had before they were compacted, most recent first
+    """
+    # a day of slack either side, as for loose entries
+    slack = datetime.timedelta(days=1)
+    first_day = (datetime.datetime.fromtimestamp(after) - slack).date() if after is not None else None
+    last_day = (datetime.datetime.fromtimestamp(before) + slack).date() if before is not None else None
+
+    found = []
+    for month, path in list_segments(project_dir):
+        next_month = (month + datetime.timedelta(days=31)).replace(day=1)
+        if (first_day and next_month <= first_day) or (last_day and month > last_day):
+            continue
+        segment = get_segment(path)
+        for name in segment.entries:
+            m = ENTRY_FILENAME_RE.match(name.rsplit('/', 1)[-1])
+            if not m:
+                continue
+            timestamp = float(m.group(1))
+            if (after is None or timestamp >= after) and (before is None or timestamp <= before):
+                found.append((timestamp, os.path.join(project_dir, name)))
+    return [path for _, path in sorted(found, reverse=True)]
@@ -0,0 +1,49 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# a line of `python -X importtime` output: "import time: <self us> | <cumulative us> | <indented module name>"
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$')
+
+
+def profile_startup(script: str, argv: list, top: int = 15) -> int:
+    """
+    Run a dybk command in a child interpreter with import timing on, then print where startup time went.
+
+    :param script: the dybk script
+    :param argv: the command line, without the program name or --startup-profile
+    :param top: how many of the slowest imports to list
+    :return: the command's exit code
+    """
+    env = dict(os.environ, PYTHONPROFILEIMPORTTIME='1')
+    start = time.time()
+    proc = subprocess.run([sys.executable, script] + argv, env=env, stderr=subprocess.PIPE)
+    elapsed = time.time() - start
+
+    self_by_package = defaultdict(int)
+    top_level = []
+    for line in proc.stderr.decode('utf-8', errors='replace').splitlines():
+        if line.startswith('import time: self'):
+            continue
+        m = IMPORT_TIME_RE.match(line)
+        if not m:
+            sys.stderr.write(line + '\n')
+            continue
+        self_us, cumulative_us, indent, module = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        self_by_package[module.split('.')[0]] += self_us
+        if len(indent) == 1:
+            top_level.append((cumulative_us, module))
+
+    total_us = sum(self_by_package.values())
+    out = sys.stderr
+    out.write("\nStartup profile: {0:.1f}ms wall, {1:.1f}ms importing\n".format(elapsed * 1000, total_us / 1000))
+    out.write("\n  {0:<30} {1:>10}\n".format("top-level import", "cumulative"))
+    for cumulative_us, module in sorted(top_level, reverse=True)[:top]:
+        out.write("  {0:<30} {1:>8.1f}ms\n".format(module, cumulative_us / 1000))
+    out.write("\n  {0:<30} {1:>10}\n".format("package", "self"))
+    for package, self_us in sorted(self_by_package.items(), key=lambda ps: -ps[1])[:top]:
+        out.write("  {0:<30} {1:>8.1f}ms\n".format(package, self_us / 1000))
+    return proc.returncode
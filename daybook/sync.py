@@ -0,0 +1,59 @@
+import os
+import time
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pygit import PyGit
+
+from daybook import profile
+from daybook.locking import write_lock
+
+SyncResult = namedtuple('SyncResult', ['base_dir', 'books', 'ok', 'seconds', 'error'])
+
+
+def group_books_by_repo(daybooks: dict) -> OrderedDict:
+    """
+    :param daybooks: the 'daybooks' section of the config, book name to its settings
+    :return: an OrderedDict of repository path to the names of the books it holds.  Books sharing a base_dir,
+        however it is spelled, map to the same repository.
+    """
+    repos = OrderedDict()
+    for name, cfg in daybooks.items():
+        base_dir = os.path.realpath(os.path.expanduser(cfg['base_dir']))
+        repos.setdefault(base_dir, []).append(name)
+    return repos
+
+
+def sync_repo(base_dir: str) -> None:
+    """
+    Pull, rebase and push a repository, under its write lock so no commit lands in the middle.
+    """
+    git = PyGit(base_dir)
+    with write_lock(base_dir):
+        for cmd in ("pull origin master", "rebase origin/master", "push origin master"):
+            with profile.span('git', cmd=cmd, repo=base_dir):
+                profile.count('subprocesses')
+                git(cmd)
+
+
+def sync_repos(repos: dict, concurrency: int = 4, sync=sync_repo):
+    """
+    Sync repositories in parallel.  A failure in one repository doesn't stop the others.
+
+    :param repos: repository path to the books it holds, as returned by group_books_by_repo
+    :param concurrency: the most repositories to sync at once
+    :param sync: the function syncing a single repository
+    :return: a generator of SyncResult, in the same order as repos
+    """
+    def run(base_dir):
+        start = time.time()
+        try:
+            sync(base_dir)
+            return SyncResult(base_dir, repos[base_dir], True, time.time() - start, None)
+        except Exception as e:
+            return SyncResult(base_dir, repos[base_dir], False, time.time() - start, e)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(run, base_dir) for base_dir in repos]
+        for f in futures:
+            yield f.result()
@@ -0,0 +1,127 @@
+import re
+
+from daybook.utils import find_tags
+
+
+def parse_tag_query(query: str) -> list:
+    """
+    Parse a tag query.  A query is a comma-separated list of alternatives, any of which may match (OR).
+    Within an alternative, tags joined with '+' must all be present (AND), and a tag prefixed with '!'
+    must be absent (NOT).  Tags may be written with or without their leading @@.  For example:
+
+        work,oncall         entries tagged work or oncall
+        work+urgent         entries tagged both work and urgent
+        work+!draft,oncall  entries tagged work but not draft, or tagged oncall
+
+    :param query: the tag query
+    :return: a list of alternatives, each a list of (tag, negated) tuples
+    """
+    clauses = []
+    for alternative in query.split(','):
+        clause = []
+        for term in alternative.split('+'):
+            term = term.strip()
+            negated = term.startswith('!')
+            tag = term.lstrip('!').strip()
+            if tag.startswith('@@'):
+                tag = tag[2:]
+            if tag:
+                clause.append((tag, negated))
+        if clause:
+            clauses.append(clause)
+    return clauses
+
+
+def evaluate_tag_query(clauses: list, postings, universe: set) -> set:
+    """
+    Evaluate a parsed query with set operations over posting lists.
+
+    :param clauses: the output of parse_tag_query
+    :param postings: a callable returning the set of entries carrying a given tag
+    :param universe: every entry the query ranges over, used to resolve negations
+    :return: the set of entries matching the query
+    """
+    matched = set()
+    for clause in clauses:
+        positive = [postings(t) for t, negated in clause if not negated]
+        negative = [postings(t) for t, negated in clause if negated]
+        if positive:
+            result = set.intersection(*sorted(positive, key=len)) & universe
+        else:
+            result = set(universe)
+        for n in negative:
+            result -= n
+        matched |= result
+    return matched
+
+
+def entry_matches_tag_query(clauses: list, entry_tags) -> bool:
+    """
+    Evaluate a parsed query against the tags of a single entry.
+
+    :param clauses: the output of parse_tag_query
+    :param entry_tags: the tags found in the entry
+    """
+    entry_tags = set(entry_tags)
+    return any(
+        all((t in entry_tags) != negated for t, negated in clause)
+        for clause in clauses
+    )
+
+
+def parse_tag_list(tags: str) -> list:
+    """
+    :param tags: a comma-separated list of tags, written with or without their leading @@
+    :return: the tags, without the leading @@
+    """
+    parsed = []
+    for tag in tags.split(','):
+        tag = tag.strip()
+        if tag.startswith('@@'):
+            tag = tag[2:]
+        if tag:
+            parsed.append(tag)
+    return parsed
+
+
+def retag_entry(entry: str, add: list = (), remove: list = ()) -> str:
+    """
+    Add and remove tags in an entry's text.  Removed tags are taken out wherever they appear.  Added tags go on the
+    line carrying the entry's first tag, or if it has none, on a new line after the title.
+
+    :param entry: the entry as a newline-delimited string
+    :param add: tags to add, without their leading @@.  Tags already present are left alone
+    :param remove: tags to remove, without their leading @@
+    :return: the retagged entry
+    """
+    def _cut(m):
+        before = m.string[m.start() - 1:m.start()]
+        after = m.string[m.end():m.end() + 1]
+        # don't leave a space at the start or end of a line, or after another removed tag, which left one already
+        if before in ('', '\n') or before.isspace():
+            return ''
+        # a full stop after the tag ends the sentence before it; a space is kept between the words either side
+        return m.group(1) + (' ' if m.group(2) and after not in ('', '\n') else '')
+
+    if remove:
+        # a tag is delimited as find_tags delimits it, so "@@work." is the tag "work" but "@@work.life" is not
+        entry = re.sub(r'[ \t]*@@(?:{0})(\.*)(?![^\s,;:!?()\[\]{{}}"\'])([ \t]*)'.format(
+            '|'.join(re.escape(t) for t in remove)
+        ), _cut, entry)
+
+    present = set(find_tags(entry))
+    missing = [t for t in dict.fromkeys(add) if t not in present]
+    if not missing:
+        return entry
+    new_tags = ' '.join('@@{}'.format(t) for t in missing)
+
+    lines = entry.split('\n')
+    for i, line in enumerate(lines):
+        if find_tags(line):
+            lines[i] = '{0} {1}'.format(line.rstrip(), new_tags)
+            return '\n'.join(lines)
+    for i, line in enumerate(lines):
+        if line.strip():
+            lines[i + 1:i + 1] = ['', new_tags]
+            return '\n'.join(lines)
+    return new_tags + '\n'
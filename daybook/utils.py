@@ -2,6 +2,7 @@ import os
 import re
 import datetime
 
+FILENAME_DATE_RE = re.compile(r'.*/(\d\d)_(\d\d)_(\d\d\d\d)/(\d+)\..*')
 
 def get_entry_filename(project_dir, timestamp:float, is_encrypted:bool):
     """
@@ -10,14 +11,39 @@ def get_entry_filename(project_dir, timestamp:float, is_encrypted:bool):
     :param is_encrypted: the time, via time.time()
     """
     extension = ".txt.encrypted" if is_encrypted else ".txt"
-    return os.path.join(project_dir, get_current_date(), str(timestamp) + extension)
+    day = datetime.datetime.fromtimestamp(timestamp).strftime("%m_%d_%Y")
+    return os.path.join(project_dir, day, str(timestamp) + extension)
 
 def sort_filename_by_date(fn:str):
     """
     Returns a sort key usable by the sorted() builtin
     :param fn: the filename in the format <dir>/mm_dd_yyyy/<timestamp>.<micro>.txt
     """
-    return int(re.sub(r'.*/(\d\d)_(\d\d)_(\d\d\d\d)/(\d+)\..*', '\\3\\1\\2\\4', fn))
+    month, day, year, timestamp = FILENAME_DATE_RE.match(fn).groups()
+    return int(year + month + day + timestamp)
+
+def get_entry_title(entry: str):
+    """
+    Get the title from an entry.  The title is the first non-whitespace line.
+
+    :param entry: the entry as a newline-delimited string
+    :return: the first non-whitespace line of an entry and return it as the title
+    """
+    for l in entry.split("\n"):
+        if l.strip():
+            return l
+    return None
+
+def find_tags(entry: str) -> list:
+    """
+    Find the tags in an entry.  A tag is a token starting with @@, ending at whitespace or punctuation,
+    so that "@@work," and "@@work." are both the tag "work".
+
+    :param entry: the entry as a newline-delimited string
+    :return: the tags, without the leading @@, in order of appearance
+    """
+    tags = [t.rstrip('.') for t in re.findall(r'@@([^\s,;:!?()\[\]{}"\']+)', entry)]
+    return [t for t in tags if t]
 
 def str_to_bool(v:str) -> bool:
     """
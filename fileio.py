@@ -1,5 +1,4 @@
 import os
-import yaml
 import subprocess
 import tempfile
 
@@ -40,11 +39,13 @@ def editor_create_entry(previous_contents:str="", title:str="", tags:str="") ->
         return edited_message.decode("utf-8")
 
 def write_config(cfg_file, new_cfg):
+    import yaml
     with open(cfg_file, 'w') as fp:
         yaml.safe_dump(new_cfg, fp)
 
 
 def read_config(cfg_file):
+    import yaml
     if os.path.exists(cfg_file):
         with open(cfg_file) as fp:
             return yaml.safe_load(fp)
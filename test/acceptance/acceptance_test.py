@@ -1,20 +1,11 @@
 import os
 import pytest
-import shutil
 import subprocess
 from hamcrest import *
 from pygit import PyGit
 
 from daybook import Daybook
 
-@pytest.fixture(scope="function")
-def db() -> Daybook :
-    test_repo_workspace = os.path.join("/tmp", "daybook", str(os.getpid()))
-    print("Creating new project: {}".format(test_repo_workspace))
-    yield Daybook("test_daybook", test_repo_workspace, "git@github.com:jlecount/daybook_content.git")
-    print("Deleting project: {}".format(test_repo_workspace))
-    shutil.rmtree(test_repo_workspace)
-
 def test_create_new_entry(db:Daybook):
     e = """
         Line One
@@ -91,3 +82,35 @@ def test_list_tags_multiple_tags(db:Daybook):
     assert_that(tags, contains_inanyorder("tag1", "tag2", "tag3", "tag4"))
 
 
+def test_iter_entries_stops_at_max_entries(db:Daybook):
+    db.commit_entry("older entry\n")
+    db.commit_entry("newer entry\n")
+    older = db.list_entries()[-1][0]
+
+    # nothing past max_entries is opened, so a missing older file goes unnoticed
+    os.remove(older)
+    entries = db.iter_entries(max_entries=1)
+    f, e = next(entries)
+    assert_that(''.join(e), contains_string("newer entry"))
+    assert_that(list(entries), empty())
+
+
+def test_entries_are_found_by_position(db:Daybook):
+    for i in range(5):
+        db.commit_entry("Entry {}\n{}\n".format(i, "@@odd" if i % 2 else "@@even"))
+
+    f, e = db.nth_entry(1)
+    assert_that(e[0].strip(), equal_to("Entry 3"))
+    f, e = db.nth_entry(1, with_tags="even")
+    assert_that(e[0].strip(), equal_to("Entry 2"))
+    assert_that(db.nth_entry(5), none())
+    assert_that(db.get_entry_paths(0, 3, with_tags="even"), has_length(3))
+
+
+def test_entries_can_be_paged_with_a_cursor(db:Daybook):
+    for i in range(5):
+        db.commit_entry("Entry {}\n".format(i))
+
+    first_page = db.list_entries(max_entries=2)
+    second_page = db.list_entries(max_entries=2, after_cursor=first_page[-1][0])
+    assert_that([e[0].strip() for _, e in second_page], contains_exactly("Entry 2", "Entry 1"))
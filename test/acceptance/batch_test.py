@@ -0,0 +1,97 @@
+import os
+import subprocess
+import time
+
+import pytest
+from hamcrest import assert_that, equal_to, contains_string, is_not
+
+from daybook import Daybook
+from daybook.tags import retag_entry
+
+
+def test_retag_entry():
+    assert_that(retag_entry("Title\n\n@@work @@draft\nbody\n", add=["job"], remove=["work"]),
+                equal_to("Title\n\n@@draft @@job\nbody\n"))
+    assert_that(retag_entry("Title\nbody\n", add=["new"]), equal_to("Title\n\n@@new\nbody\n"))
+    assert_that(retag_entry("Title\n\n@@workshop\n", remove=["work"]), equal_to("Title\n\n@@workshop\n"))
+
+
+def test_retag_entry_with_dotted_tags():
+    # tags are delimited as find_tags delimits them: a dot inside a tag is part of it, a trailing one isn't
+    assert_that(retag_entry("@@work.life notes\n", remove=["work"]), equal_to("@@work.life notes\n"))
+    assert_that(retag_entry("see @@work.\n", remove=["work"]), equal_to("see.\n"))
+    assert_that(retag_entry("@@work.life @@work\n", remove=["work.life"]), equal_to("@@work\n"))
+
+
+def test_batch_is_one_commit(db: Daybook, num_commits):
+    now = time.time()
+    files = [db._get_entry_filename(now - i) for i in range(5)]
+    for i, f in enumerate(files):
+        db.commit_entry("Entry {}\n\n@@work\n".format(i), f)
+    commits = num_commits()
+
+    with db.batch("tidy up") as batch:
+        for f, entry in db.iter_entries(with_tags="work"):
+            batch.write(f, retag_entry(''.join(entry), add=["job"], remove=["work"]))
+        batch.delete(files[0])
+
+    assert_that(num_commits(), equal_to(commits + 1))
+    assert_that(len(db.list_entries(with_tags="work")), equal_to(0))
+    assert_that([f for f, _ in db.list_entries(with_tags="job")], equal_to(files[1:]))
+    status = subprocess.check_output(['git', 'status', '--porcelain'], cwd=db.base_dir)
+    assert_that(status, equal_to(b''))
+
+
+def test_abandoned_batch_changes_nothing(db: Daybook):
+    f = db._get_entry_filename()
+    db.commit_entry("Entry\n", f)
+    try:
+        with db.batch("never committed") as batch:
+            batch.write(f, "Changed\n")
+            raise ValueError()
+    except ValueError:
+        pass
+    with open(f) as fp:
+        assert_that(fp.read(), is_not(contains_string("Changed")))
+
+
+def test_batch_commits_only_its_own_paths(db: Daybook):
+    f = db._get_entry_filename(1600000000)
+    db.commit_entry("Entry\n", f)
+    unrelated = os.path.join(db.base_dir, "notes.txt")
+    with open(unrelated, 'w') as fp:
+        fp.write("staged by hand\n")
+    subprocess.check_call(['git', 'add', 'notes.txt'], cwd=db.base_dir)
+
+    with db.batch("change the entry") as batch:
+        batch.write(f, "Changed\n")
+    committed = subprocess.check_output(['git', 'show', '--name-only', '--format=', 'HEAD'], cwd=db.base_dir)
+    assert_that(committed.decode('utf-8').split(), equal_to([os.path.relpath(f, db.base_dir)]))
+    staged = subprocess.check_output(['git', 'diff', '--cached', '--name-only'], cwd=db.base_dir)
+    assert_that(staged, equal_to(b'notes.txt\n'))
+
+
+def test_failed_batch_commit_puts_files_back(db: Daybook, num_commits):
+    kept, removed = db._get_entry_filename(1600000000), db._get_entry_filename(1600000001)
+    db.commit_entry("Entry\n", kept)
+    db.commit_entry("Doomed\n", removed)
+    commits = num_commits()
+    hook = os.path.join(db.base_dir, '.git', 'hooks', 'pre-commit')
+    with open(hook, 'w') as fp:
+        fp.write("#!/bin/sh\nexit 1\n")
+    os.chmod(hook, 0o755)
+
+    batch = db.batch("fails")
+    batch.write(kept, "Changed\n")
+    batch.write(db._get_entry_filename(1600000002), "New\n")
+    batch.delete(removed)
+    with pytest.raises(Exception):
+        batch.commit()
+
+    assert_that(num_commits(), equal_to(commits))
+    with open(kept) as fp:
+        assert_that(fp.read(), equal_to("Entry\n"))
+    assert_that(os.path.exists(removed), equal_to(True))
+    assert_that(os.path.exists(db._get_entry_filename(1600000002)), equal_to(False))
+    status = subprocess.check_output(['git', 'status', '--porcelain'], cwd=db.base_dir)
+    assert_that(status, equal_to(b''))
@@ -0,0 +1,57 @@
+import datetime
+import subprocess
+from hamcrest import *
+
+from daybook import Daybook
+from daybook.bulk_import import fast_import, read_records
+
+
+def test_fast_import_keeps_author_dates(db:Daybook):
+    db.commit_entry("Existing entry\n")
+    records = [
+        {"timestamp": "2019-01-02T09:30:00", "title": "New year", "tags": ["plans", "home"], "body": "Resolutions."},
+        {"timestamp": datetime.datetime(2019, 1, 3, 9, 30).timestamp(), "title": "Next day", "body": "More."},
+    ]
+    assert_that(fast_import(db, records), equal_to(2))
+
+    assert_that(db.list_entries(), has_length(3))
+    assert_that(db.list_entries(with_tags="plans"), has_length(1))
+    author_dates = subprocess.check_output(
+        ['git', 'log', '--format=%at', '-2'], cwd=db.base_dir
+    ).decode('ascii').split()
+    assert_that(author_dates, contains_exactly(
+        str(int(datetime.datetime(2019, 1, 3, 9, 30).timestamp())),
+        str(int(datetime.datetime(2019, 1, 2, 9, 30).timestamp())),
+    ))
+
+
+def test_fast_import_never_overwrites_an_entry(db:Daybook):
+    committed = db._get_entry_filename(1600000000.5)
+    db.commit_entry("Committed\n", committed)
+    queued = db._get_entry_filename(1600000001.5)
+    db.queue_entry("Queued\n", queued, "Queued")
+    records = [{"timestamp": 1600000000.5, "body": "Imported one"}, {"timestamp": 1600000001.5, "body": "Imported two"}]
+    assert_that(fast_import(db, records), equal_to(2))
+
+    assert_that(db.journal.pending(), empty())
+    bodies = sorted(''.join(lines).strip() for _, lines in db.list_entries())
+    assert_that(bodies, contains_exactly("Committed", "Imported one", "Imported two", "Queued"))
+
+
+def test_fast_import_refuses_a_detached_head(db:Daybook):
+    db.commit_entry("Existing entry\n")
+    subprocess.check_call(['git', 'checkout', '-q', '--detach'], cwd=db.base_dir)
+    assert_that(calling(fast_import).with_args(db, [{"timestamp": 1600000000, "body": "x"}]),
+                raises(Exception, "HEAD is detached"))
+
+
+def test_a_bad_record_is_reported_by_its_line(db:Daybook, tmp_path):
+    source = tmp_path / "entries.jsonl"
+    source.write_text('{"timestamp": 1600000000, "body": "Fine"}\n\n{"title": "No timestamp"}\n')
+    assert_that(calling(fast_import).with_args(db, read_records(str(source))),
+                raises(Exception, "entries.jsonl:3: No timestamp given"))
+    assert_that(db.list_entries(), empty())
+
+    source.write_text('{"timestamp": "whenever"}\n')
+    assert_that(calling(list).with_args(read_records(str(source))),
+                raises(Exception, "entries.jsonl:1: Unrecognized timestamp: whenever"))
@@ -0,0 +1,12 @@
+import inspect
+from hamcrest import *
+
+import commands
+
+
+def test_command_table_lists_every_public_command():
+    public = set(
+        name for name, f in inspect.getmembers(commands, inspect.isfunction)
+        if not name.startswith('_') and f.__module__ == commands.__name__ and name != 'get_commands'
+    )
+    assert_that([f.__name__ for f in commands.get_commands()], contains_inanyorder(*public))
@@ -0,0 +1,28 @@
+import os
+import pytest
+import shutil
+import subprocess
+
+from daybook import Daybook
+
+@pytest.fixture(autouse=True)
+def no_daemon(tmp_path, monkeypatch):
+    # keep a daemon the developer may be running out of the tests, keys and all
+    monkeypatch.setenv('DAYBOOK_SOCKET', str(tmp_path / "daybook.sock"))
+
+
+@pytest.fixture(scope="function")
+def db() -> Daybook :
+    test_repo_workspace = os.path.join("/tmp", "daybook", str(os.getpid()))
+    print("Creating new project: {}".format(test_repo_workspace))
+    yield Daybook("test_daybook", test_repo_workspace, "git@github.com:jlecount/daybook_content.git")
+    print("Deleting project: {}".format(test_repo_workspace))
+    shutil.rmtree(test_repo_workspace)
+
+
+@pytest.fixture(scope="function")
+def num_commits(db: Daybook):
+    """
+    :return: a function counting the commits in the db fixture's repository
+    """
+    return lambda: int(subprocess.check_output(['git', 'rev-list', '--count', 'HEAD'], cwd=db.base_dir))
@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from hamcrest import *
+
+from daybook import encryption
+from daybook.client import forward
+from daybook.daemon import _Server, _RequestHandler
+
+
+def test_forward_falls_back_without_a_daemon(tmp_path):
+    socket_path = str(tmp_path / "daybook.sock")
+    assert_that(forward(["list-entries", "work"], socket_path), none())
+
+    # interactive commands are never forwarded, even when a socket exists
+    open(socket_path, 'w').close()
+    assert_that(forward(["create-entry", "work"], socket_path), none())
+    assert_that(forward(["list-entries", "work"], socket_path), none())
+
+
+def test_daemon_hands_back_commands_needing_a_passphrase(tmp_path, monkeypatch):
+    monkeypatch.delenv('DAYBOOK_PASSPHRASE', raising=False)
+    monkeypatch.setattr(encryption, '_PROMPT', False)
+    monkeypatch.setattr(encryption, '_USE_AGENT', False)
+    encryption.forget_keys()
+
+    def dispatch(argv, out):
+        if argv[1] == 'secret':
+            encryption.get_key(b'\0' * encryption.SALT_SIZE)
+        print("listed {}".format(argv[1]))
+
+    socket_path = str(tmp_path / "daybook.sock")
+    server = _Server(socket_path, _RequestHandler)
+    server.dispatch = dispatch
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        assert_that(forward(["list-entries", "plain"], socket_path), equal_to(0))
+        # rather than waiting on a prompt the daemon can't show, with every other client queued behind it
+        assert_that(forward(["list-entries", "secret"], socket_path), none())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_daemon_holds_keys_for_later_commands(tmp_path, monkeypatch):
+    socket_path = str(tmp_path / "agent.sock")
+    monkeypatch.setenv('DAYBOOK_SOCKET', socket_path)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    daemon = subprocess.Popen([sys.executable, '-c', 'from daybook.daemon import serve; serve(None)'], env=env,
+                              stdout=subprocess.DEVNULL)
+    try:
+        while not os.path.exists(socket_path):
+            time.sleep(0.05)
+        salt = encryption.get_book_salt("book", "remote")
+        monkeypatch.setenv('DAYBOOK_PASSPHRASE', 'correct horse battery staple')
+        key = encryption.get_key(salt)
+
+        # a later command, with neither the key nor the passphrase, gets the key without asking
+        encryption.forget_keys()
+        monkeypatch.delenv('DAYBOOK_PASSPHRASE')
+        monkeypatch.setattr(encryption.getpass, 'getpass', lambda prompt: pytest.fail("asked for the passphrase"))
+        assert_that(encryption.get_key(salt), equal_to(key))
+    finally:
+        daemon.terminate()
+        daemon.wait()
+        encryption.forget_keys()
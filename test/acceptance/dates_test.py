@@ -0,0 +1,49 @@
+import datetime
+from hamcrest import *
+
+from daybook import Daybook
+from daybook.dates import parse_date
+
+
+def test_parse_date():
+    now = datetime.datetime(2020, 10, 22, 13, 45)
+    assert_that(parse_date("2020-10-01", now), equal_to(datetime.datetime(2020, 10, 1)))
+    assert_that(parse_date("10_01_2020", now), equal_to(datetime.datetime(2020, 10, 1)))
+    assert_that(parse_date("yesterday", now), equal_to(datetime.datetime(2020, 10, 21)))
+    assert_that(parse_date("2.weeks.ago", now), equal_to(datetime.datetime(2020, 10, 8, 13, 45)))
+    assert_that(parse_date("1 month ago", datetime.datetime(2020, 3, 31)), equal_to(datetime.datetime(2020, 2, 29)))
+    assert_that(parse_date("last tuesday", now), none())
+
+
+def test_list_entries_between_dates(db:Daybook):
+    for day in (1, 10, 20):
+        ts = datetime.datetime(2020, 10, day, 12).timestamp()
+        db.commit_entry("Entry for the {}th\n".format(day), filename=db._get_entry_filename(ts))
+
+    entries = db.list_entries(after_date="2020-10-05", before_date="2020-10-15")
+    assert_that(entries, has_length(1))
+    assert_that(''.join(entries[0][1]), contains_string("10th"))
+
+    assert_that(db.list_entries(after_date="2020-10-05"), has_length(2))
+    assert_that(db.list_entries(before_date="2020-10-15"), has_length(2))
+
+
+def test_list_entries_with_git_only_dates(db:Daybook):
+    db.commit_entry("Ancient entry\n", filename=db._get_entry_filename(datetime.datetime(2001, 1, 1).timestamp()))
+    db.commit_entry("Recent entry\n")
+
+    entries = db.list_entries(after_date="last month")
+    assert_that(entries, has_length(1))
+    assert_that(''.join(entries[0][1]), contains_string("Recent"))
+
+
+def test_dates_filter_only_committed_entries(db:Daybook):
+    ts = datetime.datetime(2020, 10, 10, 12).timestamp()
+    db.commit_entry("Committed entry\n", filename=db._get_entry_filename(ts))
+    # a file never committed, e.g. left behind by an editor or a failed write
+    with open(db._get_entry_filename(ts + 60), 'w') as fp:
+        fp.write("Stray file\n")
+
+    entries = db.list_entries(after_date="2020-10-05", before_date="2020-10-15")
+    assert_that([e[0] for e in entries], equal_to([e[0] for e in db.list_entries()]))
+    assert_that(entries, has_length(1))
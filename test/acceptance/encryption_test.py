@@ -0,0 +1,83 @@
+import os
+import pytest
+from hamcrest import assert_that, equal_to, contains_string, is_not
+
+from daybook import Daybook
+from daybook import encryption
+
+
+@pytest.fixture(autouse=True)
+def passphrase(monkeypatch):
+    monkeypatch.setenv('DAYBOOK_PASSPHRASE', 'correct horse battery staple')
+    yield
+    encryption.forget_keys()
+
+
+def test_encrypt_round_trip():
+    salt = encryption.get_book_salt("book", "remote")
+    body = encryption.encrypt("Title\n\n@@secret\n", salt)
+    assert_that(body, is_not(contains_string("secret")))
+    assert_that(encryption.decrypt(body), equal_to("Title\n\n@@secret\n"))
+
+
+def test_wrong_passphrase_fails(monkeypatch):
+    body = encryption.encrypt("Title\n", encryption.get_book_salt("book", "remote"))
+    encryption.forget_keys()
+    monkeypatch.setenv('DAYBOOK_PASSPHRASE', 'wrong')
+    with pytest.raises(Exception):
+        encryption.decrypt(body)
+
+
+def test_decrypt_many_keeps_order(monkeypatch):
+    monkeypatch.setattr(encryption, 'MIN_POOL_CPUS', 1)
+    monkeypatch.setattr(encryption, 'PARALLEL_MIN_BYTES', 0)
+    salt = encryption.get_book_salt("book", "remote")
+    entries = ["entry {}\n".format(i) for i in range(5)]
+    assert_that(encryption.decrypt_many([encryption.encrypt(e, salt) for e in entries]), equal_to(entries))
+
+
+def test_encrypted_entries_are_listed_and_searched(db: Daybook):
+    encrypted = db._get_entry_filename(is_encrypted=True)
+    db.commit_entry(db.encrypt("Hidden thoughts\n\n@@private\n"), encrypted)
+    db.commit_entry("Plain entry\n\n@@public\n")
+
+    with open(encrypted) as fp:
+        assert_that(fp.read(), is_not(contains_string("Hidden")))
+    entries = db.list_entries(with_tags="private")
+    assert_that(len(entries), equal_to(1))
+    assert_that(''.join(entries[0][1]), contains_string("Hidden thoughts"))
+    assert_that(len(db.list_entries(with_text="thoughts")), equal_to(1))
+    assert_that(db.tag_counts(), equal_to({'private': 1, 'public': 1}))
+    assert_that(''.join(db.nth_entry(0, with_tags="private")[1]), contains_string("Hidden thoughts"))
+
+
+def test_wrong_passphrase_is_refused_before_it_is_used(db: Daybook, monkeypatch):
+    db.commit_entry(db.encrypt("Hidden\n"), db._get_entry_filename(1600000000, is_encrypted=True))
+    encryption.forget_keys()
+    monkeypatch.setenv('DAYBOOK_PASSPHRASE', 'wrong')
+    with pytest.raises(encryption.WrongPassphrase):
+        db.encrypt("Never written\n")
+    with pytest.raises(encryption.WrongPassphrase):
+        db.list_entries()
+
+    # without a key check, the book's entries check the key instead
+    os.remove(db.key_check_path)
+    with pytest.raises(encryption.WrongPassphrase):
+        db.list_entries()
+
+    monkeypatch.setenv('DAYBOOK_PASSPHRASE', 'correct horse battery staple')
+    assert_that(''.join(db.list_entries()[0][1]), equal_to("Hidden\n"))
+    assert_that(os.path.exists(db.key_check_path), equal_to(True))
+
+
+def test_a_new_passphrase_is_asked_for_twice(db: Daybook, monkeypatch):
+    monkeypatch.delenv('DAYBOOK_PASSPHRASE')
+    answers = iter(["first try", "first typo"])
+    monkeypatch.setattr(encryption.getpass, 'getpass', lambda prompt: next(answers))
+    with pytest.raises(encryption.WrongPassphrase):
+        db.encrypt("Never written\n")
+    assert_that(os.path.exists(db.key_check_path), equal_to(False))
+
+    answers = iter(["passphrase", "passphrase"])
+    body = db.encrypt("Written\n")
+    assert_that(encryption.decrypt(body, db.key_check_path), equal_to("Written\n"))
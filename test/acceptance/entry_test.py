@@ -0,0 +1,28 @@
+import pytest
+from hamcrest import assert_that, equal_to, contains_exactly
+
+from daybook import Daybook
+from daybook import encryption
+
+
+@pytest.fixture(autouse=True)
+def passphrase(monkeypatch):
+    monkeypatch.setenv('DAYBOOK_PASSPHRASE', 'correct horse battery staple')
+    yield
+    encryption.forget_keys()
+
+
+def test_titles_and_tags_come_from_the_index(db: Daybook):
+    db.commit_entry("Plain entry\n\n@@work @@home\nbody\n", db._get_entry_filename(1600000000))
+    db.commit_entry(db.encrypt("Hidden entry\n\n@@private\n"), db._get_entry_filename(1600000001, is_encrypted=True))
+
+    entries = db.list_entries(with_bodies=False)
+    assert_that([(e.title, e.tags) for e in entries],
+                contains_exactly(("Hidden entry", ["private"]), ("Plain entry", ["home", "work"])))
+    assert_that([e.is_loaded for e in entries], contains_exactly(False, False))
+
+    # the body is still there when asked for, and the entry unpacks like the (file, lines) pairs of old
+    f, lines = entries[1]
+    assert_that(f, equal_to(entries[1].path))
+    assert_that(lines[2], equal_to("@@work @@home\n"))
+    assert_that(entries[1].is_loaded, equal_to(True))
@@ -0,0 +1,44 @@
+import io
+import json
+import os
+
+from hamcrest import assert_that, equal_to, contains_string, contains_exactly
+
+from daybook import Daybook
+from daybook import export
+from daybook.bulk_import import format_entry
+
+
+def _commit_days(db: Daybook, days) -> list:
+    files = []
+    for day in days:
+        f = db._get_entry_filename(1600000000 + day * 86400)
+        db.commit_entry("Day {0}\n\n@@day\nbody of day {0}\n".format(day), f)
+        files.append(f)
+    return files
+
+
+def test_jsonl_is_chronological_and_reimportable(db: Daybook):
+    _commit_days(db, [1, 2, 3])
+    out = io.StringIO()
+    assert_that(export.export_jsonl(db, out, {}), equal_to(3))
+
+    records = [json.loads(l) for l in out.getvalue().splitlines()]
+    assert_that([r['title'] for r in records], contains_exactly("Day 1", "Day 2", "Day 3"))
+    assert_that(records[0]['tags'], equal_to(["day"]))
+    assert_that(format_entry(records[0]), equal_to("Day 1\n\n@@day\nbody of day 1\n"))
+
+
+def test_html_rewrites_only_changed_pages(db: Daybook, tmp_path):
+    files = _commit_days(db, range(5))
+    site = str(tmp_path / "site")
+    assert_that(export.export_html(db, site, {}, page_size=2), equal_to((5, 3, 3)))
+    with open(os.path.join(site, "page-00001.html")) as fp:
+        assert_that(fp.read(), contains_string("body of day 0"))
+
+    assert_that(export.export_html(db, site, {}, page_size=2), equal_to((5, 3, 0)))
+
+    db.commit_edited_entry(files[2], "Day 2", "Day 2\n\nrewritten\n")
+    assert_that(export.export_html(db, site, {}, page_size=2), equal_to((5, 3, 1)))
+    with open(os.path.join(site, "page-00002.html")) as fp:
+        assert_that(fp.read(), contains_string("rewritten"))
@@ -0,0 +1,55 @@
+import subprocess
+from hamcrest import *
+
+from daybook import Daybook
+from daybook.gitobjects import Repository, GitObjectError
+
+
+def _git(db, *args) -> bytes:
+    return subprocess.check_output(['git'] + list(args), cwd=db.base_dir)
+
+
+def test_reads_loose_and_packed_objects(db:Daybook):
+    for i in range(5):
+        db.commit_entry("Entry number {}\n\n@@tag{}\n".format(i, i) + "the same long body of text\n" * 20)
+    repo = Repository(db.base_dir)
+    head = repo.resolve('HEAD')
+    assert_that(head, equal_to(_git(db, 'rev-parse', 'HEAD').decode('ascii').strip()))
+
+    # packing with deltas, and packing the refs, must not change what's read
+    _git(db, 'gc', '-q', '--aggressive')
+    repo = Repository(db.base_dir)
+    assert_that(repo.resolve('HEAD'), equal_to(head))
+    for sha in _git(db, 'cat-file', '--batch-all-objects', '--batch-check=%(objectname)').decode('ascii').split():
+        obj_type, data = repo.read_object(sha)
+        assert_that(data, equal_to(_git(db, 'cat-file', obj_type.decode('ascii'), sha)))
+
+
+def test_diff_trees_matches_git(db:Daybook):
+    db.commit_entry("Keep me\n")
+    db.commit_entry("Delete me\n")
+    old = _git(db, 'rev-parse', 'HEAD').decode('ascii').strip()
+    db.delete_entries([db.list_entries()[0][0]])
+    db.commit_entry("Add me\n")
+    _git(db, 'gc', '-q')
+
+    repo = Repository(db.base_dir)
+    changes = repo.diff_trees(repo.read_commit(old).tree, repo.read_commit(repo.resolve('HEAD')).tree)
+    expected = []
+    fields = _git(db, 'diff-tree', '-r', '-z', '--no-renames', old, 'HEAD').split(b'\0')
+    for meta, path in zip(fields[0::2], fields[1::2]):
+        _, _, _, blob, status = meta.split()
+        expected.append((path.decode('utf-8'), None if status == b'D' else blob.decode('ascii')))
+    assert_that(sorted(changes), equal_to(sorted(expected)))
+
+
+def test_only_an_unborn_head_resolves_to_none(tmp_path):
+    subprocess.check_call(['git', 'init', '-q', str(tmp_path)])
+    repo = Repository(str(tmp_path))
+    assert_that(repo.resolve('HEAD'), none())
+    assert_that(calling(repo.resolve).with_args('refs/heads/missing'), raises(GitObjectError))
+
+    # other ref backends keep HEAD elsewhere, so git has to be asked
+    with open(str(tmp_path / '.git' / 'config'), 'a') as fp:
+        fp.write('[extensions]\n\trefStorage = reftable\n')
+    assert_that(calling(repo.resolve).with_args('HEAD'), raises(GitObjectError))
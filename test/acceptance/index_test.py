@@ -0,0 +1,35 @@
+import os
+from hamcrest import *
+
+from daybook import Daybook
+from daybook.index import EntryIndex
+
+
+def test_index_follows_head(db:Daybook):
+    db.commit_entry("First title\n@@tag1\n")
+    assert_that(db.list_entries(), has_length(1))
+
+    db.commit_entry("Second title\n@@tag2\n")
+    entries = db.list_entries()
+    assert_that(entries, has_length(2))
+
+    index = EntryIndex(db.base_dir)
+    head = index._get_head()
+    assert_that(index._get_meta('head'), equal_to(head))
+    assert_that(
+        [r['title'] for r in index.conn.execute('SELECT title FROM entries ORDER BY timestamp')],
+        contains_exactly("First title", "Second title")
+    )
+
+
+def test_index_drops_deleted_entries(db:Daybook):
+    db.commit_entry("Keep me\n")
+    db.commit_entry("Delete me\n")
+    newest = db.list_entries()[0][0]
+
+    db.execute_cmd(["rm", newest])
+    db.execute_cmd(["commit", "-m", "deletion"])
+
+    entries = db.list_entries()
+    assert_that(entries, has_length(1))
+    assert_that(os.path.basename(entries[0][0]), is_not(equal_to(os.path.basename(newest))))
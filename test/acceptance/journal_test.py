@@ -0,0 +1,94 @@
+import os
+import subprocess
+import time
+
+from hamcrest import assert_that, equal_to, empty
+
+from daybook import Daybook
+from daybook.journal import FLUSH_DELAY
+from daybook.locking import write_lock
+
+
+def test_queued_entries_are_listed_then_flushed_together(db: Daybook, num_commits):
+    db.commit_entry("Committed\n")
+    commits = num_commits()
+    now = time.time()
+    db.queue_entry("Queued one\n\n@@queued\n", db._get_entry_filename(now + 1), "Queued one")
+    db.queue_entry("Queued two\n", db._get_entry_filename(now + 2), "Queued two")
+
+    assert_that(num_commits(), equal_to(commits))
+    titles = [e[0].strip() for _, e in db.list_entries()]
+    assert_that(titles, equal_to(["Queued two", "Queued one", "Committed"]))
+    assert_that(len(db.list_entries(with_tags="queued")), equal_to(1))
+
+    assert_that(db.journal.flush(db), equal_to(2))
+    assert_that(num_commits(), equal_to(commits + 1))
+    assert_that(db.journal.pending(), empty())
+    assert_that([e[0].strip() for _, e in db.list_entries()], equal_to(titles))
+
+
+def test_recovery_replays_unflushed_entries(db: Daybook):
+    db.commit_entry("Committed\n")
+    f = db._get_entry_filename(time.time() + 1)
+    db.queue_entry("Survivor\n", f, "Survivor")
+    # as if the machine went down before the entry reached the working tree
+    os.remove(f)
+
+    reopened = Daybook(db.book_name, db.base_dir, db.remote_url)
+    assert_that(reopened.journal.recover(reopened), equal_to(1))
+    assert_that(reopened.journal.recover(reopened), equal_to(0))
+    assert_that([e[0].strip() for _, e in reopened.list_entries()], equal_to(["Survivor", "Committed"]))
+    status = subprocess.check_output(['git', 'status', '--porcelain'], cwd=db.base_dir)
+    assert_that(status, equal_to(b''))
+
+
+def test_failed_recovery_leaves_entries_readable(db: Daybook):
+    db.commit_entry("Committed\n")
+    db.queue_entry("Stuck\n", db._get_entry_filename(time.time() + 1), "Stuck")
+    hook = os.path.join(db.base_dir, '.git', 'hooks', 'pre-commit')
+    with open(hook, 'w') as fp:
+        fp.write("#!/bin/sh\nexit 1\n")
+    os.chmod(hook, 0o755)
+
+    assert_that(db.journal.recover(db), equal_to(0))
+    assert_that([e[0].strip() for _, e in db.list_entries()], equal_to(["Stuck", "Committed"]))
+
+    os.remove(hook)
+    assert_that(db.journal.recover(db), equal_to(1))
+
+
+def test_only_writing_commands_replay_the_journal(db: Daybook, tmp_path, monkeypatch, num_commits):
+    import commands
+    from fileio import write_config
+    cfg = str(tmp_path / "daybook.yml")
+    write_config(cfg, {'daybooks': {db.book_name: {'base_dir': db.base_dir, 'remote_url': db.remote_url}}})
+    monkeypatch.setattr(commands, 'DAYBOOK_CFG', cfg)
+    monkeypatch.setattr(commands, '_DAYBOOKS', {})
+    db.commit_entry("Committed\n")
+    db.queue_entry("Queued\n", db._get_entry_filename(time.time() + 1), "Queued")
+    commits = num_commits()
+
+    book = commands._get_daybook(db.book_name)
+    assert_that(len(book.list_entries()), equal_to(2))
+    assert_that(num_commits(), equal_to(commits))
+
+    commands._get_daybook(db.book_name, writing=True)
+    assert_that(num_commits(), equal_to(commits + 1))
+    assert_that(book.journal.pending(), empty())
+
+
+def test_background_flush_waits_without_the_write_lock(db: Daybook, num_commits):
+    db.commit_entry("Committed\n")
+    commits = num_commits()
+    db.queue_entry("Queued\n", db._get_entry_filename(time.time() + 1), "Queued")
+    db.journal.flush_in_background(db.book_name, db.remote_url)
+
+    # another writer gets straight in while the flush waits for more entries
+    time.sleep(FLUSH_DELAY / 2)
+    with write_lock(db.base_dir, timeout=FLUSH_DELAY / 4):
+        pass
+    deadline = time.time() + 10
+    while num_commits() == commits and time.time() < deadline:
+        time.sleep(0.1)
+    assert_that(num_commits(), equal_to(commits + 1))
+    assert_that(db.journal.pending(), empty())
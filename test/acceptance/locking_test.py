@@ -0,0 +1,84 @@
+import multiprocessing
+import subprocess
+import time
+
+import pytest
+from hamcrest import assert_that, equal_to, less_than
+
+from daybook import Daybook
+from daybook import locking
+
+WRITERS = 4
+ENTRIES_PER_WRITER = 10
+
+
+def _write_entries(book_name, base_dir, remote_url, writer, num_entries):
+    book = Daybook(book_name, base_dir, remote_url)
+    for i in range(num_entries):
+        book.commit_entry("Writer {0} entry {1}\n".format(writer, i),
+                          book._get_entry_filename(1600000000 + writer * 1000 + i))
+
+
+def _hold_lock(base_dir, seconds):
+    with locking.write_lock(base_dir):
+        time.sleep(seconds)
+
+
+def _run_writers(db: Daybook, entries_per_writer: int) -> list:
+    """
+    Start the writers while another process holds the write lock, so their first entries are all journalled before
+    any of them can flush
+    """
+    context = multiprocessing.get_context('fork')
+    holder = context.Process(target=_hold_lock, args=(db.base_dir, 1))
+    holder.start()
+    time.sleep(0.2)
+    writers = [
+        context.Process(target=_write_entries, args=(db.book_name, db.base_dir, db.remote_url, w, entries_per_writer))
+        for w in range(WRITERS)
+    ]
+    for w in writers:
+        w.start()
+    for w in [holder] + writers:
+        w.join()
+    return [w.exitcode for w in writers]
+
+
+def test_concurrent_writers_lose_nothing(db: Daybook, num_commits):
+    db.commit_entry("First\n")
+    commits = num_commits()
+    assert_that(_run_writers(db, ENTRIES_PER_WRITER), equal_to([0] * WRITERS))
+
+    assert_that(len(db.list_entries()), equal_to(WRITERS * ENTRIES_PER_WRITER + 1))
+    assert_that(num_commits() - commits, less_than(WRITERS * ENTRIES_PER_WRITER))
+    assert_that(subprocess.check_output(['git', 'status', '--porcelain'], cwd=db.base_dir), equal_to(b''))
+
+
+def test_waiting_writers_share_a_commit(db: Daybook, num_commits):
+    db.commit_entry("First\n")
+    commits = num_commits()
+    assert_that(_run_writers(db, 1), equal_to([0] * WRITERS))
+
+    assert_that(len(db.list_entries()), equal_to(WRITERS + 1))
+    assert_that(num_commits(), equal_to(commits + 1))
+
+
+def test_lock_wait_is_bounded(db: Daybook):
+    db.commit_entry("First\n")
+
+    def hold():
+        with locking.write_lock(db.base_dir):
+            time.sleep(1)
+
+    context = multiprocessing.get_context('fork')
+    holder = context.Process(target=hold)
+    holder.start()
+    time.sleep(0.3)
+    start = time.monotonic()
+    with pytest.raises(locking.LockTimeout):
+        with locking.write_lock(db.base_dir, timeout=0.2):
+            pass
+    assert_that(time.monotonic() - start < 0.6, equal_to(True))
+    holder.join()
+    with locking.write_lock(db.base_dir, timeout=0.2):
+        pass
@@ -0,0 +1,62 @@
+import os
+import subprocess
+import threading
+
+import pytest
+from hamcrest import assert_that, equal_to, has_item, greater_than
+
+from daybook import Daybook
+from daybook import locking
+from daybook import maintenance
+
+
+def test_maintain_packs_and_writes_commit_graph(db: Daybook):
+    for i in range(3):
+        db.commit_entry("Entry {}\n".format(i), db._get_entry_filename(1600000000 + i))
+    assert_that(maintenance.commits_since_maintenance(db.base_dir), equal_to(3))
+
+    result = maintenance.maintain(db.base_dir, [db])
+
+    assert_that([step for step, _ in result.steps], equal_to(['commit-graph', 'repack', 'prune']))
+    assert_that([query for _, query, _, _ in result.timings], has_item('list_entries'))
+    objects_dir = os.path.join(db.base_dir, '.git', 'objects')
+    assert_that(os.path.exists(os.path.join(objects_dir, 'info', 'commit-graph')), equal_to(True))
+    loose = [d for d in os.listdir(objects_dir) if len(d) == 2 and os.listdir(os.path.join(objects_dir, d))]
+    assert_that(loose, equal_to([]))
+    assert_that(maintenance.commits_since_maintenance(db.base_dir), equal_to(0))
+
+    # queries read the packed objects just as well
+    db.commit_entry("After\n", db._get_entry_filename(1600000010))
+    assert_that(len(db.list_entries()), equal_to(4))
+    assert_that(maintenance.commits_since_maintenance(db.base_dir), greater_than(0))
+
+
+def test_maintain_waits_for_the_write_lock(db: Daybook):
+    db.commit_entry("Entry\n")
+    done = threading.Event()
+    with locking.write_lock(db.base_dir):
+        thread = threading.Thread(target=lambda: (maintenance.maintain_repo(db.base_dir), done.set()))
+        thread.start()
+        assert_that(done.wait(0.5), equal_to(False))
+    thread.join(30)
+    assert_that(done.is_set(), equal_to(True))
+
+
+def test_packs_are_counted_in_the_common_dir(db: Daybook, tmp_path):
+    db.commit_entry("Entry\n")
+    subprocess.check_call(['git', 'repack', '-q'], cwd=db.base_dir)
+    worktree = str(tmp_path / "worktree")
+    subprocess.check_call(['git', 'worktree', 'add', '-q', '--detach', worktree], cwd=db.base_dir)
+    assert_that(maintenance._count_packs(worktree), equal_to(1))
+
+
+def test_maintain_rejects_an_unknown_diary(db: Daybook, tmp_path, monkeypatch, capsys):
+    import commands
+    from fileio import write_config
+    cfg = str(tmp_path / "daybook.yml")
+    write_config(cfg, {'daybooks': {db.book_name: {'base_dir': db.base_dir, 'remote_url': db.remote_url}}})
+    monkeypatch.setattr(commands, 'DAYBOOK_CFG', cfg)
+
+    with pytest.raises(SystemExit):
+        commands.maintain('no_such_diary')
+    assert_that(capsys.readouterr().out, equal_to("You must install your diary first\n"))
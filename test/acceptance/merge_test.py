@@ -0,0 +1,19 @@
+import datetime
+from hamcrest import *
+
+from daybook import Daybook
+from daybook.merge import iter_entries_across
+
+
+def test_entries_across_books_are_merged_by_date(db:Daybook):
+    other = Daybook("other_daybook", db.base_dir, db.remote_url)
+    for day, book in [(1, db), (2, other), (3, db), (4, other), (5, other)]:
+        ts = datetime.datetime(2020, 10, day, 12).timestamp()
+        book.commit_entry("Day {}\n\n@@day{}\n".format(day, day % 2), filename=book._get_entry_filename(ts))
+
+    matches = list(iter_entries_across([db, other]))
+    assert_that([e[0].strip() for _, _, e in matches], contains_exactly("Day 5", "Day 4", "Day 3", "Day 2", "Day 1"))
+    assert_that([b.book_name for b, _, _ in matches[:2]], contains_exactly("other_daybook", "other_daybook"))
+
+    top = list(iter_entries_across([db, other], max_entries=2, with_tags="day1"))
+    assert_that([e[0].strip() for _, _, e in top], contains_exactly("Day 5", "Day 3"))
@@ -0,0 +1,27 @@
+from hamcrest import *
+
+from daybook import Daybook
+from daybook import profile
+
+
+def test_spans_record_stages_and_counts(db:Daybook, monkeypatch):
+    db.commit_entry("First entry\n@@work\n")
+    db.commit_entry("Second entry\n")
+    monkeypatch.setattr(profile, '_events', [])
+    monkeypatch.setattr(profile, '_counters', profile.Counter())
+    monkeypatch.setattr(profile, '_enabled', False)
+    profile.enable()
+    db.list_entries(with_tags="work")
+
+    trace = profile.get_trace()
+    events = dict((e['name'], e) for e in trace['traceEvents'])
+    assert_that(events, all_of(has_key('discover'), has_key('read'), has_key('filter')))
+    assert_that(events['read']['args'], has_entries(files_read=1))
+    assert_that(trace['otherData']['counters'], has_entries(candidates=1, files_read=1))
+
+
+def test_disabled_spans_record_nothing(db:Daybook, monkeypatch):
+    monkeypatch.setattr(profile, '_events', [])
+    db.commit_entry("An entry\n")
+    db.list_entries()
+    assert_that(profile.get_trace()['traceEvents'], empty())
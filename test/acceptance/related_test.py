@@ -0,0 +1,29 @@
+import os
+
+import pytest
+from hamcrest import assert_that, equal_to, contains_exactly
+
+from daybook import Daybook
+
+pytest.importorskip('scipy')
+
+
+def test_related_entries_share_words(db: Daybook):
+    texts = [
+        "Database outage\n\nThe primary database failed over during the backup window\n",
+        "Garden\n\nPlanted tomatoes and basil in the garden\n",
+        "Postmortem\n\nDatabase failover during backup: the replica lagged behind the primary\n",
+        "Harvest\n\nPicked tomatoes from the garden\n",
+    ]
+    files = [db._get_entry_filename(1600000000 + i) for i in range(len(texts))]
+    for f, text in zip(files, texts):
+        db.commit_entry(text, f)
+
+    related = db.find_related(files[0], count=2)
+    assert_that([e.path for e, _ in related][0], equal_to(files[2]))
+    assert_that([e.title for e, _ in db.find_related(files[1], count=1)], contains_exactly("Harvest"))
+
+    # a change to one entry is picked up from its new blob, reading nothing else
+    db.commit_edited_entry(files[3], "Harvest", "Harvest\n\nThe database replica lagged during the backup\n")
+    assert_that([e.path for e, _ in db.find_related(files[1], count=1)], equal_to([]))
+    assert_that(os.path.exists(db._related.cache_path), equal_to(True))
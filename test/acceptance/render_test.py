@@ -0,0 +1,60 @@
+import io
+import json
+
+from hamcrest import assert_that, equal_to, contains_exactly, starts_with
+
+from daybook import Daybook
+from daybook.render import Renderer, Pager
+
+
+def _render(db: Daybook, output_format: str, color: bool = False) -> str:
+    out = io.StringIO()
+    renderer = Renderer(out, output_format, color=color)
+    entries = db.list_entries(with_bodies=renderer.needs_bodies)
+    for n, entry in enumerate(entries):
+        renderer.entry(n, entry)
+    renderer.more(entries[-1].path)
+    renderer.flush()
+    return out.getvalue()
+
+
+def test_output_formats(db: Daybook):
+    db.commit_entry("First\n\n@@work\n", db._get_entry_filename(1600000000))
+    db.commit_entry("Second\n  indented\n", db._get_entry_filename(1600000001))
+    newest, oldest = db.iter_paths()
+
+    pretty = _render(db, 'pretty').splitlines()
+    assert_that(pretty[:3], contains_exactly(
+        "----- {} (most recent) -----".format(newest), "    Second", "    indented"
+    ))
+    assert_that(pretty[-1], equal_to("----- for older entries: --after-cursor {} -----".format(oldest)))
+
+    plain = _render(db, 'plain').splitlines()
+    assert_that(plain[2], equal_to("  indented"))
+
+    colored = _render(db, 'pretty', color=True)
+    assert_that(colored, starts_with("\033[34m----- {}".format(newest)))
+
+    records = [json.loads(line) for line in _render(db, 'jsonl').splitlines()]
+    assert_that([(r['title'], r['tags'], r['text']) for r in records],
+                contains_exactly(("Second", [], "Second\n  indented\n"), ("First", ["work"], "First\n\n@@work\n")))
+
+    assert_that(_render(db, 'titles').splitlines(), contains_exactly(
+        "{}  Second".format(newest), "{}  First  @@work".format(oldest)
+    ))
+
+
+def test_daemon_output_pages_on_the_client(monkeypatch):
+    from daybook.daemon import _SocketWriter
+    monkeypatch.setenv('PAGER', 'less')
+    wire = io.BytesIO()
+    with Pager(out=_SocketWriter(wire, tty=True)) as out:
+        out.write("entry\n")
+    # the client is told to page, and given the output to page; the daemon starts no pager of its own
+    assert_that([json.loads(line) for line in wire.getvalue().splitlines()],
+                contains_exactly({'page': True}, {'out': "entry\n"}))
+
+    wire = io.BytesIO()
+    with Pager(out=_SocketWriter(wire, tty=False)) as out:
+        out.write("entry\n")
+    assert_that([json.loads(line) for line in wire.getvalue().splitlines()], contains_exactly({'out': "entry\n"}))
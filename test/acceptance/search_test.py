@@ -0,0 +1,33 @@
+from hamcrest import *
+
+from daybook import Daybook
+from daybook.search import TextQuery
+
+
+def test_text_search_case_and_regex(db:Daybook):
+    db.commit_entry("Incident review\nThe Database fell over at 3am\n")
+    db.commit_entry("Lunch\nsandwiches\n")
+
+    assert_that(db.list_entries(with_text="database"), has_length(0))
+    assert_that(db.list_entries(with_text="database", ignore_case=True), has_length(1))
+    assert_that(db.list_entries(with_text=r"fell \w+ at \d+am", regex=True), has_length(1))
+    assert_that(db.list_entries(with_text=r"fell \w+ at \d+pm", regex=True), has_length(0))
+
+
+def test_regex_trigrams_are_required_literals():
+    assert_that(TextQuery(r"fell (over|down) at \d+am", regex=True).get_trigrams(),
+                equal_to({"fel", "ell", "ll ", " at", "at "}))
+    assert_that(TextQuery(r"foo|bar", regex=True).get_trigrams(), empty())
+    assert_that(TextQuery("ABCD", ignore_case=True).get_trigrams(), equal_to({"abc", "bcd"}))
+
+
+def test_text_index_merges_segments(db:Daybook):
+    from daybook.index import MAX_GRAM_SEGMENTS
+    for i in range(MAX_GRAM_SEGMENTS + 2):
+        db.commit_entry("Entry number {}\nmarker{}\n".format(i, i % 2))
+    db.delete_entries([db.list_entries(max_entries=1)[0][0]])
+
+    segments = db.index.conn.execute('SELECT COUNT(DISTINCT segment) FROM grams').fetchone()[0]
+    assert_that(segments, less_than_or_equal_to(MAX_GRAM_SEGMENTS))
+    assert_that(db.list_entries(with_text="marker1"), has_length((MAX_GRAM_SEGMENTS + 2) // 2 - 1))
+    assert_that(db.list_entries(with_text="marker0"), has_length((MAX_GRAM_SEGMENTS + 2) // 2))
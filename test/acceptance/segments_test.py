@@ -0,0 +1,45 @@
+import os
+import time
+
+from hamcrest import assert_that, equal_to, contains_string, is_not, has_item
+
+from daybook import Daybook
+from daybook import segments
+
+DAY = 24 * 60 * 60
+
+
+def test_append_replaces_and_removes(tmp_path):
+    path = str(tmp_path / "2020_10.seg")
+    segments.append_entries(path, {"10_01_2020/1.0.txt": b"one\n", "10_02_2020/2.0.txt": b"two\n"})
+    segments.append_entries(path, {"10_01_2020/1.0.txt": b"uno\n"}, removed=["10_02_2020/2.0.txt"])
+
+    segment = segments.Segment(path)
+    assert_that(list(segment.entries), equal_to(["10_01_2020/1.0.txt"]))
+    assert_that(bytes(segment.read("10_01_2020/1.0.txt")), equal_to(b"uno\n"))
+
+
+def test_compacted_entries_are_still_served(db: Daybook):
+    old = time.time() - 100 * DAY
+    db.commit_entry("Old entry\n\n@@archived\n", db._get_entry_filename(old))
+    db.commit_entry("Older entry\n", db._get_entry_filename(old - DAY))
+    db.commit_entry("New entry\n\n@@fresh\n")
+    old_file = db._get_entry_filename(old)
+
+    assert_that(db.compact(), contains_string("2 entries"))
+    assert_that(os.path.exists(old_file), equal_to(False))
+
+    titles = [e[0].strip() for _, e in db.list_entries()]
+    assert_that(titles, equal_to(["New entry", "Old entry", "Older entry"]))
+    assert_that([f for f, _ in db.list_entries(with_tags="archived")], equal_to([old_file]))
+    assert_that(len(db.list_entries(with_text="Older")), equal_to(1))
+    assert_that(len(db.list_entries(after_date="@{}".format(int(old - 1)), before_date="@{}".format(int(old + 1)))),
+                equal_to(1))
+    assert_that(db.tag_counts(), equal_to({'archived': 1, 'fresh': 1}))
+
+    db.delete_entries([old_file])
+    assert_that([e[0].strip() for _, e in db.list_entries()], is_not(has_item("Old entry")))
+    assert_that(len(db.list_entries()), equal_to(2))
+    db.index.close()
+    os.remove(os.path.join(db.index.index_dir, 'index.sqlite'))
+    assert_that(len(db.list_entries()), equal_to(2))
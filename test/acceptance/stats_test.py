@@ -0,0 +1,29 @@
+import datetime
+
+from hamcrest import assert_that, equal_to
+
+from daybook import Daybook
+
+
+def _at(*date) -> float:
+    return datetime.datetime(*date, 12).timestamp()
+
+
+def test_counters_roll_up_and_follow_changes(db: Daybook):
+    # Monday 5th, Wednesday 7th and Monday 12th October 2020
+    first = db._get_entry_filename(_at(2020, 10, 5))
+    db.commit_entry("One two\n\n@@work\n", first)
+    db.commit_entry("Three four five\n\n@@work @@home\n", db._get_entry_filename(_at(2020, 10, 7)))
+    db.commit_entry("Six\n\n@@home\n", db._get_entry_filename(_at(2020, 10, 12)))
+
+    assert_that(db.index.activity(db.book_name, 'week'), equal_to([('2020-10-05', 2, 8), ('2020-10-12', 1, 2)]))
+    assert_that(db.index.activity(db.book_name, 'month'), equal_to([('2020-10', 3, 10)]))
+    assert_that(db.index.activity(db.book_name, 'day', after='2020-10-06'),
+                equal_to([('2020-10-07', 1, 5), ('2020-10-12', 1, 2)]))
+    assert_that(db.index.top_tags(db.book_name), equal_to([('home', 2), ('work', 2)]))
+    assert_that(db.index.activity(db.book_name, 'week', tag='home'),
+                equal_to([('2020-10-05', 1, None), ('2020-10-12', 1, None)]))
+
+    db.delete_entries([first])
+    assert_that(db.index.activity(db.book_name, 'week'), equal_to([('2020-10-05', 1, 5), ('2020-10-12', 1, 2)]))
+    assert_that(db.index.top_tags(db.book_name, limit=1), equal_to([('home', 2)]))
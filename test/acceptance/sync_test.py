@@ -0,0 +1,56 @@
+import os
+import subprocess
+import threading
+from hamcrest import *
+
+from daybook import Daybook
+from daybook import locking
+from daybook.sync import group_books_by_repo, sync_repo, sync_repos
+
+
+def test_books_sharing_a_repo_are_synced_once():
+    repos = group_books_by_repo({
+        "personal": {"base_dir": "/tmp/diaries"},
+        "work": {"base_dir": "/tmp/diaries/"},
+        "other": {"base_dir": "/tmp/other"},
+    })
+    assert_that(repos, equal_to({
+        os.path.realpath("/tmp/diaries"): ["personal", "work"],
+        os.path.realpath("/tmp/other"): ["other"],
+    }))
+
+
+def test_sync_keeps_going_when_a_repo_fails():
+    synced = []
+    lock = threading.Lock()
+
+    def fake_sync(base_dir):
+        if base_dir == "/broken":
+            raise Exception("remote unreachable")
+        with lock:
+            synced.append(base_dir)
+
+    results = list(sync_repos({"/a": ["a"], "/broken": ["b"], "/c": ["c"]}, concurrency=2, sync=fake_sync))
+
+    assert_that(synced, contains_inanyorder("/a", "/c"))
+    assert_that([r.ok for r in results], contains_exactly(True, False, True))
+    assert_that(str(results[1].error), equal_to("remote unreachable"))
+
+
+def test_sync_waits_for_the_write_lock(db: Daybook, tmp_path):
+    db.commit_entry("Entry\n")
+    remote = str(tmp_path / "remote.git")
+    subprocess.check_call(['git', 'init', '-q', '--bare', remote])
+    subprocess.check_call(['git', 'remote', 'set-url', 'origin', remote], cwd=db.base_dir)
+    subprocess.check_call(['git', 'push', '-q', 'origin', 'master'], cwd=db.base_dir)
+
+    done = threading.Event()
+    with locking.write_lock(db.base_dir):
+        db.commit_entry("Committed while syncing\n")
+        thread = threading.Thread(target=lambda: (sync_repo(db.base_dir), done.set()))
+        thread.start()
+        assert_that(done.wait(0.5), equal_to(False))
+    thread.join(30)
+    assert_that(done.is_set(), equal_to(True))
+    assert_that(subprocess.check_output(['git', 'rev-parse', 'master'], cwd=remote),
+                equal_to(subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=db.base_dir)))
@@ -0,0 +1,31 @@
+from hamcrest import *
+
+from daybook import Daybook
+
+
+def test_tags_match_exact_tokens(db:Daybook):
+    db.commit_entry("Gym\n@@workout\n")
+    db.commit_entry("Standup\n@@work\n")
+
+    entries = db.list_entries(with_tags="work")
+    assert_that(entries, has_length(1))
+    assert_that(''.join(entries[0][1]), contains_string("Standup"))
+
+
+def test_tag_query_and_or_not(db:Daybook):
+    db.commit_entry("One\n@@work @@urgent\n")
+    db.commit_entry("Two\n@@work @@draft\n")
+    db.commit_entry("Three\n@@oncall\n")
+
+    assert_that(db.list_entries(with_tags="work+urgent"), has_length(1))
+    assert_that(db.list_entries(with_tags="work+!draft,oncall"), has_length(2))
+    assert_that(db.list_entries(with_tags="!work"), has_length(1))
+
+
+def test_tag_counts_follow_deletes(db:Daybook):
+    db.commit_entry("One\n@@tag1 @@tag2\n")
+    db.commit_entry("Two\n@@tag1\n")
+    assert_that(db.tag_counts(), equal_to({"tag1": 2, "tag2": 1}))
+
+    db.delete_entries([db.list_entries(max_entries=1)[0][0]])
+    assert_that(db.tag_counts(), equal_to({"tag1": 1, "tag2": 1}))